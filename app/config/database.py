@@ -4,6 +4,7 @@ from pathlib import Path
 import os
 import logging
 from typing import Optional
+from app.config.indexes import ensure_indexes
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +19,7 @@ class DatabaseManager:
 # Create global instance
 database_manager = DatabaseManager()
 
-async def init_database():
+async def init_database(reconcile_indexes: bool = True):
     # inisiasi koneksi database
     try:
         mongo_url = os.environ.get("MONGO_URL")
@@ -42,6 +43,13 @@ async def init_database():
         await database_manager.database.command("ping")
         logger.info("Database connection successful")
         
+        # Pastikan semua index yang terdaftar sudah ada
+        if reconcile_indexes:
+            try:
+                await ensure_indexes(database_manager.database)
+            except Exception as e:
+                logger.error(f"Index reconciliation failed: {e}")
+        
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         # Don't raise exception in production, let app start without database
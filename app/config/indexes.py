@@ -0,0 +1,331 @@
+"""
+MongoDB index registry
+
+Semua index yang dibutuhkan aplikasi didaftarkan di sini dan direkonsiliasi
+secara idempotent saat startup (lihat init_database) dan lewat
+script/ensure_indexes.py.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Entri webhook_ledger dibuang TTL index setelah periode retry Midtrans lewat
+WEBHOOK_LEDGER_RETENTION_DAYS = int(os.getenv("WEBHOOK_LEDGER_RETENTION_DAYS", "30"))
+# Entri webhook_inbox yang sudah diproses dibuang TTL index setelah periode ini
+WEBHOOK_INBOX_RETENTION_DAYS = int(os.getenv("WEBHOOK_INBOX_RETENTION_DAYS", "14"))
+# Pesan telegram_outbox yang sudah terkirim dibuang TTL index setelah periode ini
+TELEGRAM_OUTBOX_RETENTION_DAYS = int(os.getenv("TELEGRAM_OUTBOX_RETENTION_DAYS", "30"))
+# Status fee selain Regenerated (ikut unique index fees_user_bulan_kategori)
+ACTIVE_FEE_STATUSES = ["Belum Bayar", "Menunggu Verifikasi", "Pending", "Lunas", "Berhasil", "Selesai"]
+
+# Registry index per collection.
+# name   : nama index (dipakai untuk mendeteksi perubahan definisi)
+# keys   : daftar (field, arah)
+# options: opsi tambahan untuk create_index (unique, sparse, partialFilterExpression, ...)
+INDEX_REGISTRY = {
+    "users": [
+        {"name": "users_id_unique", "keys": [("id", ASCENDING)], "options": {"unique": True}},
+        {"name": "users_username_unique", "keys": [("username", ASCENDING)], "options": {"unique": True}},
+        {"name": "users_telegram_chat_id", "keys": [("telegram_chat_id", ASCENDING)], "options": {"sparse": True}},
+        # Nomor HP format E.164 (lihat app/services/phone_number.py); user tanpa nomor valid tidak punya field ini
+        {
+            "name": "users_nomor_hp_normalized_unique",
+            "keys": [("nomor_hp_normalized", ASCENDING)],
+            "options": {"unique": True, "sparse": True},
+        },
+        # Urutan keyset pagination daftar admin: (created_at desc, id desc)
+        {"name": "users_created_at_id", "keys": [("created_at", DESCENDING), ("id", DESCENDING)], "options": {}},
+    ],
+    "fees": [
+        {"name": "fees_id_unique", "keys": [("id", ASCENDING)], "options": {"unique": True}},
+        # Satu tagihan aktif per (user, bulan, kategori); fee Regenerated boleh lebih dari satu.
+        # partialFilterExpression tidak mendukung $ne/$nin, jadi status aktif didaftar satu per satu
+        {
+            "name": "fees_user_bulan_kategori",
+            "keys": [("user_id", ASCENDING), ("bulan", ASCENDING), ("kategori", ASCENDING)],
+            "options": {"unique": True, "partialFilterExpression": {"status": {"$in": ACTIVE_FEE_STATUSES}}},
+        },
+        {"name": "fees_bulan_status", "keys": [("bulan", ASCENDING), ("status", ASCENDING)], "options": {}},
+        {"name": "fees_created_at_id", "keys": [("created_at", DESCENDING), ("id", DESCENDING)], "options": {}},
+        {"name": "fees_expiry_sweep_id", "keys": [("expiry_sweep_id", ASCENDING)], "options": {"sparse": True}},
+    ],
+    "payments": [
+        # payments.id dibentuk dari timestamp detik (pay_{timestamp}) sehingga
+        # belum bisa dijamin unik; cukup index biasa untuk lookup
+        {"name": "payments_id", "keys": [("id", ASCENDING)], "options": {}},
+        {"name": "payments_fee_id", "keys": [("fee_id", ASCENDING)], "options": {}},
+        {"name": "payments_fee_id_status", "keys": [("fee_id", ASCENDING), ("status", ASCENDING)], "options": {}},
+        {"name": "payments_user_id", "keys": [("user_id", ASCENDING)], "options": {}},
+        {"name": "payments_order_id_unique", "keys": [("order_id", ASCENDING)], "options": {"unique": True, "sparse": True}},
+        {"name": "payments_transaction_id", "keys": [("transaction_id", ASCENDING)], "options": {"sparse": True}},
+        {"name": "payments_created_at_id", "keys": [("created_at", DESCENDING), ("id", DESCENDING)], "options": {}},
+        {
+            "name": "payments_status_created_at_id",
+            "keys": [("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            "options": {},
+        },
+        {"name": "payments_status_expiry_time", "keys": [("status", ASCENDING), ("expiry_time", ASCENDING)], "options": {}},
+        {"name": "payments_expiry_sweep_id", "keys": [("expiry_sweep_id", ASCENDING)], "options": {"sparse": True}},
+    ],
+    "notifications": [
+        {"name": "notifications_id_unique", "keys": [("id", ASCENDING)], "options": {"unique": True}},
+        {
+            "name": "notifications_user_created_at",
+            "keys": [("user_id", ASCENDING), ("created_at", DESCENDING)],
+            "options": {},
+        },
+    ],
+    "export_jobs": [
+        {"name": "export_jobs_id_unique", "keys": [("id", ASCENDING)], "options": {"unique": True}},
+        {
+            "name": "export_jobs_params_key_status",
+            "keys": [("params_key", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)],
+            "options": {},
+        },
+        {"name": "export_jobs_expires_at", "keys": [("expires_at", ASCENDING)], "options": {}},
+        {"name": "export_jobs_status", "keys": [("status", ASCENDING)], "options": {}},
+    ],
+    "webhook_ledger": [
+        # Satu insert ke index ini = deteksi duplikat notifikasi Midtrans
+        {
+            "name": "webhook_ledger_order_status_code_unique",
+            "keys": [("order_id", ASCENDING), ("transaction_status", ASCENDING), ("status_code", ASCENDING)],
+            "options": {"unique": True},
+        },
+        {
+            "name": "webhook_ledger_received_at_ttl",
+            "keys": [("received_at", ASCENDING)],
+            "options": {"expireAfterSeconds": WEBHOOK_LEDGER_RETENTION_DAYS * 86400},
+        },
+    ],
+    "webhook_inbox": [
+        {"name": "webhook_inbox_id_unique", "keys": [("id", ASCENDING)], "options": {"unique": True}},
+        # Antrean processor: entri pending urut waktu terima
+        {"name": "webhook_inbox_status_received_at", "keys": [("status", ASCENDING), ("received_at", ASCENDING)], "options": {}},
+        {"name": "webhook_inbox_order_id_received_at", "keys": [("order_id", ASCENDING), ("received_at", ASCENDING)], "options": {}},
+        # Entri yang menunggu retry (menahan entri berikutnya dari order yang sama)
+        {"name": "webhook_inbox_status_next_attempt_at", "keys": [("status", ASCENDING), ("next_attempt_at", ASCENDING)], "options": {}},
+        # Entri yang sudah diproses dibuang setelah masa retensi; entri dead disimpan untuk replay
+        {
+            "name": "webhook_inbox_processed_at_ttl",
+            "keys": [("processed_at", ASCENDING)],
+            "options": {"expireAfterSeconds": WEBHOOK_INBOX_RETENTION_DAYS * 86400},
+        },
+    ],
+    "telegram_outbox": [
+        {"name": "telegram_outbox_id_unique", "keys": [("id", ASCENDING)], "options": {"unique": True}},
+        # Antrean worker: pesan pending yang sudah jatuh tempo
+        {"name": "telegram_outbox_status_next_attempt_at", "keys": [("status", ASCENDING), ("next_attempt_at", ASCENDING)], "options": {}},
+        {"name": "telegram_outbox_job_id_status", "keys": [("job_id", ASCENDING), ("status", ASCENDING)], "options": {}},
+        {
+            "name": "telegram_outbox_sent_at_ttl",
+            "keys": [("sent_at", ASCENDING)],
+            "options": {"expireAfterSeconds": TELEGRAM_OUTBOX_RETENTION_DAYS * 86400},
+        },
+    ],
+    "fee_audit_logs": [
+        {
+            "name": "fee_audit_logs_month_action_timestamp",
+            "keys": [("month", ASCENDING), ("action", ASCENDING), ("timestamp", DESCENDING)],
+            "options": {},
+        },
+    ],
+}
+
+# Query yang sering dipanggil (login, webhook, daftar tagihan, dsb).
+# Dipakai oleh check_hot_queries untuk memastikan tidak ada yang jatuh ke COLLSCAN.
+HOT_QUERIES = [
+    {"name": "login by username", "collection": "users", "filter": {"username": "__probe__"}},
+    {"name": "user by id", "collection": "users", "filter": {"id": "__probe__"}},
+    {"name": "user by phone", "collection": "users", "filter": {"nomor_hp_normalized": "__probe__"}},
+    {"name": "user by telegram chat", "collection": "users", "filter": {"telegram_chat_id": "__probe__"}},
+    {
+        "name": "fee existence per user/month",
+        "collection": "fees",
+        "filter": {"user_id": "__probe__", "bulan": "2024-01", "kategori": "60M2"},
+    },
+    {"name": "user fees", "collection": "fees", "filter": {"user_id": "__probe__", "status": {"$ne": "Regenerated"}}},
+    {"name": "fee by id", "collection": "fees", "filter": {"id": "__probe__"}},
+    {
+        "name": "unpaid fees per month",
+        "collection": "fees",
+        "filter": {"bulan": "2024-01", "status": {"$in": ["Belum Bayar", "Pending"]}},
+    },
+    {"name": "paid fees per month", "collection": "fees", "filter": {"bulan": "2024-01", "status": "Lunas"}},
+    {"name": "payments by fee", "collection": "payments", "filter": {"fee_id": "__probe__", "status": {"$in": ["Pending"]}}},
+    {
+        "name": "successful payment per fee",
+        "collection": "payments",
+        "filter": {"fee_id": "__probe__", "status": {"$in": ["Settlement", "Success"]}},
+    },
+    {"name": "payment by order", "collection": "payments", "filter": {"order_id": "__probe__"}},
+    {"name": "payment by transaction", "collection": "payments", "filter": {"transaction_id": "__probe__"}},
+    {"name": "user payments", "collection": "payments", "filter": {"user_id": "__probe__"}},
+    {
+        "name": "admin payments page by status",
+        "collection": "payments",
+        "filter": {"status": "Pending"},
+        "sort": [("created_at", DESCENDING), ("id", DESCENDING)],
+    },
+    {
+        "name": "pending payments to reconcile",
+        "collection": "payments",
+        "filter": {"status": "Pending", "order_id": {"$ne": None}, "created_at": {"$lte": "__probe__"}},
+        "sort": [("created_at", ASCENDING), ("id", ASCENDING)],
+    },
+    {
+        "name": "expired pending payments",
+        "collection": "payments",
+        "filter": {"status": "Pending", "expiry_time": {"$lte": "__probe__"}},
+        "sort": [("expiry_time", ASCENDING)],
+    },
+    {
+        "name": "webhook inbox queue",
+        "collection": "webhook_inbox",
+        "filter": {"status": "pending"},
+        "sort": [("received_at", ASCENDING)],
+    },
+    {
+        "name": "webhook inbox retries",
+        "collection": "webhook_inbox",
+        "filter": {"status": "pending", "next_attempt_at": {"$gt": "__probe__"}},
+    },
+    {
+        "name": "telegram outbox queue",
+        "collection": "telegram_outbox",
+        "filter": {"status": "pending", "next_attempt_at": {"$lte": "__probe__"}},
+        "sort": [("next_attempt_at", ASCENDING)],
+    },
+    {"name": "telegram job status", "collection": "telegram_outbox", "filter": {"job_id": "__probe__"}},
+    {"name": "admin users page", "collection": "users", "filter": {}, "sort": [("created_at", DESCENDING), ("id", DESCENDING)]},
+    {"name": "admin fees page", "collection": "fees", "filter": {}, "sort": [("created_at", DESCENDING), ("id", DESCENDING)]},
+    {"name": "admin payments page", "collection": "payments", "filter": {}, "sort": [("created_at", DESCENDING), ("id", DESCENDING)]},
+    {
+        "name": "user notifications",
+        "collection": "notifications",
+        "filter": {"user_id": "__probe__"},
+        "sort": [("created_at", DESCENDING)],
+    },
+    {
+        "name": "regeneration history",
+        "collection": "fee_audit_logs",
+        "filter": {"month": "2024-01", "action": "regenerate_fees"},
+        "sort": [("timestamp", DESCENDING)],
+    },
+]
+
+# Opsi index yang ikut dibandingkan saat rekonsiliasi
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _normalize_keys(keys) -> list:
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys]
+
+
+def _existing_options(existing: dict) -> dict:
+    """Opsi index dari index_information() yang bisa dipakai ulang di create_index"""
+    return {option: existing[option] for option in _COMPARED_OPTIONS if option in existing}
+
+
+def _index_matches(existing: dict, spec: dict) -> bool:
+    """Cek apakah index yang sudah ada identik dengan definisi di registry"""
+    if _normalize_keys(existing.get("key", [])) != _normalize_keys(spec["keys"]):
+        return False
+    for option in _COMPARED_OPTIONS:
+        if existing.get(option) != spec["options"].get(option):
+            # unique/sparse bernilai False setara dengan tidak diset
+            if not existing.get(option) and not spec["options"].get(option):
+                continue
+            return False
+    return True
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> dict:
+    """Rekonsiliasi index di database dengan INDEX_REGISTRY (idempotent).
+
+    Index yang belum ada akan dibuat, index dengan nama sama tapi definisi
+    berbeda akan dibuat ulang. Index lain yang tidak terdaftar dibiarkan.
+    """
+    summary = {"created": [], "recreated": [], "unchanged": [], "failed": []}
+
+    for collection_name, specs in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        try:
+            existing_indexes = await collection.index_information()
+        except OperationFailure:
+            existing_indexes = {}
+
+        for spec in specs:
+            name = spec["name"]
+            existing = existing_indexes.get(name)
+            try:
+                if existing is not None:
+                    if _index_matches(existing, spec):
+                        summary["unchanged"].append(name)
+                        continue
+                    await collection.drop_index(name)
+                    try:
+                        await collection.create_index(spec["keys"], name=name, **spec["options"])
+                    except OperationFailure:
+                        # Pasang kembali definisi lama agar query tidak kehilangan index
+                        await collection.create_index(existing["key"], name=name, **_existing_options(existing))
+                        raise
+                    summary["recreated"].append(name)
+                    continue
+
+                # Index yang sama persis bisa saja sudah ada dengan nama lain
+                # (misalnya dibuat oleh script migrasi lama)
+                if any(_index_matches(info, spec) for info in existing_indexes.values()):
+                    summary["unchanged"].append(name)
+                    continue
+
+                await collection.create_index(spec["keys"], name=name, **spec["options"])
+                summary["created"].append(name)
+            except OperationFailure as e:
+                # Misalnya data duplikat yang menghalangi unique index
+                logger.error(f"Failed to ensure index {collection_name}.{name}: {e}")
+                summary["failed"].append(name)
+
+    logger.info(
+        f"Index reconciliation: {len(summary['created'])} created, "
+        f"{len(summary['recreated'])} recreated, {len(summary['unchanged'])} unchanged, "
+        f"{len(summary['failed'])} failed"
+    )
+    return summary
+
+
+def _plan_stages(plan: dict):
+    """Iterasi semua stage di dalam query plan explain()"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def check_hot_queries(db: AsyncIOMotorDatabase) -> list[dict]:
+    """Jalankan explain() untuk setiap HOT_QUERIES dan kembalikan query yang memakai COLLSCAN"""
+    violations = []
+    for query in HOT_QUERIES:
+        cursor = db[query["collection"]].find(query["filter"])
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(_plan_stages(winning_plan))
+        if "COLLSCAN" in stages:
+            violations.append({
+                "name": query["name"],
+                "collection": query["collection"],
+                "filter": query["filter"],
+                "stages": stages,
+            })
+    return violations
@@ -1,4 +1,3 @@
-from midtransclient import Snap, CoreApi
 from dotenv import load_dotenv
 import os
 from pathlib import Path
@@ -22,22 +21,6 @@ class MidtransConfig:
         self.server_key = server_key
         self.client_key = client_key
     
-    def get_snap_client(self):
-        """Get configured Midtrans Snap client"""
-        return Snap(
-            is_production=self.is_production,
-            server_key=self.server_key,
-            client_key=self.client_key
-        )
-    
-    def get_core_api_client(self):
-        """Get configured Midtrans Core API client"""
-        return CoreApi(
-            is_production=self.is_production,
-            server_key=self.server_key,
-            client_key=self.client_key
-        )
-    
     def get_frontend_callback_urls(self):
         """Get frontend callback URLs for payment completion"""
         return {
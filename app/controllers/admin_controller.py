@@ -1,7 +1,8 @@
 from app.models import UserResponse
 from app.security.auth import AuthManager
 from app.config.database import get_database
-from app.services.websocket_manager import websocket_manager
+from app.services.dashboard_broadcaster import dashboard_broadcaster
+from app.services.dashboard_rollup_service import dashboard_rollup_service
 from datetime import datetime, timedelta, timezone
 import uuid
 
@@ -10,18 +11,12 @@ class AdminController:
         self.auth_manager = AuthManager()
 
     async def broadcast_dashboard_update(self):
-        """Broadcast dashboard stats update to all connected admin users"""
-        try:
-            # Get updated dashboard stats
-            dashboard_stats = await self.get_dashboard_stats()
-            
-            # Broadcast to all connected users
-            await websocket_manager.broadcast_to_all({
-                "type": "dashboard_update",
-                "data": dashboard_stats
-            })
-        except Exception as e:
-            print(f"Failed to broadcast dashboard update: {e}")
+        """Schedule a coalesced dashboard stats broadcast to all connected admin users"""
+        dashboard_broadcaster.mark_dirty()
+
+    def get_broadcast_metrics(self) -> dict:
+        """Get dashboard broadcast coalescing metrics (admin only)"""
+        return dashboard_broadcaster.get_metrics()
 
     async def init_sample_data(self) -> dict:
         """Initialize sample data for testing"""
@@ -32,97 +27,17 @@ class AdminController:
         await db.fees.delete_many({})
         await db.payments.delete_many({})
         await db.notifications.delete_many({})
+        await dashboard_rollup_service.rebuild()
 
     async def get_dashboard_stats(self) -> dict:
         """Get dashboard statistics (admin only)"""
-        db = get_database()
-        
-        # Count users
-        total_users = await db.users.count_documents({"is_admin": False})
-        
-        # Count fees by status
-        total_fees = await db.fees.count_documents({})
-        paid_fees = await db.fees.count_documents({"status": "Lunas"})
-        pending_fees = await db.fees.count_documents({"status": "Pending"})
-        
-        # Count unpaid fees: includes "Belum Bayar" and fees with failed payments
-        unpaid_fees = await db.fees.count_documents({"status": "Belum Bayar"})
-        
-        # Also count fees that have failed payments (Deny, Cancel, Expire)
-        failed_payment_fees = await db.fees.aggregate([
-            {
-                "$lookup": {
-                    "from": "payments",
-                    "localField": "id",
-                    "foreignField": "fee_id",
-                    "as": "payments"
-                }
-            },
-            {
-                "$match": {
-                    "status": {"$in": ["Belum Bayar", "Pending"]},
-                    "payments.status": {"$in": ["Deny", "Cancel", "Expire"]}
-                }
-            },
-            {
-                "$count": "count"
-            }
-        ]).to_list(1)
-        
-        # Add failed payment fees to unpaid count
-        if failed_payment_fees:
-            unpaid_fees += failed_payment_fees[0].get("count", 0)
-        
-        # Count payments by status - using correct status values
-        pending_payments = await db.payments.count_documents({"status": "Pending"})
-        approved_payments = await db.payments.count_documents({
-            "$or": [{"status": "Settlement"}, {"status": "Success"}]
-        })
-        failed_payments = await db.payments.count_documents({
-            "$or": [{"status": "Deny"}, {"status": "Cancel"}, {"status": "Expire"}, {"status": "Failed"}]
-        })
-        
-        # Calculate current month collection
-        jakarta_tz = timezone(timedelta(hours=7))
-        current_time = datetime.now(jakarta_tz)
-        current_month = current_time.strftime("%Y-%m")
-        
-        # Get current month fees
-        current_month_fees = await db.fees.find({"bulan": current_month}).to_list(None)
-        current_month_collection = sum(fee.get("nominal", 0) for fee in current_month_fees if fee.get("status") == "Lunas")
-        
-        # Calculate collection rate
-        total_expected = sum(fee.get("nominal", 0) for fee in current_month_fees)
-        collection_rate = round((current_month_collection / total_expected * 100) if total_expected > 0 else 0, 1)
-        
-        # Calculate monthly fees for chart (last 6 months)
-        monthly_fees = []
-        for i in range(6):
-            month_date = current_time - timedelta(days=30 * i)
-            month_str = month_date.strftime("%Y-%m")
-            month_name = month_date.strftime("%b")
-            
-            month_fees = await db.fees.find({"bulan": month_str}).to_list(None)
-            month_total = sum(fee.get("nominal", 0) for fee in month_fees if fee.get("status") == "Lunas")
-            
-            monthly_fees.append({
-                "month": month_name,
-                "total": month_total
-            })
-        
-        monthly_fees.reverse()  # Show oldest to newest
-        
-        return {
-            "totalUsers": total_users,
-            "totalFees": total_fees,
-            "pendingPayments": pending_payments,
-            "approvedPayments": approved_payments,
-            "failedPayments": failed_payments,
-            "currentMonthCollection": current_month_collection,
-            "collectionRate": collection_rate,
-            "monthlyFees": monthly_fees,
-            "unpaidFees": unpaid_fees
-        }
+        # Dibaca dari dokumen rollup yang di-maintain secara incremental
+        return await dashboard_rollup_service.get_dashboard_stats()
+
+    async def rebuild_dashboard_rollups(self) -> dict:
+        """Recompute dashboard rollups from raw fees and payments (admin only)"""
+        result = await dashboard_rollup_service.rebuild()
+        return {"message": f"Rollup dashboard berhasil dihitung ulang untuk {result['months']} bulan", **result}
 
     async def get_unpaid_users(self, bulan: str = None) -> list[dict]:
         """Get users who haven't paid their fees (admin only)"""
@@ -134,19 +49,29 @@ class AdminController:
             current_time = datetime.now(jakarta_tz)
             bulan = current_time.strftime("%Y-%m")
         
-        # Get all unpaid fees for specified month (including failed payments)
+        # Match on bulan first, then join the payments (newest first) and the
+        # user of each fee in the same pipeline
         unpaid_fees = await db.fees.aggregate([
+            {
+                "$match": {
+                    "bulan": bulan,
+                    "status": {"$in": ["Belum Bayar", "Pending"]}
+                }
+            },
             {
                 "$lookup": {
                     "from": "payments",
                     "localField": "id",
                     "foreignField": "fee_id",
+                    "pipeline": [
+                        {"$sort": {"created_at": -1}},
+                        {"$project": {"_id": 0, "status": 1}}
+                    ],
                     "as": "payments"
                 }
             },
             {
                 "$match": {
-                    "bulan": bulan,
                     "$or": [
                         {"status": "Belum Bayar"},
                         {
@@ -155,19 +80,46 @@ class AdminController:
                         }
                     ]
                 }
+            },
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "user_id",
+                    "foreignField": "id",
+                    "pipeline": [
+                        {"$limit": 1},
+                        {
+                            "$project": {
+                                "_id": 0, "id": 1, "username": 1, "nama": 1,
+                                "nomor_rumah": 1, "nomor_hp": 1, "tipe_rumah": 1
+                            }
+                        }
+                    ],
+                    "as": "user"
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "id": 1,
+                    "user_id": 1,
+                    "kategori": 1,
+                    "nominal": 1,
+                    "due_date": 1,
+                    "created_at": 1,
+                    "user": {"$arrayElemAt": ["$user", 0]},
+                    "latest_payment_status": {"$arrayElemAt": ["$payments.status", 0]}
+                }
             }
-        ]).to_list(1000)
+        ]).to_list(None)
         
-        # Get user details for each unpaid fee
         unpaid_users = []
         for fee in unpaid_fees:
-            user = await db.users.find_one({"id": fee["user_id"]}, {"_id": 0})
+            user = fee.get("user")
             
-            # Get latest payment status for this fee
-            latest_payment = None
-            if fee.get("payments"):
-                # Sort by created_at descending to get the latest payment
-                latest_payment = sorted(fee["payments"], key=lambda x: x.get("created_at", ""), reverse=True)[0]
+            # Latest payment status for this fee (payments sorted server-side)
+            payment_status = fee.get("latest_payment_status")
+            payment_failed = payment_status in ["Deny", "Cancel", "Expire"]
             
             if user:
                 # User exists - normal case
@@ -184,8 +136,8 @@ class AdminController:
                     "due_date": fee["due_date"],
                     "created_at": fee["created_at"],
                     "is_orphaned": False,
-                    "payment_status": latest_payment.get("status") if latest_payment else None,
-                    "payment_failed": latest_payment.get("status") in ["Deny", "Cancel", "Expire"] if latest_payment else False
+                    "payment_status": payment_status,
+                    "payment_failed": payment_failed
                 })
             else:
                 # User deleted but fee exists - orphaned fee
@@ -202,8 +154,8 @@ class AdminController:
                     "due_date": fee["due_date"],
                     "created_at": fee["created_at"],
                     "is_orphaned": True,
-                    "payment_status": latest_payment.get("status") if latest_payment else None,
-                    "payment_failed": latest_payment.get("status") in ["Deny", "Cancel", "Expire"] if latest_payment else False
+                    "payment_status": payment_status,
+                    "payment_failed": payment_failed
                 })
         
         return unpaid_users
@@ -218,22 +170,60 @@ class AdminController:
             current_time = datetime.now(jakarta_tz)
             bulan = current_time.strftime("%Y-%m")
         
-        # Get all paid fees for specified month
-        paid_fees = await db.fees.find({
-            "status": "Lunas",
-            "bulan": bulan
-        }).to_list(1000)
+        # Get all paid fees for specified month, joined with the user and the
+        # successful payment of each fee in the same pipeline
+        paid_fees = await db.fees.aggregate([
+            {"$match": {"bulan": bulan, "status": "Lunas"}},
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "user_id",
+                    "foreignField": "id",
+                    "pipeline": [
+                        {"$limit": 1},
+                        {
+                            "$project": {
+                                "_id": 0, "id": 1, "username": 1, "nama": 1,
+                                "nomor_rumah": 1, "nomor_hp": 1, "tipe_rumah": 1
+                            }
+                        }
+                    ],
+                    "as": "user"
+                }
+            },
+            {
+                "$lookup": {
+                    "from": "payments",
+                    "localField": "id",
+                    "foreignField": "fee_id",
+                    "pipeline": [
+                        {"$match": {"status": {"$in": ["Settlement", "Success"]}}},
+                        {"$limit": 1},
+                        {"$project": {"_id": 0, "settled_at": 1, "created_at": 1, "payment_method": 1}}
+                    ],
+                    "as": "payment"
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "id": 1,
+                    "user_id": 1,
+                    "kategori": 1,
+                    "nominal": 1,
+                    "due_date": 1,
+                    "created_at": 1,
+                    "user": {"$arrayElemAt": ["$user", 0]},
+                    "payment": {"$arrayElemAt": ["$payment", 0]}
+                }
+            }
+        ]).to_list(None)
         
-        # Get user details for each paid fee
         paid_users = []
         for fee in paid_fees:
-            user = await db.users.find_one({"id": fee["user_id"]}, {"_id": 0})
+            user = fee.get("user")
             if user:
-                # Get payment details for this fee
-                payment = await db.payments.find_one(
-                    {"fee_id": fee["id"], "status": {"$in": ["Settlement", "Success"]}},
-                    {"_id": 0}
-                )
+                payment = fee.get("payment")
                 
                 paid_users.append({
                     "user_id": user["id"],
@@ -1,8 +1,22 @@
 from app.models import Fee, FeeResponse, FeeRegenerationAudit
 from app.config.database import get_database
-from datetime import datetime, timedelta, timezone
+from app.services.dashboard_rollup_service import dashboard_rollup_service
+from app.services.pagination import paginate, created_at_range, DEFAULT_PAGE_SIZE
+from datetime import datetime, timedelta, timezone, date
+from typing import Optional
 from calendar import monthrange
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import uuid
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Jumlah operasi upsert per bulk_write
+FEE_BULK_BATCH_SIZE = 1000
+# Kode error MongoDB untuk pelanggaran unique index
+DUPLICATE_KEY_ERROR = 11000
 
 class FeeController:
     def _get_month_end_date(self, bulan: str, timezone_obj) -> datetime:
@@ -65,69 +79,45 @@ class FeeController:
         Tarif IPL tidak di-hardcode; diterima dari frontend via tarif_config.
         tarif_config keys: 60M2, 72M2, HOOK (case-insensitive supported)
         """
-        db = get_database()
-        
         # Use Jakarta timezone for all timestamps
         jakarta_tz = timezone(timedelta(hours=7))
         current_time = datetime.now(jakarta_tz)
         
-        # Calculate due date as last day of the month
-        due_date = self._get_month_end_date(bulan, jakarta_tz)
-        
-        # Get all non-admin users
-        users = await db.users.find({"is_admin": False}).to_list(1000)
-        
-        fees_created = 0
-        for user in users:
-            tipe = (user.get("tipe_rumah") or "").upper()
-            # Normalisasi tipe agar sesuai keys config
-            if tipe in ["60M2", "60", "60 M2", "TYPE 60", "TYPE60"]:
-                key = "60M2"
-            elif tipe in ["72M2", "72", "72 M2", "TYPE 72", "TYPE72"]:
-                key = "72M2"
-            elif tipe in ["HOOK", "TYPE HOOK", "TIPE HOOK"]:
-                key = "HOOK"
-            else:
-                # Jika tipe tidak dikenali, lewati pembuatan tagihan untuk user tsb
-                continue
-
-            # Ambil nominal dari tarif_config; dukung variasi key case
-            nominal = (
-                tarif_config.get(key)
-                or tarif_config.get(key.lower())
-                or tarif_config.get(key.capitalize())
-            )
-            if not isinstance(nominal, int) or nominal <= 0:
-                continue
-
-            # Buat satu tagihan IPL per user per bulan berdasarkan tipe rumah
-            existing_fee = await db.fees.find_one({
-                "user_id": user["id"],
-                "kategori": key,  # simpan kategori sebagai tipe rumah
-                "bulan": bulan
-            })
-            if not existing_fee:
-                fee_dict = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": user["id"],
-                    "kategori": key,
-                    "nominal": nominal,
-                    "bulan": bulan,
-                    "status": "Belum Bayar",
-                    "due_date": due_date,
-                    "created_at": current_time
-                }
-                await db.fees.insert_one(fee_dict)
-                fees_created += 1
+        result = await self._bulk_upsert_fees(bulan, tarif_config, current_time, jakarta_tz)
         
-        return {"message": f"{fees_created} tagihan berhasil dibuat untuk bulan {bulan}"}
+        return {
+            "message": f"{result['fees_created']} tagihan berhasil dibuat untuk bulan {bulan}",
+            "batches": result["batches"]
+        }
 
-    async def get_all_fees(self) -> list[FeeResponse]:
-        """Get all fees (admin only)"""
+    async def get_all_fees(
+        self,
+        status: Optional[str] = None,
+        bulan: Optional[str] = None,
+        kategori: Optional[str] = None,
+        user_id: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+    ) -> dict:
+        """Get one page of fees, newest first (admin only)"""
         db = get_database()
         
-        fees = await db.fees.find({}, {"_id": 0}).to_list(1000)
-        return [FeeResponse(**fee) for fee in fees]
+        query = created_at_range(start, end)
+        if status:
+            query["status"] = status
+        if bulan:
+            query["bulan"] = bulan
+        if kategori:
+            query["kategori"] = kategori
+        if user_id:
+            query["user_id"] = user_id
+        
+        page = await paginate(db.fees, query, {"_id": 0}, limit, cursor, include_total)
+        page["items"] = [FeeResponse(**fee) for fee in page["items"]]
+        return page
 
     async def get_fees_by_month(self, bulan: str) -> list[FeeResponse]:
         """Get fees filtered by specific month string (format YYYY-MM) for export"""
@@ -138,14 +128,9 @@ class FeeController:
 
     async def update_fee_status(self, fee_id: str, status: str) -> dict:
         """Update fee status"""
-        db = get_database()
+        previous = await dashboard_rollup_service.update_fee_status(fee_id, status)
         
-        result = await db.fees.update_one(
-            {"id": fee_id},
-            {"$set": {"status": status}}
-        )
-        
-        if result.modified_count == 0:
+        if not previous or previous.get("status") == status:
             return {"message": "Tagihan tidak ditemukan atau tidak ada perubahan"}
         
         return {"message": "Status tagihan berhasil diubah"}
@@ -156,24 +141,23 @@ class FeeController:
         jakarta_tz = timezone(timedelta(hours=7))
         current_time = datetime.now(jakarta_tz)
         
-        # Check for existing paid fees
-        paid_fees = await db.fees.find({
+        # Count existing paid fees
+        paid_fees_count = await db.fees.count_documents({
             "bulan": bulan,
             "status": {"$in": ["Berhasil", "Selesai", "Lunas"]}
-        }).to_list(1000)
+        })
         
-        unpaid_fees = await db.fees.find({
+        unpaid_filter = {
             "bulan": bulan,
             "status": {"$in": ["Belum Bayar", "Menunggu Verifikasi"]}
-        }).to_list(1000)
+        }
+        unpaid_by_status = await self._count_fees_by_status(unpaid_filter)
+        unpaid_fees_count = sum(stats["count"] for stats in unpaid_by_status.values())
         
         # Soft delete unpaid fees (mark as regenerated)
-        if unpaid_fees:
+        if unpaid_fees_count:
             await db.fees.update_many(
-                {
-                    "bulan": bulan,
-                    "status": {"$in": ["Belum Bayar", "Menunggu Verifikasi"]}
-                },
+                unpaid_filter,
                 {
                     "$set": {
                         "status": "Regenerated",
@@ -183,6 +167,7 @@ class FeeController:
                     }
                 }
             )
+            await dashboard_rollup_service.record_fees_transition(bulan, unpaid_by_status, "Regenerated")
         
         # Generate new fees
         fees_created = await self._generate_fees_for_month(bulan, tarif_config, current_time, jakarta_tz)
@@ -196,59 +181,82 @@ class FeeController:
             "timestamp": current_time,
             "details": {
                 "tarif_config": tarif_config,
-                "paid_fees_preserved": len(paid_fees),
-                "unpaid_fees_regenerated": len(unpaid_fees)
+                "paid_fees_preserved": paid_fees_count,
+                "unpaid_fees_regenerated": unpaid_fees_count
             },
-            "affected_fees_count": len(unpaid_fees) + fees_created,
-            "paid_fees_preserved": len(paid_fees),
-            "unpaid_fees_regenerated": len(unpaid_fees),
+            "affected_fees_count": unpaid_fees_count + fees_created,
+            "paid_fees_preserved": paid_fees_count,
+            "unpaid_fees_regenerated": unpaid_fees_count,
             "reason": "Admin regenerate with new rates"
         }
         await db.fee_audit_logs.insert_one(audit_log)
         
         message = f"{fees_created} tagihan berhasil dibuat ulang untuk bulan {bulan}"
-        if paid_fees:
-            message += f". {len(paid_fees)} tagihan yang sudah dibayar tetap dipertahankan."
+        if paid_fees_count:
+            message += f". {paid_fees_count} tagihan yang sudah dibayar tetap dipertahankan."
         
         return {
             "message": message,
-            "paid_fees_preserved": len(paid_fees),
-            "unpaid_fees_regenerated": len(unpaid_fees),
+            "paid_fees_preserved": paid_fees_count,
+            "unpaid_fees_regenerated": unpaid_fees_count,
             "new_fees_created": fees_created
         }
 
     async def _generate_fees_for_month(self, bulan: str, tarif_config: dict, current_time: datetime, jakarta_tz: timezone) -> int:
         """Helper method to generate fees for a month"""
+        result = await self._bulk_upsert_fees(bulan, tarif_config, current_time, jakarta_tz)
+        return result["fees_created"]
+
+    def _resolve_fee_nominal(self, tipe_rumah: str, tarif_config: dict):
+        """Tentukan kategori dan nominal tagihan dari tipe rumah; None jika tidak valid"""
+        tipe = (tipe_rumah or "").upper()
+        # Normalisasi tipe agar sesuai keys config
+        if tipe in ["60M2", "60", "60 M2", "TYPE 60", "TYPE60"]:
+            key = "60M2"
+        elif tipe in ["72M2", "72", "72 M2", "TYPE 72", "TYPE72"]:
+            key = "72M2"
+        elif tipe in ["HOOK", "TYPE HOOK", "TIPE HOOK"]:
+            key = "HOOK"
+        else:
+            # Jika tipe tidak dikenali, lewati pembuatan tagihan untuk user tsb
+            return None
+
+        # Ambil nominal dari tarif_config; dukung variasi key case
+        nominal = (
+            tarif_config.get(key)
+            or tarif_config.get(key.lower())
+            or tarif_config.get(key.capitalize())
+        )
+        if not isinstance(nominal, int) or nominal <= 0:
+            return None
+
+        return key, nominal
+
+    async def _bulk_upsert_fees(self, bulan: str, tarif_config: dict, current_time: datetime, jakarta_tz: timezone) -> dict:
+        """Buat tagihan satu bulan untuk semua user dengan bulk_write upsert.
+
+        Tagihan di-key dengan (user_id, kategori, bulan) dan hanya dibuat jika belum
+        ada tagihan aktif (bukan "Regenerated") untuk key tersebut, sehingga aman
+        dijalankan berulang kali.
+        """
         db = get_database()
         
         # Calculate due date as last day of the month
         due_date = self._get_month_end_date(bulan, jakarta_tz)
         
-        # Get all non-admin users
-        users = await db.users.find({"is_admin": False}).to_list(1000)
+        # Get all non-admin users, hanya field yang dibutuhkan
+        users_cursor = db.users.find(
+            {"is_admin": False},
+            {"_id": 0, "id": 1, "tipe_rumah": 1}
+        )
         
-        fees_created = 0
-        for user in users:
-            tipe = (user.get("tipe_rumah") or "").upper()
-            # Normalisasi tipe agar sesuai keys config
-            if tipe in ["60M2", "60", "60 M2", "TYPE 60", "TYPE60"]:
-                key = "60M2"
-            elif tipe in ["72M2", "72", "72 M2", "TYPE 72", "TYPE72"]:
-                key = "72M2"
-            elif tipe in ["HOOK", "TYPE HOOK", "TIPE HOOK"]:
-                key = "HOOK"
-            else:
-                # Jika tipe tidak dikenali, lewati pembuatan tagihan untuk user tsb
-                continue
-
-            # Ambil nominal dari tarif_config; dukung variasi key case
-            nominal = (
-                tarif_config.get(key)
-                or tarif_config.get(key.lower())
-                or tarif_config.get(key.capitalize())
-            )
-            if not isinstance(nominal, int) or nominal <= 0:
+        operations = []
+        nominals = []
+        async for user in users_cursor:
+            resolved = self._resolve_fee_nominal(user.get("tipe_rumah"), tarif_config)
+            if not resolved:
                 continue
+            key, nominal = resolved
 
             # Buat tagihan IPL per user per bulan berdasarkan tipe rumah
             fee_dict = {
@@ -266,10 +274,67 @@ class FeeController:
                 "parent_fee_id": None,
                 "is_regenerated": False
             }
-            await db.fees.insert_one(fee_dict)
-            fees_created += 1
+            operations.append(UpdateOne(
+                {
+                    "user_id": user["id"],
+                    "kategori": key,
+                    "bulan": bulan,
+                    "status": {"$ne": "Regenerated"}
+                },
+                {"$setOnInsert": fee_dict},
+                upsert=True
+            ))
+            nominals.append(nominal)
+        
+        fees_created = 0
+        nominal_created = 0
+        batches = []
+        failure = None
+        for offset in range(0, len(operations), FEE_BULK_BATCH_SIZE):
+            batch = operations[offset:offset + FEE_BULK_BATCH_SIZE]
+            started = time.perf_counter()
+            skipped = 0
+            try:
+                result = await db.fees.bulk_write(batch, ordered=False)
+                upserted_indexes = list(result.upserted_ids.keys())
+            except BulkWriteError as e:
+                # Sebagian operasi tetap berhasil pada mode unordered
+                upserted_indexes = [item["index"] for item in e.details.get("upserted", [])]
+                write_errors = e.details.get("writeErrors", [])
+                # Duplicate key: tagihan sudah dibuat oleh generate lain yang berjalan bersamaan
+                skipped = sum(1 for error in write_errors if error.get("code") == DUPLICATE_KEY_ERROR)
+                if skipped < len(write_errors):
+                    logger.error(f"Fee generation batch for {bulan} had {len(write_errors) - skipped} errors")
+                    failure = failure or e
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+            
+            upserted = len(upserted_indexes)
+            fees_created += upserted
+            nominal_created += sum(nominals[offset + index] for index in upserted_indexes)
+            batches.append({
+                "batch": len(batches) + 1,
+                "operations": len(batch),
+                "created": upserted,
+                "skipped": skipped,
+                "elapsed_ms": elapsed_ms
+            })
+            logger.info(f"Fee generation {bulan} batch {len(batches)}: {upserted}/{len(batch)} created, {skipped} already exist, in {elapsed_ms} ms")
+        
+        # Rollup tetap mencatat tagihan yang sudah terbuat sebelum error diteruskan
+        await dashboard_rollup_service.record_fees_created(bulan, fees_created, nominal_created)
+        if failure is not None:
+            raise failure
         
-        return fees_created
+        return {"fees_created": fees_created, "batches": batches}
+
+    async def _count_fees_by_status(self, query: dict) -> dict:
+        """Hitung jumlah dan total nominal tagihan per status untuk query tertentu"""
+        db = get_database()
+        rows = await db.fees.aggregate([
+            {"$match": query},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}, "nominal": {"$sum": "$nominal"}}}
+        ]).to_list(None)
+        return {row["_id"]: {"count": row["count"], "nominal": row["nominal"]} for row in rows}
 
     async def get_regeneration_history(self, bulan: str) -> list[dict]:
         """Get regeneration history for a specific month"""
@@ -318,6 +383,19 @@ class FeeController:
         if not last_regeneration:
             return {"message": "Tidak ada regenerasi untuk bulan ini", "success": False}
         
+        # Delete the new fees created in last regeneration first: the unique index
+        # fees_user_bulan_kategori allows only one active fee per user/bulan/kategori
+        new_fees_filter = {
+            "bulan": bulan,
+            "created_at": {"$gte": last_regeneration["timestamp"]},
+            "version": 1,
+            "is_regenerated": False
+        }
+        deleted_by_status = await self._count_fees_by_status(new_fees_filter)
+        delete_result = await db.fees.delete_many(new_fees_filter)
+        if delete_result.deleted_count:
+            await dashboard_rollup_service.record_fees_deleted(bulan, deleted_by_status)
+        
         # Restore regenerated fees to unpaid status
         result = await db.fees.update_many(
             {
@@ -335,13 +413,10 @@ class FeeController:
             }
         )
         
-        # Delete the new fees created in last regeneration
-        await db.fees.delete_many({
-            "bulan": bulan,
-            "created_at": {"$gte": last_regeneration["timestamp"]},
-            "version": 1,
-            "is_regenerated": False
-        })
+        if result.modified_count:
+            await dashboard_rollup_service.record_fees_transition(
+                bulan, {"Regenerated": {"count": result.modified_count, "nominal": 0}}, "Belum Bayar"
+            )
         
         # Create rollback audit log
         rollback_audit = {
@@ -1,7 +1,7 @@
 from app.models import Notification, NotificationResponse
 from app.config.database import get_database
 from app.services.websocket_manager import websocket_manager
-from app.services.telegram_service import telegram_service
+from app.services.telegram_outbox import telegram_outbox
 import uuid
 import logging
 from datetime import datetime, timezone, timedelta
@@ -48,6 +48,8 @@ class NotificationController:
         utc_tz = timezone.utc
         current_time = datetime.now(utc_tz)
         
+        telegram_result = None
+        
         # Get all users
         users = await db.users.find({}, {"_id": 0}).to_list(1000)
         
@@ -82,18 +84,17 @@ class NotificationController:
             if tasks:
                 await asyncio.gather(*tasks, return_exceptions=True)
             
-            # Send Telegram notification
-            telegram_result = None
+            # Antrekan pesan Telegram; dikirim worker telegram_outbox di background
             try:
-                telegram_result = await telegram_service.send_broadcast_message(
+                telegram_result = await telegram_outbox.enqueue_broadcast(
                     title, message, notification_type
                 )
                 if telegram_result.get("success"):
-                    logger.info(f"Telegram notification sent: {telegram_result.get('message')}")
+                    logger.info(f"Telegram notification queued: {telegram_result.get('message')}")
                 else:
-                    logger.warning(f"Telegram notification failed: {telegram_result.get('message')}")
+                    logger.warning(f"Telegram notification not queued: {telegram_result.get('message')}")
             except Exception as e:
-                logger.error(f"Error sending Telegram notification: {e}")
+                logger.error(f"Error queueing Telegram notification: {e}")
                 telegram_result = {"success": False, "message": f"Error: {str(e)}"}
         
         response = {"message": f"Notifikasi berhasil dikirim ke {len(notifications)} pengguna"}
@@ -5,10 +5,13 @@ from app.models import (
     MidtransNotificationRequest,
 )
 from app.config.database import get_database
-from app.services.midtrans_service import MidtransService
-from app.services.websocket_manager import websocket_manager
+from app.services.midtrans_service import midtrans_service
+from app.services.payment_expiry_sweeper import payment_expiry_sweeper
+from app.services.batch_loader import RequestLoaders
+from app.services.pagination import paginate, created_at_range, DEFAULT_PAGE_SIZE
 from app.controllers.admin_controller import AdminController
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, date
+from typing import Optional
 import uuid
 import logging
 
@@ -17,7 +20,7 @@ logger = logging.getLogger(__name__)
 
 class PaymentController:
     def __init__(self):
-        self.midtrans_service = MidtransService()
+        self.midtrans_service = midtrans_service
         self.admin_controller = AdminController()
 
     def generate_order_id(self, user_id: str, fee_id: str) -> str:
@@ -33,20 +36,8 @@ class PaymentController:
         return order_id[:50]
 
     async def broadcast_dashboard_update(self):
-        """Broadcast dashboard stats update to all connected admin users"""
-        try:
-            # Get updated dashboard stats
-            dashboard_stats = await self.admin_controller.get_dashboard_stats()
-            
-            # Broadcast to all connected users
-            await websocket_manager.broadcast_to_all({
-                "type": "dashboard_update",
-                "data": dashboard_stats
-            })
-            
-            logger.info("Dashboard update broadcasted to all connected users")
-        except Exception as e:
-            logger.error(f"Failed to broadcast dashboard update: {e}")
+        """Schedule a coalesced dashboard stats broadcast to all connected admin users"""
+        await self.admin_controller.broadcast_dashboard_update()
 
     async def create_payment(self, payment_data: PaymentCreate, user_id: str, user_data: dict) -> PaymentCreateResponse:
         """Create a new payment using Midtrans"""
@@ -60,6 +51,9 @@ class PaymentController:
                 detail="Tagihan tidak ditemukan"
             )
 
+        # Payment Pending yang sudah kedaluwarsa tidak boleh menghalangi pembayaran baru
+        await payment_expiry_sweeper.expire_due({"fee_id": payment_data.fee_id})
+
         # Check if payment already exists for this fee
         existing_payment = await db.payments.find_one({
             "fee_id": payment_data.fee_id,
@@ -89,7 +83,6 @@ class PaymentController:
         payments = await db.payments.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
         
         # Handle backward compatibility for old 'method' field
-        processed_payments = []
         for payment in payments:
             if 'method' in payment and 'payment_method' not in payment:
                 payment['payment_method'] = payment.pop('method')
@@ -103,52 +96,26 @@ class PaymentController:
             if midtrans_status in ['settlement', 'capture'] and str(status_value).lower() == 'pending':
                 payment['status'] = 'Success'
 
-            # Auto-sync pending payments by checking Midtrans using order_id (more reliable)
-            if str(payment.get('status', 'Pending')).lower() == 'pending' and payment.get('order_id'):
-                try:
-                    midtrans_result = await self.midtrans_service.check_payment_status(payment['order_id'])
-                    mapped_status = self.midtrans_service._map_midtrans_status(midtrans_result.get('status', 'pending'))
-                    if mapped_status != payment.get('status'):
-                        update_data = {
-                            'status': mapped_status,
-                            'midtrans_status': midtrans_result.get('status', 'pending')
-                        }
-                        if mapped_status == 'Success':
-                            # Use UTC for settled_at
-                            update_data['settled_at'] = datetime.now(timezone.utc)
-                            await db.fees.update_one(
-                                {"id": payment["fee_id"]},
-                                {"$set": {"status": "Lunas"}}
-                            )
-                        elif mapped_status == 'Failed':
-                            await db.fees.update_one(
-                                {"id": payment["fee_id"]},
-                                {"$set": {"status": "Belum Bayar"}}
-                            )
-                        await db.payments.update_one({"id": payment["id"]}, {"$set": update_data})
-                        payment.update(update_data)
-                        
-                        # Broadcast dashboard update after status change
-                        await self.broadcast_dashboard_update()
-                except Exception:
-                    # If Midtrans check fails, keep current status without breaking the list
-                    pass
-            processed_payments.append(PaymentResponse(**payment))
-        
-        return processed_payments
+        # Status pending disinkronkan oleh payment_reconciler di background, list ini murni baca DB
+        return [PaymentResponse(**payment) for payment in payments]
 
-    async def get_pending_payments(self) -> list[PaymentWithDetails]:
+    async def get_pending_payments(self, loaders: RequestLoaders = None) -> list[PaymentWithDetails]:
         """Get all pending payments with user and fee details (admin only)"""
         db = get_database()
+        loaders = loaders or RequestLoaders()
         payments = await db.payments.find({"status": "Pending"}, {"_id": 0}).to_list(1000)
 
+        # Satu query $in per collection untuk semua payment
+        users = await loaders.users.load_many(payment["user_id"] for payment in payments)
+        fees = await loaders.fees.load_many(payment["fee_id"] for payment in payments)
+
         result = []
         for payment in payments:
             if 'method' in payment and 'payment_method' not in payment:
                 payment['payment_method'] = payment.pop('method')
             
-            user = await db.users.find_one({"id": payment["user_id"]}, {"_id": 0, "password": 0})
-            fee = await db.fees.find_one({"id": payment["fee_id"]}, {"_id": 0})
+            user = users.get(payment["user_id"])
+            fee = fees.get(payment["fee_id"])
 
             payment_with_details = PaymentWithDetails(**payment)
             if user:
@@ -160,13 +127,39 @@ class PaymentController:
 
         return result
 
-    async def get_all_payments(self) -> list[PaymentResponse]:
-        """Get all payments (admin only)"""
+    @staticmethod
+    def _admin_payments_query(
+        status: Optional[str], user_id: Optional[str], fee_id: Optional[str],
+        start: Optional[date], end: Optional[date]
+    ) -> dict:
+        """Filter server-side untuk daftar pembayaran admin"""
+        query = created_at_range(start, end)
+        if status:
+            query["status"] = status
+        if user_id:
+            query["user_id"] = user_id
+        if fee_id:
+            query["fee_id"] = fee_id
+        return query
+
+    async def get_all_payments(
+        self,
+        status: Optional[str] = None,
+        user_id: Optional[str] = None,
+        fee_id: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+    ) -> dict:
+        """Get one page of payments, newest first (admin only)"""
         db = get_database()
-        payments = await db.payments.find({}, {"_id": 0}).to_list(1000)
+        query = self._admin_payments_query(status, user_id, fee_id, start, end)
+        page = await paginate(db.payments, query, {"_id": 0}, limit, cursor, include_total)
         
         processed_payments = []
-        for payment in payments:
+        for payment in page["items"]:
             if 'method' in payment and 'payment_method' not in payment:
                 payment['payment_method'] = payment.pop('method')
             midtrans_status = (payment.get('midtrans_status') or '').lower()
@@ -177,12 +170,31 @@ class PaymentController:
                 payment['status'] = 'Success'
             processed_payments.append(PaymentResponse(**payment))
         
-        return processed_payments
+        page["items"] = processed_payments
+        return page
 
-    async def get_all_payments_with_details(self) -> list[PaymentWithDetails]:
-        """Get all payments with user and fee details (admin only)"""
+    async def get_all_payments_with_details(
+        self,
+        loaders: RequestLoaders = None,
+        status: Optional[str] = None,
+        user_id: Optional[str] = None,
+        fee_id: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+    ) -> dict:
+        """Get one page of payments with user and fee details (admin only)"""
         db = get_database()
-        payments = await db.payments.find({}, {"_id": 0}).to_list(1000)
+        loaders = loaders or RequestLoaders()
+        query = self._admin_payments_query(status, user_id, fee_id, start, end)
+        page = await paginate(db.payments, query, {"_id": 0}, limit, cursor, include_total)
+        payments = page["items"]
+        
+        # Satu query $in per collection untuk semua payment
+        users = await loaders.users.load_many(payment["user_id"] for payment in payments)
+        fees = await loaders.fees.load_many(payment["fee_id"] for payment in payments)
         
         result = []
         for payment in payments:
@@ -197,9 +209,9 @@ class PaymentController:
             if midtrans_status in ['settlement', 'capture'] and str(status_value).lower() == 'pending':
                 payment['status'] = 'Success'
             
-            # Get user and fee details
-            user = await db.users.find_one({"id": payment["user_id"]}, {"_id": 0, "password": 0})
-            fee = await db.fees.find_one({"id": payment["fee_id"]}, {"_id": 0})
+            # User and fee details (already batch loaded)
+            user = users.get(payment["user_id"])
+            fee = fees.get(payment["fee_id"])
 
             payment_with_details = PaymentWithDetails(**payment)
             if user:
@@ -209,7 +221,8 @@ class PaymentController:
 
             result.append(payment_with_details)
         
-        return result
+        page["items"] = result
+        return page
 
     async def get_payments_by_date_range(self, start: datetime, end: datetime) -> list[PaymentResponse]:
         """Get payments filtered by created_at date range for export"""
@@ -237,8 +250,9 @@ class PaymentController:
         # Teruskan model langsung ke service
         result = await self.midtrans_service.handle_notification(notification)
         
-        # Broadcast dashboard update after payment status change
-        await self.broadcast_dashboard_update()
+        # Broadcast dashboard update after payment status change (duplikat tidak mengubah apa pun)
+        if not result.get("duplicate"):
+            await self.broadcast_dashboard_update()
         
         return result
 
@@ -262,34 +276,7 @@ class PaymentController:
                 # Prefer order_id for Midtrans status checks
                 identifier = payment.get("order_id") or payment.get("transaction_id")
                 midtrans_status = await self.midtrans_service.check_payment_status(identifier)
-                new_status = self.midtrans_service._map_midtrans_status(midtrans_status.get("status", "pending"))
-                
-                if new_status != payment["status"]:
-                    update_data = {
-                        "status": new_status,
-                        "midtrans_status": midtrans_status.get("status", "pending")
-                    }
-                    
-                    if new_status == "Success":
-                        # Use UTC for settled_at
-                        update_data["settled_at"] = datetime.now(timezone.utc)
-                        await db.fees.update_one(
-                            {"id": payment["fee_id"]},
-                            {"$set": {"status": "Lunas"}}
-                        )
-                    elif new_status == "Failed":
-                        await db.fees.update_one(
-                            {"id": payment["fee_id"]},
-                            {"$set": {"status": "Belum Bayar"}}
-                        )
-                    
-                    await db.payments.update_one(
-                        {"id": payment_id},
-                        {"$set": update_data}
-                    )
-                    
-                    payment.update(update_data)
-                    
+                if await self.midtrans_service.apply_status_result(payment, midtrans_status):
                     # Broadcast dashboard update after status change
                     await self.broadcast_dashboard_update()
                     
@@ -324,40 +311,16 @@ class PaymentController:
             # Use order_id for Midtrans status checks
             identifier = payment["order_id"]
             midtrans_status = await self.midtrans_service.check_payment_status(identifier)
-            new_status = self.midtrans_service._map_midtrans_status(midtrans_status.get("status", "pending"))
             
-            if new_status != payment["status"]:
-                update_data = {
-                    "status": new_status,
-                    "midtrans_status": midtrans_status.get("status", "pending")
-                }
-                
-                if new_status == "Success":
-                    # Use UTC for settled_at
-                    update_data["settled_at"] = datetime.now(timezone.utc)
-                    await db.fees.update_one(
-                        {"id": payment["fee_id"]},
-                        {"$set": {"status": "Lunas"}}
-                    )
-                elif new_status == "Failed":
-                    await db.fees.update_one(
-                        {"id": payment["fee_id"]},
-                        {"$set": {"status": "Belum Bayar"}}
-                    )
-                
-                await db.payments.update_one(
-                    {"id": payment_id},
-                    {"$set": update_data}
-                )
-                
+            if await self.midtrans_service.apply_status_result(payment, midtrans_status):
                 # Broadcast dashboard update after status change
                 await self.broadcast_dashboard_update()
                 
                 return {
                     "payment_id": payment_id,
-                    "status": new_status,
-                    "midtrans_status": midtrans_status.get("status", "pending"),
-                    "settled_at": update_data.get("settled_at"),
+                    "status": payment["status"],
+                    "midtrans_status": payment["midtrans_status"],
+                    "settled_at": payment.get("settled_at"),
                     "updated": True
                 }
             else:
@@ -2,8 +2,13 @@ from fastapi import HTTPException, status
 from app.models import User, UserCreate, UserLogin, UserResponse, LoginResponse, UserUpdate, PasswordUpdate
 from app.security.auth import AuthManager
 from app.config.database import get_database
+from app.services.pagination import paginate, created_at_range, DEFAULT_PAGE_SIZE
+from app.services.phone_number import normalize_phone_number, phone_number_update
+from app.services.telegram_user_cache import telegram_user_cache
+from pymongo.errors import DuplicateKeyError
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, date
+from typing import Optional
 
 class UserController:
     def __init__(self):
@@ -23,6 +28,9 @@ class UserController:
         
         # Create user
         user_dict = user_data.dict()
+        nomor_hp_normalized = normalize_phone_number(user_dict.get("nomor_hp"))
+        if nomor_hp_normalized:
+            user_dict["nomor_hp_normalized"] = nomor_hp_normalized
         user_dict["password"] = self.auth_manager.hash_password(user_dict["password"])
         user_dict["id"] = str(uuid.uuid4())
         # Use is_admin from user_data if provided, otherwise default to False
@@ -32,11 +40,31 @@ class UserController:
         jakarta_tz = timezone(timedelta(hours=7))
         user_dict["created_at"] = datetime.now(jakarta_tz)
         
-        
-        await db.users.insert_one(user_dict)
+        try:
+            await db.users.insert_one(user_dict)
+        except DuplicateKeyError as e:
+            raise self._duplicate_error(e)
         
         return UserResponse(**{k: v for k, v in user_dict.items() if k != "password"})
 
+    @staticmethod
+    def _duplicate_error(error: DuplicateKeyError) -> HTTPException:
+        """Terjemahkan pelanggaran unique index users ke pesan yang bisa dibaca user"""
+        key_pattern = (error.details or {}).get("keyPattern") or {}
+        if "username" in key_pattern:
+            detail = "Username sudah digunakan"
+        else:
+            # users.id dibuat dari uuid4, jadi pelanggaran selain username berasal dari nomor_hp_normalized
+            detail = "Nomor HP sudah digunakan user lain"
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+    @staticmethod
+    def _invalidate_telegram_cache(user_id: str, update_dict: dict):
+        """Profil yang di-cache untuk bot Telegram berubah"""
+        telegram_user_cache.invalidate_user(user_id)
+        if update_dict.get("telegram_chat_id"):
+            telegram_user_cache.invalidate_chat(update_dict["telegram_chat_id"])
+
     async def login_user(self, login_data: UserLogin) -> LoginResponse:
         """Login user and return token"""
         db = get_database()
@@ -67,7 +95,11 @@ class UserController:
         update_dict = {k: v for k, v in updates.dict().items() if v is not None}
         if not update_dict:
             return UserResponse(**{k: v for k, v in current_user.items() if k != "password"})
-        await db.users.update_one({"id": current_user["id"]}, {"$set": update_dict})
+        try:
+            await db.users.update_one({"id": current_user["id"]}, phone_number_update(update_dict))
+        except DuplicateKeyError as e:
+            raise self._duplicate_error(e)
+        self._invalidate_telegram_cache(current_user["id"], update_dict)
         user = await db.users.find_one({"id": current_user["id"]})
         return UserResponse(**{k: v for k, v in user.items() if k != "password"})
 
@@ -81,12 +113,28 @@ class UserController:
         )
         return {"message": "Status admin berhasil diubah"}
 
-    async def get_all_users(self) -> list[UserResponse]:
-        """Get all users (admin only)"""
+    async def get_all_users(
+        self,
+        tipe_rumah: Optional[str] = None,
+        is_admin: Optional[bool] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+    ) -> dict:
+        """Get one page of users, newest first (admin only)"""
         db = get_database()
         
-        users = await db.users.find().to_list(1000)
-        return [UserResponse(**{k: v for k, v in user.items() if k != "password"}) for user in users]
+        query = created_at_range(start, end)
+        if tipe_rumah:
+            query["tipe_rumah"] = tipe_rumah
+        if is_admin is not None:
+            query["is_admin"] = is_admin
+        
+        page = await paginate(db.users, query, {"_id": 0, "password": 0}, limit, cursor, include_total)
+        page["items"] = [UserResponse(**user) for user in page["items"]]
+        return page
 
     async def update_user_by_id(self, user_id: str, updates: UserUpdate) -> UserResponse:
         """Update a user's profile by id (admin only)"""
@@ -104,7 +152,11 @@ class UserController:
             if not user:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User tidak ditemukan")
             return UserResponse(**{k: v for k, v in user.items() if k != "password"})
-        result = await db.users.update_one({"id": user_id}, {"$set": update_dict})
+        try:
+            result = await db.users.update_one({"id": user_id}, phone_number_update(update_dict))
+        except DuplicateKeyError as e:
+            raise self._duplicate_error(e)
+        self._invalidate_telegram_cache(user_id, update_dict)
         if result.matched_count == 0:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User tidak ditemukan")
         user = await db.users.find_one({"id": user_id})
@@ -123,6 +175,7 @@ class UserController:
         """Delete a user by id (admin only)"""
         db = get_database()
         result = await db.users.delete_one({"id": user_id})
+        telegram_user_cache.invalidate_user(user_id)
         if result.deleted_count == 0:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User tidak ditemukan")
         return {"message": "User berhasil dihapus"}
@@ -24,4 +24,5 @@ def setup_cors_middleware(app: FastAPI) -> None:
         ],
         allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+        expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
     )
@@ -43,6 +43,8 @@ from app.models.notification import (
 from app.models.response import (
     MessageResponse,
     GenerateFeesRequest,
+    FeeBatchTiming,
+    GenerateFeesResponse,
 )
 
 # Midtrans models
@@ -52,6 +54,12 @@ from app.models.midtrans import (
     MidtransNotificationRequest,
 )
 
+# Export job models
+from app.models.export import (
+    ExportJobCreate,
+    ExportJobResponse,
+)
+
 __all__ = [
     # User models
     "UserBase",
@@ -81,8 +89,13 @@ __all__ = [
     # Response models
     "MessageResponse",
     "GenerateFeesRequest",
+    "FeeBatchTiming",
+    "GenerateFeesResponse",
     # Midtrans models
     "MidtransPaymentRequest",
     "PaymentCreateResponse",
     "MidtransNotificationRequest",
+    # Export job models
+    "ExportJobCreate",
+    "ExportJobResponse",
 ]
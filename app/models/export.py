@@ -0,0 +1,38 @@
+from pydantic import BaseModel, model_validator
+from typing import Optional, Literal
+from datetime import date, datetime
+
+
+class ExportJobCreate(BaseModel):
+    report: Literal["fees", "payments"]
+    format: Literal["excel", "pdf"] = "excel"
+    # fees: bulan (YYYY-MM); payments: start & end (YYYY-MM-DD)
+    bulan: Optional[str] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+    @model_validator(mode="after")
+    def check_params(self):
+        if self.report == "fees" and not self.bulan:
+            raise ValueError("bulan wajib diisi untuk laporan iuran")
+        if self.report == "payments" and (self.start is None or self.end is None):
+            raise ValueError("start dan end wajib diisi untuk laporan pembayaran")
+        return self
+
+
+class ExportJobResponse(BaseModel):
+    id: str
+    report: str
+    format: str
+    params: dict
+    status: str  # queued, running, completed, failed
+    rows_done: int = 0
+    rows_total: Optional[int] = None
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+    reused: bool = False
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
@@ -5,6 +5,20 @@ class MessageResponse(BaseModel):
     message: str
 
 
+class FeeBatchTiming(BaseModel):
+    batch: int
+    operations: int
+    created: int
+    # Operasi yang dilewati karena tagihannya sudah ada (duplicate key)
+    skipped: int = 0
+    elapsed_ms: float
+
+
+class GenerateFeesResponse(MessageResponse):
+    # Waktu tiap batch bulk_write saat membuat tagihan
+    batches: list[FeeBatchTiming] = []
+
+
 class GenerateFeesRequest(BaseModel):
     bulan: str
     # Tarif IPL per tipe rumah; dikirim dari frontend
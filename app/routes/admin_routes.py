@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Header
 from fastapi.responses import Response
 from fastapi.responses import StreamingResponse
 from app.models import (
     UserResponse, FeeResponse, PaymentResponse, PaymentWithDetails, MessageResponse, 
-    GenerateFeesRequest, NotificationResponse, UserUpdate, PasswordUpdate, UserCreate, ResetPasswordRequest
+    GenerateFeesRequest, GenerateFeesResponse, NotificationResponse, UserUpdate, PasswordUpdate, UserCreate, ResetPasswordRequest,
+    ExportJobCreate, ExportJobResponse
 )
 from app.controllers.user_controller import UserController
 from app.controllers.fee_controller import FeeController
@@ -11,13 +12,25 @@ from app.controllers.payment_controller import PaymentController
 from app.controllers.notification_controller import NotificationController
 from app.controllers.admin_controller import AdminController
 from app.services.telegram_service import telegram_service
+from app.services.telegram_outbox import telegram_outbox
+from app.services.telegram_user_cache import telegram_user_cache
+from app.services.batch_loader import RequestLoaders, get_request_loaders
+from app.services.pagination import paginate, set_page_headers, created_at_range, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.export_service import export_service, EXPORT_MEDIA_TYPES, EXPORT_EXTENSIONS, STREAM_FORMATS
+from app.services.report_renderer import report_renderer
+from app.services.export_job_service import export_job_service
+from app.services.export_cache import export_cache
+from app.services.data_version_service import data_version_service
+from app.services.payment_reconciler import payment_reconciler
+from app.services.payment_expiry_sweeper import payment_expiry_sweeper
+from app.services.webhook_ledger import webhook_ledger
+from app.services.webhook_inbox import webhook_inbox_processor
+from app.services.phone_number import normalize_phone_number, HAS_PHONE_FILTER
 from app.security.auth import get_current_admin
 from app.config.database import get_database
 from fastapi import Path
-from typing import List
-from datetime import datetime, date
-import io
-import pandas as pd
+from typing import List, Optional
+from datetime import date
 
 router = APIRouter()
 user_controller = UserController()
@@ -33,9 +46,21 @@ async def create_user(user_data: UserCreate, current_user = Depends(get_current_
     return await user_controller.register_user(user_data)
 
 @router.get("/users", response_model=List[UserResponse])
-async def get_all_users(current_user = Depends(get_current_admin)):
-    """Get all users (admin only)"""
-    return await user_controller.get_all_users()
+async def get_all_users(
+    response: Response,
+    tipe_rumah: Optional[str] = Query(None),
+    is_admin: Optional[bool] = Query(None),
+    start: Optional[date] = Query(None, description="Created from YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="Created until YYYY-MM-DD"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Jumlah data per halaman"),
+    cursor: Optional[str] = Query(None, description="Nilai X-Next-Cursor dari halaman sebelumnya"),
+    include_total: bool = Query(False, description="Hitung total data (X-Total-Count)"),
+    current_user = Depends(get_current_admin)
+):
+    """Get users page by page, newest first (admin only)"""
+    page = await user_controller.get_all_users(tipe_rumah, is_admin, start, end, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return page["items"]
 
 @router.put("/users/{user_id}", response_model=UserResponse)
 async def update_user_profile_admin(
@@ -89,7 +114,7 @@ async def reset_user_password_admin(
     return await user_controller.reset_user_password_by_id(user_id, request.password)
 
 # Fee Management
-@router.post("/generate-fees", response_model=MessageResponse)
+@router.post("/generate-fees", response_model=GenerateFeesResponse)
 async def generate_monthly_fees(request: GenerateFeesRequest, current_user = Depends(get_current_admin)):
     """Generate monthly fees for all users (admin only)
     Tarif IPL dikirim dari frontend berdasarkan tipe rumah.
@@ -102,9 +127,23 @@ async def generate_monthly_fees(request: GenerateFeesRequest, current_user = Dep
     return await fee_controller.generate_monthly_fees(request.bulan, tarif_config)
 
 @router.get("/fees", response_model=List[FeeResponse])
-async def get_all_fees(current_user = Depends(get_current_admin)):
-    """Get all fees (admin only)"""
-    return await fee_controller.get_all_fees()
+async def get_all_fees(
+    response: Response,
+    status: Optional[str] = Query(None),
+    bulan: Optional[str] = Query(None, description="Format YYYY-MM"),
+    tipe_rumah: Optional[str] = Query(None, description="Kategori tagihan (60M2/72M2/HOOK)"),
+    user_id: Optional[str] = Query(None),
+    start: Optional[date] = Query(None, description="Created from YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="Created until YYYY-MM-DD"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Jumlah data per halaman"),
+    cursor: Optional[str] = Query(None, description="Nilai X-Next-Cursor dari halaman sebelumnya"),
+    include_total: bool = Query(False, description="Hitung total data (X-Total-Count)"),
+    current_user = Depends(get_current_admin)
+):
+    """Get fees page by page, newest first (admin only)"""
+    page = await fee_controller.get_all_fees(status, bulan, tipe_rumah, user_id, start, end, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return page["items"]
 
 @router.post("/regenerate-fees", response_model=MessageResponse)
 async def regenerate_fees_for_month(request: GenerateFeesRequest, current_user = Depends(get_current_admin)):
@@ -133,14 +172,43 @@ async def rollback_regeneration(bulan: str, current_user = Depends(get_current_a
 
 # Payment Management
 @router.get("/payments", response_model=List[PaymentResponse])
-async def get_all_payments(current_user = Depends(get_current_admin)):
-    """Get all payments (admin only)"""
-    return await payment_controller.get_all_payments()
+async def get_all_payments(
+    response: Response,
+    status: Optional[str] = Query(None),
+    user_id: Optional[str] = Query(None),
+    fee_id: Optional[str] = Query(None),
+    start: Optional[date] = Query(None, description="Created from YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="Created until YYYY-MM-DD"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Jumlah data per halaman"),
+    cursor: Optional[str] = Query(None, description="Nilai X-Next-Cursor dari halaman sebelumnya"),
+    include_total: bool = Query(False, description="Hitung total data (X-Total-Count)"),
+    current_user = Depends(get_current_admin)
+):
+    """Get payments page by page, newest first (admin only)"""
+    page = await payment_controller.get_all_payments(status, user_id, fee_id, start, end, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return page["items"]
 
 @router.get("/payments/with-details", response_model=List[PaymentWithDetails])
-async def get_all_payments_with_details(current_user = Depends(get_current_admin)):
-    """Get all payments with user and fee details (admin only)"""
-    return await payment_controller.get_all_payments_with_details()
+async def get_all_payments_with_details(
+    response: Response,
+    status: Optional[str] = Query(None),
+    user_id: Optional[str] = Query(None),
+    fee_id: Optional[str] = Query(None),
+    start: Optional[date] = Query(None, description="Created from YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="Created until YYYY-MM-DD"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Jumlah data per halaman"),
+    cursor: Optional[str] = Query(None, description="Nilai X-Next-Cursor dari halaman sebelumnya"),
+    include_total: bool = Query(False, description="Hitung total data (X-Total-Count)"),
+    current_user = Depends(get_current_admin),
+    loaders: RequestLoaders = Depends(get_request_loaders)
+):
+    """Get payments with user and fee details page by page (admin only)"""
+    page = await payment_controller.get_all_payments_with_details(
+        loaders, status, user_id, fee_id, start, end, limit, cursor, include_total
+    )
+    set_page_headers(response, page)
+    return page["items"]
 
 # Notification Management
 @router.post("/notifications/broadcast", response_model=MessageResponse)
@@ -159,18 +227,73 @@ async def test_telegram_connection(current_user = Depends(get_current_admin)):
     result = await telegram_service.test_connection()
     return result
 
+@router.get("/telegram/metrics")
+async def get_telegram_metrics(current_user = Depends(get_current_admin)):
+    """Get Telegram send rate, rate-limit and outbox metrics (admin only)"""
+    return {
+        **telegram_service.get_metrics(),
+        "outbox": await telegram_outbox.get_metrics(),
+        "user_cache": telegram_user_cache.get_metrics(),
+    }
+
+@router.get("/telegram/jobs/{job_id}")
+async def get_telegram_job(job_id: str, current_user = Depends(get_current_admin)):
+    """Get delivery status of a queued Telegram job (admin only)"""
+    job = await telegram_outbox.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Telegram job tidak ditemukan")
+    return job
+
+@router.post("/telegram/jobs/{job_id}/redrive")
+async def redrive_telegram_job(
+    job_id: str,
+    include_blocked: bool = Query(False, description="Kirim ulang juga ke user yang memblokir bot"),
+    current_user = Depends(get_current_admin)
+):
+    """Re-queue failed messages of a Telegram job without resending delivered ones (admin only)"""
+    statuses = ("failed", "blocked") if include_blocked else ("failed",)
+    requeued = await telegram_outbox.redrive(job_id, statuses)
+    return {"job_id": job_id, "requeued": requeued}
+
 @router.get("/users/with-phone")
-async def get_users_with_phone(current_user = Depends(get_current_admin)):
-    """Get all users with phone numbers for broadcast (admin only)"""
+async def get_users_with_phone(
+    tipe_rumah: Optional[str] = Query(None),
+    nomor_hp: Optional[str] = Query(None, description="Cari satu user berdasarkan nomor HP (format apa pun: 08xx, 628xx, +628xx)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Jumlah data per halaman"),
+    cursor: Optional[str] = Query(None, description="Nilai X-Next-Cursor dari halaman sebelumnya"),
+    current_user = Depends(get_current_admin)
+):
+    """Get users with phone numbers for broadcast, page by page (admin only).
+
+    total selalu jumlah seluruh user yang cocok dengan filter, bukan jumlah di halaman ini.
+    """
     db = get_database()
-    users = await db.users.find(
-        {"nomor_hp": {"$exists": True, "$ne": ""}, "is_admin": False}, 
-        {"_id": 0, "id": 1, "nama": 1, "nomor_hp": 1, "nomor_rumah": 1, "telegram_chat_id": 1}
-    ).to_list(1000)
+    query = {**HAS_PHONE_FILTER, "is_admin": False}
+    if nomor_hp is not None:
+        # Cari satu user lewat unique index nomor_hp_normalized (format E.164)
+        nomor_hp_normalized = normalize_phone_number(nomor_hp)
+        if not nomor_hp_normalized:
+            raise HTTPException(status_code=400, detail="Format nomor HP tidak valid")
+        query["nomor_hp_normalized"] = nomor_hp_normalized
+    if tipe_rumah:
+        query["tipe_rumah"] = tipe_rumah
+    page = await paginate(
+        db.users,
+        query,
+        {"_id": 0, "id": 1, "nama": 1, "nomor_hp": 1, "nomor_rumah": 1, "telegram_chat_id": 1, "created_at": 1},
+        limit,
+        cursor,
+        include_total=True,
+    )
+    users = page["items"]
+    for user in users:
+        # created_at hanya dibutuhkan untuk cursor
+        user.pop("created_at", None)
     
     return {
         "users": users,
-        "total": len(users)
+        "total": page["total"],
+        "next_cursor": page["next_cursor"]
     }
 
 @router.get("/users/telegram-status")
@@ -180,13 +303,13 @@ async def get_telegram_user_status(current_user = Depends(get_current_admin)):
     
     # Get all users with phone numbers
     all_users = await db.users.find(
-        {"nomor_hp": {"$exists": True, "$ne": ""}, "is_admin": False}, 
+        {**HAS_PHONE_FILTER, "is_admin": False}, 
         {"_id": 0, "id": 1, "nama": 1, "nomor_hp": 1, "nomor_rumah": 1, "telegram_chat_id": 1}
     ).to_list(1000)
     
     # Count users with telegram_chat_id
     users_with_telegram = await db.users.count_documents({
-        "nomor_hp": {"$exists": True, "$ne": ""}, 
+        **HAS_PHONE_FILTER,
         "is_admin": False,
         "telegram_chat_id": {"$exists": True, "$ne": ""}
     })
@@ -221,6 +344,9 @@ async def activate_user_telegram(
         {"id": user_id},
         {"$set": {"telegram_chat_id": telegram_chat_id}}
     )
+    # Mapping chat_id lama dan baru berubah
+    telegram_user_cache.invalidate_user(user_id)
+    telegram_user_cache.invalidate_chat(telegram_chat_id)
     
     if result.modified_count > 0:
         return {"message": f"Notifikasi Telegram berhasil diaktifkan untuk {user.get('nama', 'User')}"}
@@ -245,6 +371,7 @@ async def deactivate_user_telegram(
         {"id": user_id},
         {"$unset": {"telegram_chat_id": ""}}
     )
+    telegram_user_cache.invalidate_user(user_id)
     
     if result.modified_count > 0:
         return {"message": f"Notifikasi Telegram berhasil dinonaktifkan untuk {user.get('nama', 'User')}"}
@@ -257,6 +384,36 @@ async def get_dashboard_stats(current_user = Depends(get_current_admin)):
     """Get dashboard statistics (admin only)"""
     return await admin_controller.get_dashboard_stats()
 
+@router.post("/dashboard/rebuild-rollups")
+async def rebuild_dashboard_rollups(current_user = Depends(get_current_admin)):
+    """Recompute dashboard rollups from raw fees and payments (admin only)"""
+    return await admin_controller.rebuild_dashboard_rollups()
+
+@router.get("/payments/reconciler/metrics")
+async def get_payment_reconciler_metrics(current_user = Depends(get_current_admin)):
+    """Get background pending-payment reconciler metrics (admin only)"""
+    return payment_reconciler.get_metrics()
+
+@router.get("/payments/expiry-sweeper/metrics")
+async def get_payment_expiry_sweeper_metrics(current_user = Depends(get_current_admin)):
+    """Get expired-payment sweeper metrics (admin only)"""
+    return payment_expiry_sweeper.get_metrics()
+
+@router.get("/payments/webhook-ledger/metrics")
+async def get_webhook_ledger_metrics(current_user = Depends(get_current_admin)):
+    """Get Midtrans webhook dedup metrics (admin only)"""
+    return webhook_ledger.get_metrics()
+
+@router.get("/payments/webhook-inbox/metrics")
+async def get_webhook_inbox_metrics(current_user = Depends(get_current_admin)):
+    """Get Midtrans webhook inbox queue metrics (admin only)"""
+    return await webhook_inbox_processor.get_metrics()
+
+@router.get("/dashboard/broadcast-metrics")
+async def get_dashboard_broadcast_metrics(current_user = Depends(get_current_admin)):
+    """Get dashboard broadcast coalescing metrics (admin only)"""
+    return admin_controller.get_broadcast_metrics()
+
 @router.get("/unpaid-users")
 async def get_unpaid_users(
     bulan: str = Query(None, description="Bulan dalam format YYYY-MM (contoh: 2024-01)"),
@@ -281,263 +438,208 @@ async def init_sample_data():
     return await admin_controller.init_sample_data()
 
 # Reports Export
+EXPORT_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+}
+
+async def _serve_export(
+    report: str,
+    format: str,
+    params: dict,
+    data_version: str,
+    filename: str,
+    build,
+    if_none_match: Optional[str],
+    extra_headers: Optional[dict] = None,
+):
+    """Sajikan export dari cache (key = laporan, parameter, format, versi data).
+
+    Mengembalikan 304 jika If-None-Match cocok dengan ETag, isi cache jika ada,
+    atau build ke file sementara lalu simpan ke cache jika ukurannya masuk budget.
+    Format CSV/NDJSON tidak di-cache: `build` mengembalikan iterator chunk yang langsung di-stream.
+    """
+    key = export_cache.make_key(report, format, params, data_version)
+    headers = {
+        "ETag": export_cache.etag(key),
+        "Cache-Control": "private, no-cache",
+        **(extra_headers or {}),
+    }
+    if export_cache.is_not_modified(key, if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if format in STREAM_FORMATS:
+        return StreamingResponse(build(None), media_type=media_type, headers=headers)
+
+    cached = export_cache.get(key)
+    if cached:
+        return Response(content=cached["content"], media_type=cached["media_type"], headers=headers)
+
+    path = export_service.temp_path(f".{EXPORT_EXTENSIONS[format]}")
+    try:
+        await build(path)
+        content = await export_cache.put_file(key, path, media_type, filename)
+    except HTTPException:
+        export_service.remove_file(path)
+        raise
+    except Exception as e:
+        export_service.remove_file(path)
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+
+    if content is not None:
+        export_service.remove_file(path)
+        return Response(content=content, media_type=media_type, headers=headers)
+    return StreamingResponse(export_service.stream_file(path), media_type=media_type, headers=headers)
+
+async def _raw_export(dataset: str, format: str, query: dict, filename: str):
+    """Export mentah (CSV/NDJSON/Parquet) tanpa cache, untuk dataset yang tidak punya versi data"""
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    media_type = EXPORT_MEDIA_TYPES[format]
+    if format in STREAM_FORMATS:
+        return StreamingResponse(
+            export_service.stream_raw(dataset, format, query), media_type=media_type, headers=headers
+        )
+
+    path = export_service.temp_path(f".{EXPORT_EXTENSIONS[format]}")
+    try:
+        await export_service.build_parquet(dataset, query, path)
+    except HTTPException:
+        export_service.remove_file(path)
+        raise
+    except Exception as e:
+        export_service.remove_file(path)
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    return StreamingResponse(export_service.stream_file(path), media_type=media_type, headers=headers)
+
 @router.get("/reports/fees/export")
 async def export_fees(
     bulan: str = Query(..., description="Format YYYY-MM"),
-    format: str = Query("excel", pattern="^(excel|pdf)$"),
+    format: str = Query("excel", pattern="^(excel|pdf|csv|ndjson|parquet)$"),
+    if_none_match: Optional[str] = Header(None),
     current_user = Depends(get_current_admin),
 ):
-    data = await fee_controller.get_fees_by_month(bulan)
-    # Convert Pydantic models to dicts
-    records = [d.model_dump() if hasattr(d, "model_dump") else dict(d) for d in data]
-    df = pd.DataFrame(records)
-    if format == "excel":
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="Fees")
-        buffer.seek(0)
-        return StreamingResponse(
-            buffer,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f'attachment; filename="fees_{bulan}.xlsx"'},
-        )
-    else:
-        try:
-            from reportlab.pdfgen import canvas
-        except ImportError:
-            raise RuntimeError("PDF export requires reportlab. Please install it.")
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer)
-        textobject = c.beginText(40, 800)
-        textobject.textLine(f"Laporan Iuran {bulan}")
-        for row in df.to_dict(orient="records"):
-            textobject.textLine(str(row))
-        c.drawText(textobject)
-        c.showPage()
-        c.save()
-        buffer.seek(0)
-        return StreamingResponse(
-            buffer,
-            media_type="application/pdf",
-            headers={"Content-Disposition": f'attachment; filename="fees_{bulan}.pdf"'},
-        )
+    query = {"bulan": bulan}
+
+    def build(path: Optional[str]):
+        if format == "excel":
+            return export_service.build_fees_xlsx(bulan, path)
+        if format == "pdf":
+            return export_service.build_fees_pdf(bulan, path)
+        if format == "parquet":
+            return export_service.build_parquet("fees", query, path)
+        return export_service.stream_raw("fees", format, query)
+
+    return await _serve_export(
+        "fees", format, {"bulan": bulan},
+        await data_version_service.fees_version(bulan),
+        f"fees_{bulan}.{EXPORT_EXTENSIONS[format]}", build, if_none_match,
+    )
 
 @router.get("/reports/payments/export")
 async def export_payments(
     start: date = Query(..., description="Start date YYYY-MM-DD"),
     end: date = Query(..., description="End date YYYY-MM-DD"),
-    format: str = Query("excel", pattern="^(excel|pdf)$"),
+    format: str = Query("excel", pattern="^(excel|pdf|csv|ndjson|parquet)$"),
+    if_none_match: Optional[str] = Header(None),
     current_user = Depends(get_current_admin),
 ):
-    try:
-        start_dt = datetime.combine(start, datetime.min.time())
-        end_dt = datetime.combine(end, datetime.max.time())
-        
-        data = await payment_controller.get_payments_by_date_range(start_dt, end_dt)
-        
-        # Get user data for each payment
-        db = get_database()
-        export_data = []
-        
-        for payment in data:
-            try:
-                # Get user information
-                user = await db.users.find_one({"id": payment.user_id}, {"_id": 0})
-                username = user.get("username", "Unknown") if user else "Unknown"
-                
-                # Format created_at to readable string
-                if hasattr(payment.created_at, 'strftime'):
-                    created_at_str = payment.created_at.strftime("%Y-%m-%d %H:%M:%S")
-                elif isinstance(payment.created_at, str):
-                    created_at_str = payment.created_at
-                else:
-                    created_at_str = str(payment.created_at)
-                
-                # Create export record with only required fields
-                export_record = {
-                    "ID": payment.id or "",
-                    "Username": username,
-                    "Jumlah Pembayaran": payment.amount or 0,
-                    "Metode Pembayaran": payment.payment_method or "",
-                    "Status": payment.status or "",
-                    "Tanggal Pembayaran": created_at_str,
-                    # "ID Pembayaran": payment.transaction_id or "",
-                    # "URL Pembayaran": payment.payment_url or ""
-                }
-                export_data.append(export_record)
-            except Exception:
-                # Add a basic record even if there's an error
-                export_record = {
-                    "ID": payment.id or "",
-                    "Username": "Error",
-                    "Jumlah Pembayaran": 0,
-                    "Metode Pembayaran": "",
-                    "Status": "Error",
-                    "Tanggal Pembayaran": "",
-                    # "ID Pembayaran": "",
-                    # "URL Pembayaran": ""
-                }
-                export_data.append(export_record)
-        
-        df = pd.DataFrame(export_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
-    
+    # Semua format memakai rentang yang sama (hari kalender Jakarta)
+    query = created_at_range(start, end)
+    # Nama pembuat ikut tercetak di laporan, jadi ikut menjadi bagian key cache
+    created_by = current_user.get("username", "Unknown")
+
+    def build(path: Optional[str]):
+        if format == "excel":
+            return export_service.build_payments_xlsx(start, end, created_by, path)
+        if format == "pdf":
+            return export_service.build_payments_pdf(start, end, created_by, path)
+        if format == "parquet":
+            return export_service.build_parquet("payments", query, path)
+        return export_service.stream_raw("payments", format, query)
+
     if format == "excel":
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            # First, write the DataFrame to create the worksheet
-            df.to_excel(writer, index=False, sheet_name="Payments", startrow=8)
-            
-            # Now get the workbook and worksheet
-            workbook = writer.book
-            worksheet = writer.sheets["Payments"]
-            
-            # Define formats
-            header_format = workbook.add_format({
-                'bold': True,
-                'font_size': 16,
-                'align': 'center',
-                'valign': 'vcenter',
-                'bg_color': '#4CAF50',
-                'font_color': 'white'
-            })
-            
-            subheader_format = workbook.add_format({
-                'bold': True,
-                'font_size': 12,
-                'align': 'left',
-                'valign': 'vcenter'
-            })
-            
-            info_format = workbook.add_format({
-                'font_size': 10,
-                'align': 'left',
-                'valign': 'vcenter'
-            })
-            
-            # Add header information
-            worksheet.merge_range('A1:F1', 'LAPORAN PEMBAYARAN IPL CANNARY', header_format)
-            worksheet.merge_range('A2:F2', '', info_format)  # Empty row
-            
-            # Add export information
-            current_time = datetime.now().strftime("%d %B %Y %H:%M:%S")
-            worksheet.merge_range('A3:F3', f'Periode: {start} s.d {end}', subheader_format)
-            worksheet.merge_range('A4:F4', f'Dibuat pada: {current_time}', info_format)
-            worksheet.merge_range('A5:F5', f'Dibuat oleh: {current_user.get("username", "Unknown")}', info_format)
-            worksheet.merge_range('A6:F6', f'Total Data: {len(export_data)} transaksi', info_format)
-            worksheet.merge_range('A7:F7', '', info_format)  # Empty row
-            
-            # Adjust column widths
-            worksheet.set_column('A:A', 15)  # ID
-            worksheet.set_column('B:B', 15)  # Username
-            worksheet.set_column('C:C', 18)  # Jumlah Pembayaran
-            worksheet.set_column('D:D', 18)  # Metode Pembayaran
-            worksheet.set_column('E:E', 12)  # Status
-            worksheet.set_column('F:F', 20)  # Tanggal Pembayaran
-            # worksheet.set_column('G:G', 25)  # ID Pembayaran
-            # worksheet.set_column('H:H', 50)  # URL Pembayaran
-            
-            # Add table styling for data area (starting from row 8, which is row 9 in Excel)
-            if len(export_data) > 0:
-                # Create table with proper styling
-                table_data = [list(df.columns)] + [list(row) for row in df.values]
-                worksheet.add_table(8, 0, 8 + len(export_data), len(df.columns) - 1, {
-                    'columns': [{'header': col} for col in df.columns],
-                    'style': 'Table Style Medium 9',
-                    'first_column': False,
-                    'banded_rows': True
-                })
-            
-        buffer.seek(0)
-        return StreamingResponse(
-            buffer,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f'attachment; filename="Laporan_Pembayaran_IPL_Cannart_{start}_{end}.xlsx"',
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization",
-            },
-        )
+        filename = f"Laporan_Pembayaran_IPL_Cannart_{start}_{end}.xlsx"
+    elif format == "pdf":
+        filename = f"Laporan_Pembayaran_IPL_Cannary_{start}_{end}.pdf"
     else:
-        try:
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import letter
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-            from reportlab.lib import colors
-            from reportlab.lib.units import inch
-        except ImportError:
-            raise RuntimeError("PDF export requires reportlab. Please install it.")
-        
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Add title
-        title = Paragraph("LAPORAN PEMBAYARAN IPL CANNARY", styles['Title'])
-        story.append(title)
-        story.append(Spacer(1, 12))
-        
-        # Add export information
-        current_time = datetime.now().strftime("%d %B %Y %H:%M:%S")
-        info_data = [
-            [f"Periode: {start} s.d {end}"],
-            [f"Dibuat pada: {current_time}"],
-            [f"Dibuat oleh: {current_user.get('username', 'Unknown')}"],
-            [f"Total Data: {len(export_data)} transaksi"]
-        ]
-        
-        info_table = Table(info_data)
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 20))
-        
-        # Add data table
-        if len(export_data) > 0:
-            # Prepare table data
-            table_data = [list(df.columns)]  # Headers
-            for _, row in df.iterrows():
-                table_data.append([str(val) for val in row.values])
-            
-            # Create table
-            data_table = Table(table_data)
-            data_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            story.append(data_table)
-        else:
-            no_data = Paragraph("Tidak ada data pembayaran untuk periode yang dipilih.", styles['Normal'])
-            story.append(no_data)
-        
-        doc.build(story)
-        buffer.seek(0)
-        return StreamingResponse(
-            buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="Laporan_Pembayaran_IPL_Cannary_{start}_{end}.pdf"',
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization",
-            },
-        )
+        filename = f"payments_{start}_{end}.{EXPORT_EXTENSIONS[format]}"
+    return await _serve_export(
+        "payments", format,
+        {"start": start.isoformat(), "end": end.isoformat(), "created_by": created_by},
+        await data_version_service.payments_version(start, end),
+        filename, build, if_none_match, EXPORT_CORS_HEADERS,
+    )
+
+@router.get("/reports/users/export")
+async def export_users(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    current_user = Depends(get_current_admin),
+):
+    """Export all users as CSV/NDJSON/Parquet, without passwords (admin only)"""
+    return await _raw_export("users", format, {}, f"users.{EXPORT_EXTENSIONS[format]}")
+
+@router.get("/reports/notifications/export")
+async def export_notifications(
+    start: Optional[date] = Query(None, description="Start date YYYY-MM-DD"),
+    end: Optional[date] = Query(None, description="End date YYYY-MM-DD"),
+    user_id: Optional[str] = Query(None),
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    current_user = Depends(get_current_admin),
+):
+    """Export notifications as CSV/NDJSON/Parquet (admin only)"""
+    query = created_at_range(start, end)
+    if user_id:
+        query["user_id"] = user_id
+    return await _raw_export("notifications", format, query, f"notifications.{EXPORT_EXTENSIONS[format]}")
+
+@router.get("/reports/export-cache/metrics")
+async def get_export_cache_metrics(current_user = Depends(get_current_admin)):
+    """Get export cache hit rate and size (admin only)"""
+    return export_cache.get_metrics()
+
+# Export jobs (untuk export besar yang tidak muat dalam satu request)
+def _export_job_response(job: dict) -> ExportJobResponse:
+    artifact = job.get("artifact") or {}
+    return ExportJobResponse(
+        **job,
+        filename=artifact.get("filename"),
+        size=artifact.get("size"),
+        download_url=f"/api/admin/reports/jobs/{job['id']}/download" if job["status"] == "completed" else None,
+    )
+
+@router.post("/reports/jobs", response_model=ExportJobResponse, status_code=202)
+async def create_export_job(request: ExportJobCreate, current_user = Depends(get_current_admin)):
+    """Create a background export job, reusing an active job with the same parameters (admin only)"""
+    job = await export_job_service.create_job(request, current_user.get("username", "Unknown"))
+    return _export_job_response(job)
+
+@router.get("/reports/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(job_id: str, current_user = Depends(get_current_admin)):
+    """Get export job status and progress (admin only)"""
+    job = await export_job_service.get_job(job_id)
+    return _export_job_response(job)
+
+@router.get("/reports/jobs/{job_id}/download")
+async def download_export_job(job_id: str, current_user = Depends(get_current_admin)):
+    """Download the artifact of a completed export job (admin only)"""
+    job, content = await export_job_service.open_artifact(job_id)
+    artifact = job["artifact"]
+    return StreamingResponse(
+        content,
+        media_type=artifact["media_type"],
+        headers={
+            "Content-Disposition": f'attachment; filename="{artifact["filename"]}"',
+            "Content-Length": str(artifact["size"]),
+        },
+    )
+
+@router.get("/reports/render-metrics")
+async def get_report_render_metrics(current_user = Depends(get_current_admin)):
+    """Get PDF render queue depth and render time metrics (admin only)"""
+    return report_renderer.get_metrics()
 
 # Handle CORS preflight request
 @router.options("/reports/payments/export")
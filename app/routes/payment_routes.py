@@ -4,11 +4,15 @@ from app.models import (
     PaymentCreate,
     PaymentResponse,
     PaymentCreateResponse,
-    MidtransNotificationRequest,
 )
 from app.controllers.payment_controller import PaymentController
 from app.security.auth import get_current_user
 from app.security.webhook_security import validate_webhook_request
+from app.services.webhook_inbox import webhook_inbox_processor
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 payment_controller = PaymentController()
@@ -32,40 +36,36 @@ async def get_user_payments(current_user=Depends(get_current_user)):
 
 @router.post("/payments/notification")
 async def handle_midtrans_notification(request: Request):
-    """Handle payment notification from Midtrans (webhook)"""
+    """Handle payment notification from Midtrans (webhook).
+
+    Payload disimpan ke webhook_inbox lalu langsung dijawab 200; pemrosesan
+    payment/fee dan broadcast dashboard dilakukan webhook_inbox_processor.
+    """
+    # Get raw body for signature verification
+    body = await request.body()
+    body_str = body.decode('utf-8')
+
+    # Get signature from headers
+    signature = request.headers.get("X-Midtrans-Signature") or request.headers.get("X-Signature")
+
+    # Validate webhook signature
+    validate_webhook_request(body_str, signature)
+
+    try:
+        notification_data = json.loads(body_str)
+    except ValueError:
+        return {"status": "error", "message": "Invalid JSON body"}
+    if not isinstance(notification_data, dict):
+        return {"status": "error", "message": "Invalid notification payload"}
+
     try:
-        # Get raw body for signature verification
-        body = await request.body()
-        body_str = body.decode('utf-8')
-        
-        # Get signature from headers
-        signature = request.headers.get("X-Midtrans-Signature") or request.headers.get("X-Signature")
-        
-        # Validate webhook signature
-        validate_webhook_request(body_str, signature)
-        
-        # Parse JSON data
-        notification_data = await request.json()
-
-        # Normalisasi VA info jika dikirim dalam va_numbers
-        if isinstance(notification_data, dict) and notification_data.get("va_numbers"):
-            try:
-                va = notification_data["va_numbers"][0]
-                notification_data["bank"] = va.get("bank")
-                notification_data["va_number"] = va.get("va_number")
-            except Exception:
-                pass
-
-        # Validasi dengan Pydantic (supaya error handling lebih rapi)
-        notification = MidtransNotificationRequest(**notification_data)
-
-        # Teruskan ke controller sebagai model Pydantic
-        return await payment_controller.handle_midtrans_notification(notification)
-
-    except HTTPException:
-        raise
+        entry_id = await webhook_inbox_processor.enqueue(notification_data)
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        # Jangan jawab 200 jika payload tidak tersimpan, supaya Midtrans mengirim ulang
+        logger.error(f"Failed to store Midtrans notification: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Notification not stored")
+
+    return {"status": "accepted", "id": entry_id}
 
 
 @router.get("/payments/status/{transaction_id}")
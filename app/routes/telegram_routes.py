@@ -1,6 +1,9 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
 from app.config.database import get_database
 from app.models.response import MessageResponse
+from app.services.telegram_service import telegram_service
+from app.services.phone_number import normalize_phone_number
+from app.services.telegram_user_cache import telegram_user_cache
 import logging
 import json
 
@@ -58,11 +61,11 @@ async def handle_phone_number_input(chat_id: int, user_id: int, phone_input: str
     try:
         db = get_database()
         
-        # Clean phone number input (remove spaces, dashes, etc.)
-        phone_clean = phone_input.strip().replace(" ", "").replace("-", "").replace("+", "")
+        # Normalisasi ke E.164 (+628xx) agar 08xx, 628xx dan +628xx cocok dengan satu lookup
+        phone_normalized = normalize_phone_number(phone_input)
         
-        # Check if input looks like a phone number (contains digits)
-        if not phone_clean.isdigit() or len(phone_clean) < 10:
+        # Check if input looks like a phone number
+        if not phone_normalized:
             await send_telegram_message(
                 chat_id,
                 f"❌ **Format nomor HP tidak valid!**\n\n"
@@ -74,20 +77,8 @@ async def handle_phone_number_input(chat_id: int, user_id: int, phone_input: str
             )
             return
         
-        # Try to find user by phone number
-        user = await db.users.find_one({"nomor_hp": phone_clean})
-        
-        if not user:
-            # Try with different phone number formats
-            # Format 1: 08xx -> 628xx
-            if phone_clean.startswith("08"):
-                phone_alt = "62" + phone_clean[1:]
-                user = await db.users.find_one({"nomor_hp": phone_alt})
-            
-            # Format 2: 628xx -> 08xx
-            elif phone_clean.startswith("62"):
-                phone_alt = "0" + phone_clean[2:]
-                user = await db.users.find_one({"nomor_hp": phone_alt})
+        # Satu point lookup lewat unique index users.nomor_hp_normalized
+        user = await db.users.find_one({"nomor_hp_normalized": phone_normalized})
         
         if not user:
             await send_telegram_message(
@@ -126,6 +117,9 @@ async def handle_phone_number_input(chat_id: int, user_id: int, phone_input: str
             {"id": user["id"]},
             {"$set": {"telegram_chat_id": str(chat_id)}}
         )
+        # Chat lama milik user ini (jika relink) juga tidak boleh lagi mengarah ke user
+        telegram_user_cache.invalidate_chat(chat_id)
+        telegram_user_cache.invalidate_user(user["id"])
         
         if result.modified_count > 0:
             logger.info(f"Successfully linked Telegram chat_id {chat_id} to user {user.get('nama', 'Unknown')}")
@@ -170,10 +164,8 @@ async def handle_status_command(chat_id: int, user_id: int):
     Handle /status command to check notification status
     """
     try:
-        db = get_database()
-        
-        # Find user by telegram_chat_id
-        user = await db.users.find_one({"telegram_chat_id": str(chat_id)})
+        # Find user by telegram_chat_id (lewat cache; sebagian besar command tidak menyentuh MongoDB)
+        user = await telegram_user_cache.get_user(chat_id)
         
         if not user:
             await send_telegram_message(
@@ -249,7 +241,7 @@ async def handle_start_command(chat_id: int, user_id: int, username: str, first_
         db = get_database()
         
         # Check if user already has telegram_chat_id
-        existing_user = await db.users.find_one({"telegram_chat_id": str(chat_id)})
+        existing_user = await telegram_user_cache.get_user(chat_id)
         if existing_user:
             await send_telegram_message(
                 chat_id,
@@ -286,6 +278,9 @@ async def handle_start_command(chat_id: int, user_id: int, username: str, first_
             {"id": user["id"]},
             {"$set": {"telegram_chat_id": str(chat_id)}}
         )
+        # Chat lama milik user ini (jika relink) juga tidak boleh lagi mengarah ke user
+        telegram_user_cache.invalidate_chat(chat_id)
+        telegram_user_cache.invalidate_user(user["id"])
         
         if result.modified_count > 0:
             logger.info(f"Successfully linked Telegram chat_id {chat_id} to user {user.get('nama', 'Unknown')}")
@@ -316,39 +311,9 @@ async def handle_start_command(chat_id: int, user_id: int, username: str, first_
 
 async def send_telegram_message(chat_id: int, message: str):
     """
-    Send message to Telegram chat
+    Send message to Telegram chat (lewat client Telegram bersama)
     """
-    try:
-        import aiohttp
-        import os
-        from dotenv import load_dotenv
-        
-        load_dotenv()
-        bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        
-        if not bot_token:
-            logger.error("TELEGRAM_BOT_TOKEN not found")
-            return False
-        
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        data = {
-            "chat_id": chat_id,
-            "text": message,
-            "parse_mode": "Markdown"
-        }
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data) as response:
-                if response.status == 200:
-                    logger.info(f"Message sent successfully to chat_id {chat_id}")
-                    return True
-                else:
-                    logger.error(f"Failed to send message: {response.status}")
-                    return False
-                    
-    except Exception as e:
-        logger.error(f"Error sending Telegram message: {e}")
-        return False
+    return await telegram_service.send_to_chat_id(chat_id, message)
 
 @router.get("/telegram/webhook/info")
 async def webhook_info():
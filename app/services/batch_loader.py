@@ -0,0 +1,52 @@
+from typing import Iterable, Optional
+from app.config.database import get_database
+
+
+class BatchLoader:
+    """Loader ala DataLoader untuk satu collection, berlaku selama satu request.
+
+    Id yang dibutuhkan dikumpulkan lalu diambil dengan satu query $in;
+    hasilnya (termasuk id yang tidak ditemukan) disimpan sampai request selesai.
+    """
+
+    def __init__(self, collection_name: str, key: str = "id", projection: Optional[dict] = None):
+        self.collection_name = collection_name
+        self.key = key
+        self.projection = {"_id": 0, **(projection or {})}
+        self._cache: dict = {}
+        self.query_count = 0
+
+    async def load_many(self, keys: Iterable) -> dict:
+        """Ambil dokumen untuk semua key, hanya key yang belum di-cache yang di-query"""
+        keys = [key for key in dict.fromkeys(keys) if key is not None]
+        missing = [key for key in keys if key not in self._cache]
+
+        if missing:
+            db = get_database()
+            self.query_count += 1
+            documents = await db[self.collection_name].find(
+                {self.key: {"$in": missing}}, self.projection
+            ).to_list(None)
+            for key in missing:
+                self._cache[key] = None
+            for document in documents:
+                self._cache[document[self.key]] = document
+
+        return {key: self._cache[key] for key in keys}
+
+    async def load(self, key) -> Optional[dict]:
+        """Ambil satu dokumen (memakai cache yang sama dengan load_many)"""
+        return (await self.load_many([key])).get(key)
+
+
+class RequestLoaders:
+    """Kumpulan loader yang dipakai endpoint daftar pembayaran"""
+
+    def __init__(self):
+        self.users = BatchLoader("users", projection={"password": 0})
+        self.fees = BatchLoader("fees")
+
+
+def get_request_loaders() -> RequestLoaders:
+    """FastAPI dependency: loader baru untuk setiap request"""
+    return RequestLoaders()
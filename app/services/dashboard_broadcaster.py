@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from app.services.websocket_manager import websocket_manager
+from app.services.dashboard_rollup_service import dashboard_rollup_service
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardBroadcaster:
+    """Menggabungkan event perubahan dashboard dalam satu window waktu.
+
+    Setiap event pembayaran cukup memanggil mark_dirty(); statistik dihitung
+    sekali per window lalu dikirim satu kali ke semua koneksi WebSocket.
+    """
+
+    def __init__(self, window_seconds: float = None):
+        if window_seconds is None:
+            window_seconds = int(os.getenv("DASHBOARD_BROADCAST_WINDOW_MS", "1000")) / 1000
+        self.window_seconds = window_seconds
+        self._pending_events = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._metrics = {
+            "events_received": 0,
+            "events_coalesced": 0,
+            "broadcasts_sent": 0,
+            "broadcasts_skipped": 0,
+            "broadcast_failures": 0,
+            "last_broadcast_at": None,
+            "last_broadcast_ms": None,
+        }
+
+    def mark_dirty(self):
+        """Tandai dashboard berubah; broadcast dijadwalkan di akhir window"""
+        self._metrics["events_received"] += 1
+        self._pending_events += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_after_window())
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window_seconds)
+
+        # Event yang datang selama proses broadcast akan menjadwalkan window baru
+        events = self._pending_events
+        self._pending_events = 0
+        self._flush_task = None
+        if events <= 0:
+            return
+        self._metrics["events_coalesced"] += events - 1
+
+        if websocket_manager.get_connection_count() == 0:
+            # Tidak ada yang mendengarkan, tidak perlu menghitung statistik
+            self._metrics["broadcasts_skipped"] += 1
+            return
+
+        started = time.perf_counter()
+        try:
+            dashboard_stats = await dashboard_rollup_service.get_dashboard_stats()
+            await websocket_manager.broadcast_to_all({
+                "type": "dashboard_update",
+                "data": dashboard_stats
+            })
+            self._metrics["broadcasts_sent"] += 1
+            self._metrics["last_broadcast_at"] = datetime.now(timezone.utc).isoformat()
+            self._metrics["last_broadcast_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            logger.info(f"Dashboard update broadcasted ({events} events coalesced into one)")
+        except Exception as e:
+            self._metrics["broadcast_failures"] += 1
+            logger.error(f"Failed to broadcast dashboard update: {e}")
+
+    def get_metrics(self) -> dict:
+        """Metrics jumlah event vs broadcast yang benar-benar dikirim"""
+        return {
+            **self._metrics,
+            "pending_events": self._pending_events,
+            "window_ms": int(self.window_seconds * 1000),
+        }
+
+    async def shutdown(self):
+        """Batalkan broadcast yang masih terjadwal"""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+
+
+# Global instance
+dashboard_broadcaster = DashboardBroadcaster()
@@ -0,0 +1,352 @@
+from app.config.database import get_database
+from app.services.data_version_service import data_version_service
+from pymongo import ReturnDocument, ReplaceOne
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Satu dokumen per bulan ("month:YYYY-MM") dan satu dokumen counter global
+ROLLUP_COLLECTION = "dashboard_rollups"
+GLOBAL_ROLLUP_ID = "global"
+
+PAID_FEE_STATUS = "Lunas"
+
+
+def _month_rollup_id(bulan: str) -> str:
+    return f"month:{bulan}"
+
+
+def _status_key(value) -> str:
+    # Dokumen lama bisa saja tidak punya status
+    return value or "Unknown"
+
+
+class DashboardRollupService:
+    """Counter dashboard yang di-maintain secara incremental dengan $inc.
+
+    Setiap perubahan tagihan/pembayaran yang mempengaruhi dashboard harus
+    lewat method di service ini supaya dokumen rollup tetap sinkron.
+    Jika terjadi selisih, jalankan rebuild() untuk menghitung ulang dari awal.
+    """
+
+    def _collection(self):
+        return get_database()[ROLLUP_COLLECTION]
+
+    async def _apply(self, month_inc: dict = None, global_inc: dict = None, bulan: str = None):
+        """Terapkan increment ke dokumen bulan dan/atau global"""
+        now = datetime.now(timezone.utc)
+        collection = self._collection()
+        tasks = []
+        if bulan and month_inc:
+            tasks.append(collection.update_one(
+                {"_id": _month_rollup_id(bulan)},
+                {"$inc": month_inc, "$set": {"bulan": bulan, "type": "month", "updated_at": now}},
+                upsert=True
+            ))
+            # Tagihan bulan ini berubah: versi cache export ikut naik
+            tasks.append(data_version_service.bump_fees(bulan))
+        if global_inc:
+            tasks.append(collection.update_one(
+                {"_id": GLOBAL_ROLLUP_ID},
+                {"$inc": global_inc, "$set": {"type": "global", "updated_at": now}},
+                upsert=True
+            ))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    # ------------------------------------------------------------------
+    # Fees
+    # ------------------------------------------------------------------
+    async def record_fees_created(self, bulan: str, count: int, nominal_total: int, status: str = "Belum Bayar"):
+        """Catat tagihan baru untuk satu bulan"""
+        if count <= 0:
+            return
+        month_inc = {
+            "fees_total": count,
+            f"fees_status.{_status_key(status)}": count,
+            "nominal_total": nominal_total,
+        }
+        if status == PAID_FEE_STATUS:
+            month_inc["nominal_lunas"] = nominal_total
+        await self._apply(
+            month_inc=month_inc,
+            global_inc={"fees_total": count, f"fees_status.{_status_key(status)}": count},
+            bulan=bulan
+        )
+
+    async def record_fees_deleted(self, bulan: str, by_status: dict):
+        """Catat tagihan yang dihapus; by_status: {status: {"count": n, "nominal": total}}"""
+        month_inc = {}
+        global_inc = {}
+        for fee_status, stats in by_status.items():
+            count = stats.get("count", 0)
+            nominal = stats.get("nominal", 0)
+            if count <= 0:
+                continue
+            month_inc["fees_total"] = month_inc.get("fees_total", 0) - count
+            month_inc["nominal_total"] = month_inc.get("nominal_total", 0) - nominal
+            month_inc[f"fees_status.{_status_key(fee_status)}"] = -count
+            if fee_status == PAID_FEE_STATUS:
+                month_inc["nominal_lunas"] = -nominal
+            global_inc["fees_total"] = global_inc.get("fees_total", 0) - count
+            global_inc[f"fees_status.{_status_key(fee_status)}"] = -count
+        await self._apply(month_inc=month_inc, global_inc=global_inc, bulan=bulan)
+
+    async def record_fees_transition(self, bulan: str, by_status: dict, new_status: str):
+        """Catat perpindahan status beberapa tagihan sekaligus ke new_status"""
+        month_inc = {}
+        global_inc = {}
+        for old_status, stats in by_status.items():
+            count = stats.get("count", 0)
+            nominal = stats.get("nominal", 0)
+            if count <= 0 or old_status == new_status:
+                continue
+            old_key = f"fees_status.{_status_key(old_status)}"
+            new_key = f"fees_status.{_status_key(new_status)}"
+            for inc in (month_inc, global_inc):
+                inc[old_key] = inc.get(old_key, 0) - count
+                inc[new_key] = inc.get(new_key, 0) + count
+            if old_status == PAID_FEE_STATUS:
+                month_inc["nominal_lunas"] = month_inc.get("nominal_lunas", 0) - nominal
+            if new_status == PAID_FEE_STATUS:
+                month_inc["nominal_lunas"] = month_inc.get("nominal_lunas", 0) + nominal
+        await self._apply(month_inc=month_inc, global_inc=global_inc, bulan=bulan)
+
+    async def update_fee_status(self, fee_id: str, new_status: str) -> Optional[dict]:
+        """Ubah status tagihan dan catat perubahannya; mengembalikan dokumen sebelum diubah"""
+        db = get_database()
+        previous = await db.fees.find_one_and_update(
+            {"id": fee_id},
+            {"$set": {"status": new_status}},
+            projection={"_id": 0, "bulan": 1, "nominal": 1, "status": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous and previous.get("status") != new_status:
+            await self.record_fees_transition(
+                previous.get("bulan"),
+                {previous.get("status"): {"count": 1, "nominal": previous.get("nominal", 0)}},
+                new_status
+            )
+        return previous
+
+    # ------------------------------------------------------------------
+    # Payments
+    # ------------------------------------------------------------------
+    async def record_payment_created(self, status: str = "Pending", created_at: datetime = None):
+        """Catat pembayaran baru"""
+        await asyncio.gather(
+            self._apply(global_inc={"payments_total": 1, f"payments_status.{_status_key(status)}": 1}),
+            data_version_service.bump_payments(created_at or datetime.now(timezone.utc))
+        )
+
+    async def record_payments_transition(self, by_status: dict, new_status: str):
+        """Catat perpindahan status pembayaran; by_status: {status_lama: jumlah}"""
+        global_inc = {}
+        for old_status, count in by_status.items():
+            if count <= 0 or old_status == new_status:
+                continue
+            old_key = f"payments_status.{_status_key(old_status)}"
+            new_key = f"payments_status.{_status_key(new_status)}"
+            global_inc[old_key] = global_inc.get(old_key, 0) - count
+            global_inc[new_key] = global_inc.get(new_key, 0) + count
+        await self._apply(global_inc=global_inc)
+
+    async def update_payment(self, query: dict, update_data: dict) -> Optional[dict]:
+        """Update satu pembayaran dan catat perubahan status; mengembalikan dokumen sebelum diubah"""
+        db = get_database()
+        previous = await db.payments.find_one_and_update(
+            query,
+            {"$set": update_data},
+            projection={"_id": 0, "status": 1, "created_at": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous:
+            await data_version_service.bump_payments(previous.get("created_at"))
+        new_status = update_data.get("status")
+        if previous and new_status and previous.get("status") != new_status:
+            await self.record_payments_transition({previous.get("status"): 1}, new_status)
+        return previous
+
+    # ------------------------------------------------------------------
+    # Read & rebuild
+    # ------------------------------------------------------------------
+    async def get_dashboard_stats(self) -> dict:
+        """Statistik dashboard dari dokumen rollup (tidak tergantung jumlah histori)"""
+        db = get_database()
+
+        # Calculate current month and the last 6 months for chart
+        jakarta_tz = timezone(timedelta(hours=7))
+        current_time = datetime.now(jakarta_tz)
+        current_month = current_time.strftime("%Y-%m")
+
+        chart_months = []
+        for i in range(6):
+            month_date = current_time - timedelta(days=30 * i)
+            chart_months.append((month_date.strftime("%Y-%m"), month_date.strftime("%b")))
+        chart_months.reverse()  # Show oldest to newest
+
+        rollup_ids = [GLOBAL_ROLLUP_ID, _month_rollup_id(current_month)]
+        rollup_ids += [_month_rollup_id(month) for month, _ in chart_months]
+
+        total_users, rollups = await asyncio.gather(
+            db.users.count_documents({"is_admin": False}),
+            self._collection().find({"_id": {"$in": rollup_ids}}).to_list(None)
+        )
+        rollups = {doc["_id"]: doc for doc in rollups}
+
+        if GLOBAL_ROLLUP_ID not in rollups:
+            # Belum pernah dibangun (deploy pertama) - hitung dari data mentah
+            await self.rebuild()
+            rollups = {
+                doc["_id"]: doc
+                for doc in await self._collection().find({"_id": {"$in": rollup_ids}}).to_list(None)
+            }
+
+        global_rollup = rollups.get(GLOBAL_ROLLUP_ID, {})
+        fees_by_status = global_rollup.get("fees_status", {})
+        payments_by_status = global_rollup.get("payments_status", {})
+
+        # Count unpaid fees: includes "Belum Bayar" and fees with failed payments
+        unpaid_fees = fees_by_status.get("Belum Bayar", 0) + global_rollup.get("fees_with_failed_payment", 0)
+
+        # Count payments by status - using correct status values
+        pending_payments = payments_by_status.get("Pending", 0)
+        approved_payments = sum(payments_by_status.get(s, 0) for s in ["Settlement", "Success"])
+        failed_payments = sum(payments_by_status.get(s, 0) for s in ["Deny", "Cancel", "Expire", "Failed"])
+
+        # Calculate current month collection and collection rate
+        current_month_rollup = rollups.get(_month_rollup_id(current_month), {})
+        current_month_collection = current_month_rollup.get("nominal_lunas", 0)
+        total_expected = current_month_rollup.get("nominal_total", 0)
+        collection_rate = round((current_month_collection / total_expected * 100) if total_expected > 0 else 0, 1)
+
+        # Monthly fees for chart (last 6 months)
+        monthly_fees = [
+            {"month": month_name, "total": rollups.get(_month_rollup_id(month), {}).get("nominal_lunas", 0)}
+            for month, month_name in chart_months
+        ]
+
+        return {
+            "totalUsers": total_users,
+            "totalFees": global_rollup.get("fees_total", 0),
+            "pendingPayments": pending_payments,
+            "approvedPayments": approved_payments,
+            "failedPayments": failed_payments,
+            "currentMonthCollection": current_month_collection,
+            "collectionRate": collection_rate,
+            "monthlyFees": monthly_fees,
+            "unpaidFees": unpaid_fees
+        }
+
+    async def rebuild(self) -> dict:
+        """Hitung ulang semua dokumen rollup dari koleksi fees dan payments"""
+        db = get_database()
+        now = datetime.now(timezone.utc)
+
+        fee_groups, payment_groups, failed_payment_fees = await asyncio.gather(
+            db.fees.aggregate([
+                {
+                    "$group": {
+                        "_id": {"bulan": "$bulan", "status": "$status"},
+                        "count": {"$sum": 1},
+                        "nominal": {"$sum": "$nominal"}
+                    }
+                }
+            ]).to_list(None),
+            db.payments.aggregate([
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+            ]).to_list(None),
+            # Fees that have failed payments (Deny, Cancel, Expire)
+            db.fees.aggregate([
+                {"$match": {"status": {"$in": ["Belum Bayar", "Pending"]}}},
+                {
+                    "$lookup": {
+                        "from": "payments",
+                        "localField": "id",
+                        "foreignField": "fee_id",
+                        "pipeline": [
+                            {"$match": {"status": {"$in": ["Deny", "Cancel", "Expire"]}}},
+                            {"$limit": 1},
+                            {"$project": {"_id": 1}}
+                        ],
+                        "as": "failed_payments"
+                    }
+                },
+                {"$match": {"failed_payments.0": {"$exists": True}}},
+                {"$count": "count"}
+            ]).to_list(1)
+        )
+
+        global_rollup = {
+            "_id": GLOBAL_ROLLUP_ID,
+            "type": "global",
+            "fees_total": 0,
+            "fees_status": {},
+            "payments_total": 0,
+            "payments_status": {},
+            "fees_with_failed_payment": failed_payment_fees[0].get("count", 0) if failed_payment_fees else 0,
+            "updated_at": now,
+            "rebuilt_at": now,
+        }
+        month_rollups = {}
+        for row in fee_groups:
+            bulan = row["_id"].get("bulan")
+            fee_status = _status_key(row["_id"].get("status"))
+            count = row.get("count", 0)
+            nominal = row.get("nominal", 0)
+
+            global_rollup["fees_total"] += count
+            global_rollup["fees_status"][fee_status] = global_rollup["fees_status"].get(fee_status, 0) + count
+
+            if not bulan:
+                continue
+            month_rollup = month_rollups.setdefault(bulan, {
+                "_id": _month_rollup_id(bulan),
+                "type": "month",
+                "bulan": bulan,
+                "fees_total": 0,
+                "fees_status": {},
+                "nominal_total": 0,
+                "nominal_lunas": 0,
+                "updated_at": now,
+                "rebuilt_at": now,
+            })
+            month_rollup["fees_total"] += count
+            month_rollup["fees_status"][fee_status] = month_rollup["fees_status"].get(fee_status, 0) + count
+            month_rollup["nominal_total"] += nominal
+            if fee_status == PAID_FEE_STATUS:
+                month_rollup["nominal_lunas"] += nominal
+
+        for row in payment_groups:
+            global_rollup["payments_total"] += row.get("count", 0)
+            payment_status = _status_key(row["_id"])
+            global_rollup["payments_status"][payment_status] = (
+                global_rollup["payments_status"].get(payment_status, 0) + row.get("count", 0)
+            )
+
+        operations = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in month_rollups.values()]
+        operations.append(ReplaceOne({"_id": GLOBAL_ROLLUP_ID}, global_rollup, upsert=True))
+
+        collection = self._collection()
+        await collection.bulk_write(operations, ordered=False)
+        # Rebuild dipakai setelah data diubah di luar service ini, jadi semua versi export dianggap berubah
+        await data_version_service.bump_all()
+        # Hapus rollup bulan yang sudah tidak punya tagihan
+        await collection.delete_many({
+            "type": "month",
+            "_id": {"$nin": [doc["_id"] for doc in month_rollups.values()]}
+        })
+
+        logger.info(f"Dashboard rollups rebuilt: {len(month_rollups)} months, {global_rollup['fees_total']} fees")
+        return {
+            "months": len(month_rollups),
+            "fees_total": global_rollup["fees_total"],
+            "payments_total": global_rollup["payments_total"],
+        }
+
+
+# Global instance
+dashboard_rollup_service = DashboardRollupService()
@@ -0,0 +1,93 @@
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from app.config.database import get_database
+from app.services.pagination import created_at_range
+
+# Satu dokumen counter per bulan: "fees:YYYY-MM" / "payments:YYYY-MM",
+# plus "epoch" yang dinaikkan saat data diganti massal (misalnya init sample data)
+DATA_VERSION_COLLECTION = "data_versions"
+EPOCH_ID = "epoch"
+
+
+def _month_of(value) -> Optional[str]:
+    """Bulan (UTC) dari created_at pembayaran, sama dengan filter export"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.strftime("%Y-%m")
+    return None
+
+
+def _months_between(start: date, end: date) -> list[str]:
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+
+class DataVersionService:
+    """Counter perubahan data per bulan, dipakai sebagai versi cache export.
+
+    Dinaikkan oleh dashboard_rollup_service setiap kali tagihan/pembayaran
+    berubah, sehingga export bulan yang sudah tutup tetap memakai versi yang sama.
+    """
+
+    def _collection(self):
+        return get_database()[DATA_VERSION_COLLECTION]
+
+    async def _bump(self, version_id: str):
+        await self._collection().update_one(
+            {"_id": version_id},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+    async def bump_fees(self, bulan: Optional[str]):
+        if bulan:
+            await self._bump(f"fees:{bulan}")
+
+    async def bump_payments(self, created_at):
+        month = _month_of(created_at)
+        if month:
+            await self._bump(f"payments:{month}")
+
+    async def bump_all(self):
+        """Invalidasi semua versi (data diganti tanpa lewat counter bulanan)"""
+        await self._bump(EPOCH_ID)
+
+    async def _versions(self, version_ids: list[str]) -> str:
+        docs = await self._collection().find(
+            {"_id": {"$in": [EPOCH_ID] + version_ids}}
+        ).to_list(None)
+        versions = {doc["_id"]: doc.get("version", 0) for doc in docs}
+        raw = ",".join(f"{version_id}={versions.get(version_id, 0)}" for version_id in [EPOCH_ID] + version_ids)
+        return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+    async def fees_version(self, bulan: str) -> str:
+        """Versi data tagihan satu bulan"""
+        return await self._versions([f"fees:{bulan}"])
+
+    async def payments_version(self, start: date, end: date) -> str:
+        """Versi data pembayaran untuk rentang tanggal (gabungan counter tiap bulan).
+
+        Bulan diambil dari batas UTC filter export (created_at_range): awal hari
+        Jakarta tanggal 1 masih jatuh di bulan UTC sebelumnya.
+        """
+        bounds = created_at_range(start, end)["created_at"]
+        first = bounds["$gte"].date()
+        last = (bounds["$lt"] - timedelta(microseconds=1)).date()
+        return await self._versions([f"payments:{month}" for month in _months_between(first, last)])
+
+
+# Global instance
+data_version_service = DataVersionService()
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExportCache:
+    """Cache LRU isi file export (in-memory) dengan batas ukuran total.
+
+    Key dibentuk dari (jenis laporan, parameter, format, versi data) sehingga
+    entry lama otomatis tidak terpakai lagi saat datanya berubah.
+    """
+
+    def __init__(self, max_bytes: int = None, max_entry_bytes: int = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv("EXPORT_CACHE_MAX_MB", "64")) * 1024 * 1024
+        if max_entry_bytes is None:
+            max_entry_bytes = max_bytes // 4
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._size = 0
+        self._metrics = {"hits": 0, "misses": 0, "not_modified": 0, "stores": 0, "evictions": 0, "too_large": 0}
+
+    @staticmethod
+    def make_key(report: str, format: str, params: dict, data_version: str) -> str:
+        raw = json.dumps(
+            {"report": report, "format": format, "params": params, "version": data_version},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @staticmethod
+    def etag(key: str) -> str:
+        return f'"{key}"'
+
+    def is_not_modified(self, key: str, if_none_match: Optional[str]) -> bool:
+        """Cek header If-None-Match terhadap ETag key ini"""
+        if not if_none_match:
+            return False
+        candidates = [value.strip() for value in if_none_match.split(",")]
+        matched = "*" in candidates or self.etag(key) in candidates or f"W/{self.etag(key)}" in candidates
+        if matched:
+            self._metrics["not_modified"] += 1
+        return matched
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._metrics["hits"] += 1
+        return entry
+
+    def put(self, key: str, content: bytes, media_type: str, filename: str) -> bool:
+        """Simpan isi export; entry yang melebihi max_entry_bytes tidak di-cache"""
+        size = len(content)
+        if size > self.max_entry_bytes:
+            self._metrics["too_large"] += 1
+            return False
+
+        if key in self._entries:
+            self._size -= self._entries.pop(key)["size"]
+        self._entries[key] = {
+            "content": content,
+            "media_type": media_type,
+            "filename": filename,
+            "size": size,
+            "created_at": time.time(),
+        }
+        self._size += size
+        self._metrics["stores"] += 1
+
+        # Buang entry yang paling lama tidak dipakai sampai kembali di bawah budget
+        while self._size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted["size"]
+            self._metrics["evictions"] += 1
+        return True
+
+    async def put_file(self, key: str, path: str, media_type: str, filename: str) -> Optional[bytes]:
+        """Baca file hasil build ke cache jika ukurannya masuk budget; None jika tidak"""
+        if os.path.getsize(path) > self.max_entry_bytes:
+            self._metrics["too_large"] += 1
+            return None
+        content = await asyncio.to_thread(self._read, path)
+        self.put(key, content, media_type, filename)
+        return content
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    def get_metrics(self) -> dict:
+        lookups = self._metrics["hits"] + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "hit_rate": round(self._metrics["hits"] / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# Global instance
+export_cache = ExportCache()
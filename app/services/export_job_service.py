@@ -0,0 +1,386 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from app.config.database import get_database
+from app.models import ExportJobCreate
+from app.services.data_version_service import data_version_service
+from app.services.export_service import export_service, XLSX_MEDIA_TYPE, PDF_MEDIA_TYPE
+
+logger = logging.getLogger(__name__)
+
+GRIDFS_BUCKET = "export_artifacts"
+ACTIVE_STATUSES = ["queued", "running", "completed"]
+
+
+class ExportJobService:
+    """Export laporan sebagai job di background.
+
+    Job disimpan di collection export_jobs; file hasilnya (artifact) disimpan
+    di GridFS (default) atau disk lokal sampai expires_at. Request dengan
+    parameter yang sama memakai job/artifact yang masih berlaku.
+
+    Worker di setiap instance mengklaim job secara atomik (queued -> running
+    dengan owner dan lease_expires_at) lalu memperpanjang lease selama job
+    berjalan. Job milik proses yang mati diambil alih instance lain setelah
+    lease-nya kedaluwarsa. Worker butuh proses yang hidup lama (uvicorn/
+    container); di serverless seperti Vercel (maxDuration 30 detik) job bisa
+    terputus dan baru dilanjutkan oleh instance lain yang menjalankan worker.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("EXPORT_JOB_WORKER_ENABLED", "true").lower() == "true"
+        # Storage local hanya aman untuk satu instance: artifact tidak terlihat dari instance lain
+        self.storage = os.getenv("EXPORT_ARTIFACT_STORAGE", "gridfs").lower()
+        self.artifact_dir = os.getenv(
+            "EXPORT_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "export_artifacts")
+        )
+        self.ttl = timedelta(hours=int(os.getenv("EXPORT_ARTIFACT_TTL_HOURS", "24")))
+        self.concurrency = int(os.getenv("EXPORT_JOB_CONCURRENCY", "2"))
+        self.poll_interval = float(os.getenv("EXPORT_JOB_POLL_INTERVAL_SECONDS", "5"))
+        self.lease = timedelta(seconds=float(os.getenv("EXPORT_JOB_LEASE_SECONDS", "120")))
+        self.max_attempts = int(os.getenv("EXPORT_JOB_MAX_ATTEMPTS", "3"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    # ------------------------------------------------------------------
+    # API job
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _job_params(request: ExportJobCreate) -> dict:
+        if request.report == "fees":
+            return {"bulan": request.bulan}
+        return {"start": request.start.isoformat(), "end": request.end.isoformat()}
+
+    @staticmethod
+    def _params_key(report: str, format: str, params: dict, data_version: str) -> str:
+        raw = json.dumps(
+            {"report": report, "format": format, "params": params, "version": data_version},
+            sort_keys=True
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    @staticmethod
+    async def _data_version(request: ExportJobCreate) -> str:
+        if request.report == "fees":
+            return await data_version_service.fees_version(request.bulan)
+        return await data_version_service.payments_version(request.start, request.end)
+
+    async def create_job(self, request: ExportJobCreate, created_by: str) -> dict:
+        """Buat job export baru atau kembalikan job aktif dengan parameter yang sama"""
+        db = get_database()
+        await self.purge_expired()
+
+        params = self._job_params(request)
+        # Versi data ikut dalam key: artifact lama tidak dipakai lagi setelah datanya berubah
+        data_version = await self._data_version(request)
+        params_key = self._params_key(request.report, request.format, params, data_version)
+        now = datetime.now(timezone.utc)
+
+        existing = await db.export_jobs.find_one(
+            {"params_key": params_key, "status": {"$in": ACTIVE_STATUSES}, "expires_at": {"$gt": now}},
+            {"_id": 0},
+            sort=[("created_at", -1)],
+        )
+        if existing:
+            return {**existing, "reused": True}
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "report": request.report,
+            "format": request.format,
+            "params": params,
+            "params_key": params_key,
+            "data_version": data_version,
+            "status": "queued",
+            "rows_done": 0,
+            "rows_total": None,
+            "created_by": created_by,
+            "created_at": now,
+            "expires_at": now + self.ttl,
+        }
+        await db.export_jobs.insert_one(dict(job))
+        # Worker di proses ini langsung mencoba mengklaim; instance lain lewat polling
+        self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id: str) -> dict:
+        db = get_database()
+        job = await db.export_jobs.find_one({"id": job_id}, {"_id": 0})
+        if not job:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export job tidak ditemukan")
+        return job
+
+    async def open_artifact(self, job_id: str) -> tuple[dict, AsyncIterator[bytes]]:
+        """Kembalikan (job, iterator bytes) untuk job yang sudah selesai"""
+        job = await self.get_job(job_id)
+        if job["status"] != "completed":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Export belum selesai")
+        expires_at = job["expires_at"]
+        if expires_at.tzinfo is None:
+            # Motor mengembalikan datetime naive dalam UTC
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at <= datetime.now(timezone.utc):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="File export sudah kedaluwarsa")
+
+        artifact = job["artifact"]
+        if artifact["storage"] == "gridfs":
+            bucket = AsyncIOMotorGridFSBucket(get_database(), bucket_name=GRIDFS_BUCKET)
+            stream = await bucket.open_download_stream(artifact["file_id"])
+            return job, self._iter_gridfs(stream)
+
+        if not os.path.exists(artifact["path"]):
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="File export sudah tidak tersedia")
+        return job, export_service.stream_file(artifact["path"], delete=False)
+
+    async def _iter_gridfs(self, stream) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    def start(self):
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.claim_available()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Export job polling failed: {e}")
+            # Dibangunkan oleh create_job/job selesai di proses yang sama, atau polling
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def claim_available(self) -> int:
+        """Klaim job sebanyak slot yang masih kosong; mengembalikan jumlah job yang dimulai"""
+        started = 0
+        while len(self._tasks) < self.concurrency:
+            job = await self._claim_next()
+            if job is None:
+                break
+            if job["attempts"] > self.max_attempts:
+                await self._finish(job, {"status": "failed", "error": f"Export gagal setelah {self.max_attempts} percobaan"})
+                continue
+            task = asyncio.create_task(self._run(job))
+            self._tasks[job["id"]] = task
+            task.add_done_callback(lambda _, job_id=job["id"]: self._on_done(job_id))
+            started += 1
+        return started
+
+    def _on_done(self, job_id: str):
+        self._tasks.pop(job_id, None)
+        # Slot kosong: langsung cek job berikutnya
+        self._wakeup.set()
+
+    async def _claim_next(self) -> Optional[dict]:
+        """Ambil satu job queued, atau job running yang lease-nya kedaluwarsa (pemiliknya mati)"""
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        return await db.export_jobs.find_one_and_update(
+            {
+                "expires_at": {"$gt": now},
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "lease_expires_at": {"$lte": now}},
+                    # Job running dari versi sebelum ada lease
+                    {"status": "running", "lease_expires_at": None},
+                ],
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "owner": self.owner,
+                    "lease_expires_at": now + self.lease,
+                    "started_at": now,
+                    "rows_done": 0,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _renew(self, job: dict) -> bool:
+        """Perpanjang lease job; False jika job sudah diambil alih proses lain"""
+        db = get_database()
+        result = await db.export_jobs.update_one(
+            {"id": job["id"], "owner": self.owner, "status": "running"},
+            {"$set": {"lease_expires_at": datetime.now(timezone.utc) + self.lease}}
+        )
+        return result.matched_count == 1
+
+    async def _heartbeat(self, job: dict, run_task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            if not await self._renew(job):
+                logger.warning(f"Export job {job['id']} lease lost, stopping local run")
+                run_task.cancel()
+                return
+
+    async def _finish(self, job: dict, update: dict) -> bool:
+        """Tulis hasil akhir job jika proses ini masih pemiliknya"""
+        db = get_database()
+        result = await db.export_jobs.update_one(
+            {"id": job["id"], "owner": self.owner, "status": "running"},
+            {
+                "$set": {**update, "completed_at": datetime.now(timezone.utc)},
+                "$unset": {"owner": "", "lease_expires_at": ""},
+            }
+        )
+        return result.matched_count == 1
+
+    async def _run(self, job: dict):
+        heartbeat = asyncio.create_task(self._heartbeat(job, asyncio.current_task()))
+        suffix = ".xlsx" if job["format"] == "excel" else ".pdf"
+        path = export_service.temp_path(suffix)
+        try:
+            await self._build(job, path)
+            artifact = await self._store(job, path)
+            if await self._finish(job, {"status": "completed", "artifact": artifact}):
+                logger.info(f"Export job {job['id']} completed ({artifact['size']} bytes)")
+            else:
+                # Job sudah diambil alih instance lain; artifact ini tidak dipakai
+                await self._remove_artifact(artifact)
+        except Exception as e:
+            logger.error(f"Export job {job['id']} failed: {e}")
+            await self._finish(job, {"status": "failed", "error": str(e)})
+        finally:
+            heartbeat.cancel()
+            export_service.remove_file(path)
+
+    async def _build(self, job: dict, path: str):
+        db = get_database()
+        params = job["params"]
+
+        async def progress(rows_done: int):
+            await db.export_jobs.update_one({"id": job["id"], "owner": self.owner}, {"$set": {"rows_done": rows_done}})
+
+        if job["report"] == "fees":
+            rows_total = await export_service.count_fees(params["bulan"])
+        else:
+            start = date.fromisoformat(params["start"])
+            end = date.fromisoformat(params["end"])
+            rows_total = await export_service.count_payments(start, end)
+        await db.export_jobs.update_one({"id": job["id"], "owner": self.owner}, {"$set": {"rows_total": rows_total}})
+
+        if job["report"] == "fees" and job["format"] == "excel":
+            await export_service.build_fees_xlsx(params["bulan"], path, progress)
+        elif job["report"] == "fees":
+            await export_service.build_fees_pdf(params["bulan"], path, progress)
+        elif job["format"] == "excel":
+            await export_service.build_payments_xlsx(start, end, job["created_by"], path, progress)
+        else:
+            await export_service.build_payments_pdf(start, end, job["created_by"], path, progress)
+
+    @staticmethod
+    def artifact_filename(job: dict) -> str:
+        extension = "xlsx" if job["format"] == "excel" else "pdf"
+        params = job["params"]
+        if job["report"] == "fees":
+            return f"fees_{params['bulan']}.{extension}"
+        return f"Laporan_Pembayaran_IPL_Cannary_{params['start']}_{params['end']}.{extension}"
+
+    async def _store(self, job: dict, path: str) -> dict:
+        """Pindahkan file hasil build ke storage artifact"""
+        filename = self.artifact_filename(job)
+        media_type = XLSX_MEDIA_TYPE if job["format"] == "excel" else PDF_MEDIA_TYPE
+        size = os.path.getsize(path)
+
+        if self.storage == "gridfs":
+            bucket = AsyncIOMotorGridFSBucket(get_database(), bucket_name=GRIDFS_BUCKET)
+            with open(path, "rb") as source:
+                file_id = await bucket.upload_from_stream(
+                    filename, source, metadata={"job_id": job["id"], "content_type": media_type}
+                )
+            return {"storage": "gridfs", "file_id": file_id, "filename": filename, "media_type": media_type, "size": size}
+
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        artifact_path = os.path.join(self.artifact_dir, f"{job['id']}_{filename}")
+        await asyncio.to_thread(os.replace, path, artifact_path)
+        return {"storage": "local", "path": artifact_path, "filename": filename, "media_type": media_type, "size": size}
+
+    async def _remove_artifact(self, artifact: dict):
+        if artifact["storage"] == "gridfs":
+            bucket = AsyncIOMotorGridFSBucket(get_database(), bucket_name=GRIDFS_BUCKET)
+            await bucket.delete(artifact["file_id"])
+        else:
+            export_service.remove_file(artifact["path"])
+
+    # ------------------------------------------------------------------
+    # Housekeeping
+    # ------------------------------------------------------------------
+    async def purge_expired(self) -> int:
+        """Hapus job yang sudah kedaluwarsa beserta artifact-nya"""
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        expired = await db.export_jobs.find(
+            {
+                "expires_at": {"$lte": now},
+                # Job running hanya dibuang jika pemiliknya sudah tidak memperpanjang lease
+                "$or": [{"status": {"$ne": "running"}}, {"lease_expires_at": {"$lte": now}}],
+            },
+            {"_id": 0, "id": 1, "artifact": 1}
+        ).to_list(None)
+
+        for job in expired:
+            artifact = job.get("artifact")
+            try:
+                if artifact:
+                    await self._remove_artifact(artifact)
+            except Exception as e:
+                logger.warning(f"Failed to remove artifact of export job {job['id']}: {e}")
+            await db.export_jobs.delete_one({"id": job["id"]})
+
+        if expired:
+            logger.info(f"Purged {len(expired)} expired export jobs")
+        return len(expired)
+
+    async def shutdown(self):
+        """Hentikan worker; job milik proses ini dikembalikan ke queued agar instance lain melanjutkan"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not tasks:
+            return
+        try:
+            db = get_database()
+            await db.export_jobs.update_many(
+                {"owner": self.owner, "status": "running"},
+                # Shutdown normal tidak dihitung sebagai percobaan gagal
+                {"$set": {"status": "queued", "rows_done": 0}, "$unset": {"owner": "", "lease_expires_at": ""},
+                 "$inc": {"attempts": -1}}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to requeue export jobs on shutdown: {e}")
+
+
+# Global instance
+export_job_service = ExportJobService()
@@ -0,0 +1,578 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import tempfile
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, get_args
+from app.config.database import get_database
+from app.models import FeeResponse, PaymentResponse, UserResponse, NotificationResponse
+from app.services.batch_loader import BatchLoader
+from app.services.pagination import created_at_range
+from app.services.report_renderer import report_renderer
+
+logger = logging.getLogger(__name__)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PDF_MEDIA_TYPE = "application/pdf"
+CSV_MEDIA_TYPE = "text/csv"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+EXPORT_MEDIA_TYPES = {
+    "excel": XLSX_MEDIA_TYPE,
+    "pdf": PDF_MEDIA_TYPE,
+    "csv": CSV_MEDIA_TYPE,
+    "ndjson": NDJSON_MEDIA_TYPE,
+    "parquet": PARQUET_MEDIA_TYPE,
+}
+EXPORT_EXTENSIONS = {"excel": "xlsx", "pdf": "pdf", "csv": "csv", "ndjson": "ndjson", "parquet": "parquet"}
+
+# Format mentah yang langsung di-stream dari cursor (tanpa file sementara)
+STREAM_FORMATS = ("csv", "ndjson")
+
+# Dataset export mentah: (collection, model yang menentukan kolom). Password user tidak ikut.
+RAW_DATASETS = {
+    "fees": ("fees", FeeResponse),
+    "payments": ("payments", PaymentResponse),
+    "users": ("users", UserResponse),
+    "notifications": ("notifications", NotificationResponse),
+}
+
+# Kolom sheet Fees mengikuti urutan field FeeResponse (sama seperti DataFrame sebelumnya)
+FEE_COLUMNS = list(FeeResponse.model_fields.keys())
+
+PAYMENT_COLUMNS = [
+    "ID",
+    "Username",
+    "Jumlah Pembayaran",
+    "Metode Pembayaran",
+    "Status",
+    "Tanggal Pembayaran",
+]
+
+# Header default pandas.to_excel
+_PANDAS_HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+_DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+
+# Warna 'Table Style Medium 9' (header accent biru, baris berselang)
+_TABLE_HEADER_FORMAT = {"bold": True, "font_color": "white", "bg_color": "#4F81BD", "border": 1, "border_color": "white"}
+_TABLE_BAND_FORMATS = [
+    {"bg_color": "#DCE6F1", "border": 1, "border_color": "white"},
+    {"bg_color": "#B8CCE4", "border": 1, "border_color": "white"},
+]
+
+# Kolom tabel PDF iuran: (judul kolom, field FeeResponse)
+FEE_PDF_COLUMNS = [
+    ("ID Tagihan", "id"),
+    ("User ID", "user_id"),
+    ("Kategori", "kategori"),
+    ("Nominal", "nominal"),
+    ("Status", "status"),
+    ("Jatuh Tempo", "due_date"),
+    ("Versi", "version"),
+]
+
+_END_OF_ROWS = object()
+
+# Dipanggil dengan jumlah baris yang sudah diproses (dipakai export job untuk progress)
+ProgressCallback = Callable[[int], Awaitable[None]]
+
+
+def _field_type(annotation) -> type:
+    """Tipe dasar field model (Optional[int] -> int); selain angka/bool/datetime dianggap str"""
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    if args:
+        annotation = args[0]
+    return annotation if annotation in (int, float, bool, datetime) else str
+
+
+def _coerce(value, kind: type):
+    """Samakan nilai dokumen dengan tipe kolom; nilai yang tidak bisa dikonversi menjadi None"""
+    if value is None:
+        return None
+    try:
+        if kind is datetime:
+            if isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            if not isinstance(value, datetime):
+                return None
+            # Motor mengembalikan datetime naive dalam UTC
+            if value.tzinfo is None:
+                return value.replace(tzinfo=timezone.utc)
+            return value.astimezone(timezone.utc)
+        if kind is str:
+            return str(value)
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _import_pyarrow():
+    # Di-import saat export parquet saja agar startup tidak ikut memuat pyarrow
+    import pyarrow
+    import pyarrow.parquet
+    return pyarrow, pyarrow.parquet
+
+
+class ExportService:
+    """Engine export laporan: baca Motor cursor per batch, tulis file di thread terpisah.
+
+    Baris dikirim ke thread writer lewat queue berukuran terbatas sehingga
+    memori tetap datar walaupun datanya setahun penuh.
+    """
+
+    def __init__(self, batch_size: int = None, queue_batches: int = 4, chunk_size: int = 64 * 1024):
+        if batch_size is None:
+            batch_size = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+        self.batch_size = batch_size
+        self.parquet_row_group_size = int(os.getenv("EXPORT_PARQUET_ROW_GROUP_SIZE", "50000"))
+        self.queue_batches = queue_batches
+        self.chunk_size = chunk_size
+
+    # ------------------------------------------------------------------
+    # Sumber baris
+    # ------------------------------------------------------------------
+    async def count_fees(self, bulan: str) -> int:
+        db = get_database()
+        return await db.fees.count_documents({"bulan": bulan})
+
+    async def iter_fee_batches(self, bulan: str) -> AsyncIterator[list[dict]]:
+        """Tagihan satu bulan dalam batch, tiap baris sudah dalam bentuk FeeResponse"""
+        db = get_database()
+        cursor = db.fees.find({"bulan": bulan}, {"_id": 0}).batch_size(self.batch_size)
+        batch = []
+        async for fee in cursor:
+            batch.append(FeeResponse(**fee).model_dump())
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def count_payments(self, start: date, end: date) -> int:
+        db = get_database()
+        return await db.payments.count_documents(created_at_range(start, end))
+
+    async def iter_payment_batches(self, start: date, end: date) -> AsyncIterator[list[dict]]:
+        """Pembayaran dalam rentang tanggal (hari kalender Jakarta, sama dengan export
+        csv/ndjson/parquet) sebagai baris laporan (kolom PAYMENT_COLUMNS)"""
+        db = get_database()
+        users = BatchLoader("users", projection={"_id": 0, "id": 1, "username": 1})
+        cursor = db.payments.find(
+            created_at_range(start, end), {"_id": 0}
+        ).batch_size(self.batch_size)
+
+        payments = []
+        async for payment in cursor:
+            payments.append(payment)
+            if len(payments) >= self.batch_size:
+                yield await self._payment_rows(payments, users)
+                payments = []
+        if payments:
+            yield await self._payment_rows(payments, users)
+
+    @staticmethod
+    async def _with_progress(
+        batches: AsyncIterator[list], progress: Optional[ProgressCallback]
+    ) -> AsyncIterator[list]:
+        rows_done = 0
+        async for batch in batches:
+            yield batch
+            rows_done += len(batch)
+            if progress:
+                await progress(rows_done)
+
+    async def _payment_rows(self, payments: list[dict], users: BatchLoader) -> list[dict]:
+        user_map = await users.load_many(raw.get("user_id") for raw in payments)
+        rows = []
+        for raw in payments:
+            try:
+                payment = self._normalize_payment(raw)
+                user = user_map.get(payment.user_id)
+                username = user.get("username", "Unknown") if user else "Unknown"
+
+                # Format created_at to readable string
+                if hasattr(payment.created_at, "strftime"):
+                    created_at_str = payment.created_at.strftime("%Y-%m-%d %H:%M:%S")
+                elif isinstance(payment.created_at, str):
+                    created_at_str = payment.created_at
+                else:
+                    created_at_str = str(payment.created_at)
+
+                rows.append({
+                    "ID": payment.id or "",
+                    "Username": username,
+                    "Jumlah Pembayaran": payment.amount or 0,
+                    "Metode Pembayaran": payment.payment_method or "",
+                    "Status": payment.status or "",
+                    "Tanggal Pembayaran": created_at_str,
+                })
+            except Exception:
+                # Add a basic record even if there's an error
+                rows.append({
+                    "ID": raw.get("id") or "",
+                    "Username": "Error",
+                    "Jumlah Pembayaran": 0,
+                    "Metode Pembayaran": "",
+                    "Status": "Error",
+                    "Tanggal Pembayaran": "",
+                })
+        return rows
+
+    @staticmethod
+    def _normalize_payment(payment: dict) -> PaymentResponse:
+        """Normalisasi yang sama dengan PaymentController.get_payments_by_date_range"""
+        if "method" in payment and "payment_method" not in payment:
+            payment["payment_method"] = payment.pop("method")
+        midtrans_status = (payment.get("midtrans_status") or "").lower()
+        status_value = payment.get("status")
+        if status_value is None:
+            status_value = "Pending"
+        if midtrans_status in ["settlement", "capture"] and str(status_value).lower() == "pending":
+            payment["status"] = "Success"
+        return PaymentResponse(**payment)
+
+    # ------------------------------------------------------------------
+    # Excel
+    # ------------------------------------------------------------------
+    async def build_fees_xlsx(self, bulan: str, path: str, progress: Optional[ProgressCallback] = None):
+        """Tulis sheet Fees untuk satu bulan ke path"""
+        batches = self._with_progress(self.iter_fee_batches(bulan), progress)
+        await self._write_xlsx(path, self._write_fees_sheet, batches)
+
+    async def build_payments_xlsx(
+        self, start: date, end: date, created_by: str, path: str,
+        progress: Optional[ProgressCallback] = None
+    ):
+        """Tulis laporan pembayaran (format sheet Payments) ke path"""
+        total = await self.count_payments(start, end)
+        period = f"{start} s.d {end}"
+
+        def write_sheet(workbook, rows):
+            self._write_payments_sheet(workbook, rows, total, period, created_by)
+
+        batches = self._with_progress(self.iter_payment_batches(start, end), progress)
+        await self._write_xlsx(path, write_sheet, batches)
+
+    async def _write_xlsx(self, path: str, write_sheet: Callable, batches: AsyncIterator[list[dict]]):
+        """Jalankan writer XlsxWriter (constant_memory) di thread, diberi makan dari cursor"""
+        rows_queue: queue.Queue = queue.Queue(maxsize=self.queue_batches)
+
+        def rows() -> Iterator[dict]:
+            while True:
+                batch = rows_queue.get()
+                if batch is _END_OF_ROWS:
+                    return
+                yield from batch
+
+        def write_workbook():
+            import xlsxwriter
+
+            workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "remove_timezone": True})
+            try:
+                write_sheet(workbook, rows())
+            finally:
+                workbook.close()
+
+        writer = asyncio.ensure_future(asyncio.to_thread(write_workbook))
+        try:
+            async for batch in batches:
+                if not await self._put(rows_queue, batch, writer):
+                    break
+        finally:
+            await self._put(rows_queue, _END_OF_ROWS, writer)
+            await writer
+
+    @staticmethod
+    async def _put(rows_queue: queue.Queue, item, writer: asyncio.Future) -> bool:
+        """Masukkan item ke queue tanpa memblokir event loop; False jika writer sudah berhenti"""
+        while not writer.done():
+            try:
+                rows_queue.put_nowait(item)
+                return True
+            except queue.Full:
+                await asyncio.sleep(0.005)
+        return False
+
+    @staticmethod
+    def _write_cell(worksheet, row: int, col: int, value, datetime_format):
+        if value is None:
+            return
+        if isinstance(value, datetime):
+            worksheet.write_datetime(row, col, value, datetime_format)
+        else:
+            worksheet.write(row, col, value)
+
+    def _write_fees_sheet(self, workbook, rows: Iterator[dict]):
+        worksheet = workbook.add_worksheet("Fees")
+        header_format = workbook.add_format(_PANDAS_HEADER_FORMAT)
+        datetime_format = workbook.add_format({"num_format": _DATETIME_FORMAT})
+
+        for col, name in enumerate(FEE_COLUMNS):
+            worksheet.write_string(0, col, name, header_format)
+        for row_num, record in enumerate(rows, start=1):
+            for col, name in enumerate(FEE_COLUMNS):
+                self._write_cell(worksheet, row_num, col, record.get(name), datetime_format)
+
+    def _write_payments_sheet(self, workbook, rows: Iterator[dict], total: int, period: str, created_by: str):
+        worksheet = workbook.add_worksheet("Payments")
+
+        # Define formats
+        header_format = workbook.add_format({
+            'bold': True,
+            'font_size': 16,
+            'align': 'center',
+            'valign': 'vcenter',
+            'bg_color': '#4CAF50',
+            'font_color': 'white'
+        })
+
+        subheader_format = workbook.add_format({
+            'bold': True,
+            'font_size': 12,
+            'align': 'left',
+            'valign': 'vcenter'
+        })
+
+        info_format = workbook.add_format({
+            'font_size': 10,
+            'align': 'left',
+            'valign': 'vcenter'
+        })
+
+        # Adjust column widths
+        worksheet.set_column('A:A', 15)  # ID
+        worksheet.set_column('B:B', 15)  # Username
+        worksheet.set_column('C:C', 18)  # Jumlah Pembayaran
+        worksheet.set_column('D:D', 18)  # Metode Pembayaran
+        worksheet.set_column('E:E', 12)  # Status
+        worksheet.set_column('F:F', 20)  # Tanggal Pembayaran
+
+        # Header information (constant_memory: baris harus ditulis berurutan)
+        current_time = datetime.now().strftime("%d %B %Y %H:%M:%S")
+        worksheet.merge_range('A1:F1', 'LAPORAN PEMBAYARAN IPL CANNARY', header_format)
+        worksheet.merge_range('A2:F2', '', info_format)  # Empty row
+        worksheet.merge_range('A3:F3', f'Periode: {period}', subheader_format)
+        worksheet.merge_range('A4:F4', f'Dibuat pada: {current_time}', info_format)
+        worksheet.merge_range('A5:F5', f'Dibuat oleh: {created_by}', info_format)
+        worksheet.merge_range('A6:F6', f'Total Data: {total} transaksi', info_format)
+        worksheet.merge_range('A7:F7', '', info_format)  # Empty row
+
+        if total > 0:
+            # add_table() tidak didukung di mode constant_memory, jadi tampilan
+            # 'Table Style Medium 9' (header, banded rows, filter) ditulis per sel
+            table_header_format = workbook.add_format(_TABLE_HEADER_FORMAT)
+            band_formats = [workbook.add_format(band) for band in _TABLE_BAND_FORMATS]
+            for col, name in enumerate(PAYMENT_COLUMNS):
+                worksheet.write_string(8, col, name, table_header_format)
+            worksheet.autofilter(8, 0, 8 + total, len(PAYMENT_COLUMNS) - 1)
+        else:
+            pandas_header = workbook.add_format(_PANDAS_HEADER_FORMAT)
+            for col, name in enumerate(PAYMENT_COLUMNS):
+                worksheet.write_string(8, col, name, pandas_header)
+
+        written = 0
+        for row_num, record in enumerate(rows, start=9):
+            # Data yang masuk setelah count_documents tidak ikut ditulis agar jumlahnya sesuai header
+            if written >= total:
+                break
+            row_format = band_formats[written % 2]
+            for col, name in enumerate(PAYMENT_COLUMNS):
+                value = record.get(name)
+                worksheet.write(row_num, col, "" if value is None else value, row_format)
+            written += 1
+
+    # ------------------------------------------------------------------
+    # PDF (dirender di process pool oleh report_renderer)
+    # ------------------------------------------------------------------
+    async def build_fees_pdf(self, bulan: str, path: str, progress: Optional[ProgressCallback] = None) -> int:
+        """Tulis laporan iuran satu bulan sebagai PDF bertabel"""
+        total = await self.count_fees(bulan)
+
+        async def rows():
+            async for batch in self._with_progress(self.iter_fee_batches(bulan), progress):
+                for fee in batch:
+                    yield [self._pdf_value(fee.get(field)) for _, field in FEE_PDF_COLUMNS]
+
+        return await report_renderer.render_table_pdf(path, rows(), {
+            "title": f"Laporan Iuran {bulan}",
+            "info": [
+                f"Dibuat pada: {datetime.now().strftime('%d %B %Y %H:%M:%S')}",
+                f"Total Data: {total} tagihan",
+            ],
+            "columns": [title for title, _ in FEE_PDF_COLUMNS],
+            "empty_message": "Tidak ada data iuran untuk bulan yang dipilih.",
+            "landscape": True,
+        })
+
+    async def build_payments_pdf(
+        self, start: date, end: date, created_by: str, path: str,
+        progress: Optional[ProgressCallback] = None
+    ) -> int:
+        """Tulis laporan pembayaran sebagai PDF (layout sama dengan sebelumnya)"""
+        total = await self.count_payments(start, end)
+
+        async def rows():
+            async for batch in self._with_progress(self.iter_payment_batches(start, end), progress):
+                for payment in batch:
+                    yield [payment[column] for column in PAYMENT_COLUMNS]
+
+        return await report_renderer.render_table_pdf(path, rows(), {
+            "title": "LAPORAN PEMBAYARAN IPL CANNARY",
+            "info": [
+                f"Periode: {start} s.d {end}",
+                f"Dibuat pada: {datetime.now().strftime('%d %B %Y %H:%M:%S')}",
+                f"Dibuat oleh: {created_by}",
+                f"Total Data: {total} transaksi",
+            ],
+            "columns": PAYMENT_COLUMNS,
+            "empty_message": "Tidak ada data pembayaran untuk periode yang dipilih.",
+        })
+
+    @staticmethod
+    def _pdf_value(value):
+        if isinstance(value, datetime):
+            return value.strftime("%Y-%m-%d")
+        return value
+
+    # ------------------------------------------------------------------
+    # Format mentah untuk konsumen mesin (CSV, NDJSON, Parquet)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def raw_columns(dataset: str) -> list[tuple[str, type]]:
+        """Kolom export mentah: (nama field, tipe) sesuai model response dataset"""
+        _, model = RAW_DATASETS[dataset]
+        return [(name, _field_type(field.annotation)) for name, field in model.model_fields.items()]
+
+    async def iter_raw_batches(self, dataset: str, query: dict) -> AsyncIterator[list[dict]]:
+        """Dokumen dataset dalam batch, hanya kolom model dengan tipe yang sudah diseragamkan"""
+        db = get_database()
+        collection_name, _ = RAW_DATASETS[dataset]
+        columns = self.raw_columns(dataset)
+        projection = {"_id": 0, **{name: 1 for name, _ in columns}}
+        if dataset == "payments":
+            # Data lama menyimpan metode pembayaran di field "method"
+            projection["method"] = 1
+
+        cursor = db[collection_name].find(query, projection).batch_size(self.batch_size)
+        batch = []
+        async for doc in cursor:
+            if "method" in doc and "payment_method" not in doc:
+                doc["payment_method"] = doc.pop("method")
+            batch.append({name: _coerce(doc.get(name), kind) for name, kind in columns})
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def stream_raw(self, dataset: str, format: str, query: dict) -> AsyncIterator[bytes]:
+        """Stream CSV/NDJSON langsung dari cursor, satu chunk per batch"""
+        columns = [name for name, _ in self.raw_columns(dataset)]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(columns)
+
+        async for batch in self.iter_raw_batches(dataset, query):
+            if format == "csv":
+                writer.writerows([_text_value(row[name]) for name in columns] for row in batch)
+            else:
+                for row in batch:
+                    buffer.write(json.dumps(row, default=_json_default, ensure_ascii=False))
+                    buffer.write("\n")
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+        # CSV tanpa data tetap berisi header
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    async def build_parquet(
+        self, dataset: str, query: dict, path: str, progress: Optional[ProgressCallback] = None
+    ) -> int:
+        """Tulis dataset ke file Parquet; beberapa batch cursor digabung menjadi satu row group"""
+        pa, pq = _import_pyarrow()
+        arrow_types = {
+            str: pa.string(),
+            int: pa.int64(),
+            float: pa.float64(),
+            bool: pa.bool_(),
+            datetime: pa.timestamp("us", tz="UTC"),
+        }
+        schema = pa.schema([pa.field(name, arrow_types[kind]) for name, kind in self.raw_columns(dataset)])
+
+        writer = pq.ParquetWriter(path, schema)
+
+        def write_row_group(rows: list[dict]):
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+        row_count = 0
+        pending = []
+        try:
+            async for batch in self._with_progress(self.iter_raw_batches(dataset, query), progress):
+                pending.extend(batch)
+                row_count += len(batch)
+                if len(pending) >= self.parquet_row_group_size:
+                    await asyncio.to_thread(write_row_group, pending)
+                    pending = []
+            if pending or row_count == 0:
+                await asyncio.to_thread(write_row_group, pending)
+        finally:
+            await asyncio.to_thread(writer.close)
+        return row_count
+
+    # ------------------------------------------------------------------
+    # Streaming file ke client
+    # ------------------------------------------------------------------
+    def temp_path(self, suffix: str) -> str:
+        """Path file sementara untuk satu export"""
+        fd, path = tempfile.mkstemp(prefix="export_", suffix=suffix)
+        os.close(fd)
+        return path
+
+    async def stream_file(self, path: str, delete: bool = True) -> AsyncIterator[bytes]:
+        """Kirim file per chunk tanpa memuat seluruh isinya ke memori"""
+        try:
+            with open(path, "rb") as file:
+                while True:
+                    chunk = await asyncio.to_thread(file.read, self.chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            if delete:
+                self.remove_file(path)
+
+    @staticmethod
+    def remove_file(path: Optional[str]):
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to remove export file {path}: {e}")
+
+
+# Global instance
+export_service = ExportService()
@@ -0,0 +1,50 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from app.config.database import get_database
+import logging
+
+logger = logging.getLogger(__name__)
+
+LEASE_COLLECTION = "leases"
+
+
+class Lease:
+    """Lease berbasis dokumen MongoDB agar worker background hanya jalan di satu proses.
+
+    Pemegang lease memperpanjangnya setiap siklus; jika proses mati, lease
+    kedaluwarsa setelah `ttl` dan bisa diambil alih proses lain.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float):
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+
+    async def acquire(self) -> bool:
+        """Ambil atau perpanjang lease; False jika sedang dipegang proses lain"""
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        try:
+            await db[LEASE_COLLECTION].find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl, "renewed_at": now}},
+                upsert=True,
+            )
+            if not self.held:
+                logger.info(f"Lease {self.name} acquired by {self.owner}")
+            self.held = True
+        except DuplicateKeyError:
+            # Dokumen lease ada dan masih dipegang proses lain
+            self.held = False
+        return self.held
+
+    async def release(self):
+        if not self.held:
+            return
+        db = get_database()
+        await db[LEASE_COLLECTION].delete_one({"_id": self.name, "owner": self.owner})
+        self.held = False
@@ -0,0 +1,160 @@
+import asyncio
+import os
+from typing import Optional
+import aiohttp
+import logging
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_SNAP_BASE_URL = "https://app.sandbox.midtrans.com/snap/v1"
+SANDBOX_API_BASE_URL = "https://api.sandbox.midtrans.com/v2"
+PRODUCTION_SNAP_BASE_URL = "https://app.midtrans.com/snap/v1"
+PRODUCTION_API_BASE_URL = "https://api.midtrans.com/v2"
+
+# Status HTTP yang layak dicoba ulang untuk request idempotent
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class MidtransAPIError(Exception):
+    """Error dari Midtrans; atribut sama dengan MidtransAPIError milik midtransclient"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, response: Optional[dict] = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.response = response
+
+
+class _Retry(Exception):
+    """Penanda internal: response layak dicoba ulang"""
+
+
+class MidtransClient:
+    """Client async Midtrans (Snap + Core API) dengan satu aiohttp session bersama.
+
+    Koneksi keep-alive dipakai ulang antar request sehingga tidak perlu
+    handshake TLS baru di setiap panggilan. Base URL bisa diarahkan ke
+    stub server lokal lewat MIDTRANS_SNAP_BASE_URL / MIDTRANS_API_BASE_URL.
+    """
+
+    def __init__(
+        self,
+        server_key: str,
+        is_production: bool = False,
+        snap_base_url: str = None,
+        api_base_url: str = None,
+        timeout: float = None,
+        connect_timeout: float = None,
+        retries: int = None,
+        pool_size: int = None,
+    ):
+        self.server_key = server_key
+        self.snap_base_url = (
+            snap_base_url or os.getenv("MIDTRANS_SNAP_BASE_URL")
+            or (PRODUCTION_SNAP_BASE_URL if is_production else SANDBOX_SNAP_BASE_URL)
+        ).rstrip("/")
+        self.api_base_url = (
+            api_base_url or os.getenv("MIDTRANS_API_BASE_URL")
+            or (PRODUCTION_API_BASE_URL if is_production else SANDBOX_API_BASE_URL)
+        ).rstrip("/")
+        if timeout is None:
+            timeout = float(os.getenv("MIDTRANS_HTTP_TIMEOUT_SECONDS", "10"))
+        if connect_timeout is None:
+            connect_timeout = float(os.getenv("MIDTRANS_HTTP_CONNECT_TIMEOUT_SECONDS", "3"))
+        if retries is None:
+            retries = int(os.getenv("MIDTRANS_HTTP_RETRIES", "2"))
+        if pool_size is None:
+            pool_size = int(os.getenv("MIDTRANS_HTTP_POOL_SIZE", "20"))
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.retries = retries
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Dibuat saat pertama dipakai agar terikat ke event loop aplikasi
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30, ttl_dns_cache=300),
+                timeout=self.timeout,
+                auth=aiohttp.BasicAuth(self.server_key, ""),
+                headers={"Accept": "application/json", "Content-Type": "application/json"},
+            )
+        return self._session
+
+    async def _request(self, method: str, url: str, payload: dict = None, idempotent: bool = True) -> dict:
+        """Kirim request ke Midtrans dengan retry + backoff.
+
+        Request non-idempotent (Snap create) hanya diulang jika koneksi gagal dibuka,
+        sehingga transaksi tidak pernah terkirim dua kali.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._get_session().request(method, url, json=payload) as response:
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        body = None
+                    if response.status in RETRYABLE_STATUSES and idempotent and attempt < self.retries:
+                        raise _Retry(f"HTTP {response.status}")
+                    return self._check_response(response.status, body)
+            except _Retry as retry:
+                reason = str(retry)
+            except aiohttp.ClientConnectorError as e:
+                if attempt >= self.retries:
+                    raise MidtransAPIError(f"Gagal terhubung ke Midtrans: {e}") from e
+                reason = str(e)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not idempotent or attempt >= self.retries:
+                    raise MidtransAPIError(f"Request ke Midtrans gagal: {e!r}") from e
+                reason = repr(e)
+
+            attempt += 1
+            delay = 0.2 * (2 ** (attempt - 1))
+            logger.warning(f"Retrying Midtrans {method} {url} in {delay:.1f}s ({reason})")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _check_response(http_status: int, body: Optional[dict]) -> dict:
+        # Core API bisa mengembalikan HTTP 200 dengan status_code error di body
+        status_code = http_status
+        if isinstance(body, dict) and body.get("status_code"):
+            try:
+                status_code = int(body["status_code"])
+            except (TypeError, ValueError):
+                pass
+        if http_status >= 400 or (status_code >= 400 and status_code != 407):
+            message = body.get("status_message") if isinstance(body, dict) else None
+            if not message and isinstance(body, dict) and body.get("error_messages"):
+                message = ", ".join(body["error_messages"])
+            raise MidtransAPIError(
+                f"Midtrans API is returning API error. HTTP status code: `{http_status}`. "
+                f"API response: `{message or body}`",
+                status_code=status_code if status_code >= 400 else http_status,
+                response=body,
+            )
+        return body or {}
+
+    # ------------------------------------------------------------------
+    # Operasi Midtrans
+    # ------------------------------------------------------------------
+    async def create_transaction(self, transaction_data: dict) -> dict:
+        """Snap: buat transaksi, mengembalikan token dan redirect_url"""
+        return await self._request("POST", f"{self.snap_base_url}/transactions", transaction_data, idempotent=False)
+
+    async def status(self, order_id: str) -> dict:
+        """Core API: status transaksi"""
+        return await self._request("GET", f"{self.api_base_url}/{order_id}/status")
+
+    async def cancel(self, order_id: str) -> dict:
+        """Core API: batalkan transaksi yang belum dibayar"""
+        return await self._request("POST", f"{self.api_base_url}/{order_id}/cancel")
+
+    async def expire(self, order_id: str) -> dict:
+        """Core API: paksa transaksi pending menjadi expire"""
+        return await self._request("POST", f"{self.api_base_url}/{order_id}/expire")
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -1,6 +1,10 @@
 from app.config.midtrans import midtrans_config
 from app.models import MidtransPaymentRequest, PaymentCreateResponse, MidtransNotificationRequest
 from app.config.database import get_database
+from app.services.dashboard_rollup_service import dashboard_rollup_service
+from app.services.midtrans_client import MidtransClient
+from app.services.midtrans_status_cache import MidtransStatusCache
+from app.services.webhook_ledger import webhook_ledger, CLAIM_DUPLICATE, CLAIM_IN_PROGRESS
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta, timezone
 import hashlib
@@ -10,17 +14,27 @@ import os
 
 logger = logging.getLogger(__name__)
 
+PAYMENT_EXPIRY_MINUTES = int(os.getenv("PAYMENT_EXPIRY_MINUTES", "30"))
+
 class MidtransService:
     def __init__(self):
-        self.snap = midtrans_config.get_snap_client()
-        self.core_api = midtrans_config.get_core_api_client()
+        # Client async (aiohttp) dengan koneksi keep-alive bersama untuk Snap dan Core API
+        self.client = MidtransClient(
+            server_key=midtrans_config.server_key,
+            is_production=midtrans_config.is_production,
+        )
+        self.status_cache = MidtransStatusCache()
+
+    async def close(self):
+        """Tutup session HTTP ke Midtrans"""
+        await self.client.close()
     
     async def create_payment(self, payment_request: MidtransPaymentRequest, user_id: str, user_data: dict) -> PaymentCreateResponse:
         """Create payment transaction with Midtrans"""
         db = get_database()
         
         # Check if Midtrans is properly configured
-        if not self.snap or not self.core_api:
+        if not midtrans_config.server_key:
             logger.error("Midtrans not properly configured - missing API keys")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -80,7 +94,9 @@ class MidtransService:
                 "customer_details": customer_details,
                 "item_details": item_details,
                 "callbacks": midtrans_config.get_frontend_callback_urls(),
-                "notification_url": midtrans_config.get_notification_url()
+                "notification_url": midtrans_config.get_notification_url(),
+                # Samakan expiry Snap dengan expiry_time lokal yang disapu payment_expiry_sweeper
+                "expiry": {"unit": "minute", "duration": PAYMENT_EXPIRY_MINUTES},
             }
             
             # Add payment method specific configurations
@@ -103,7 +119,7 @@ class MidtransService:
             
             # Create Snap transaction
             try:
-                response = self.snap.create_transaction(transaction_data)
+                response = await self.client.create_transaction(transaction_data)
             except Exception as api_error:
                 logger.error(f"Midtrans API call failed: {str(api_error)}")
                 raise HTTPException(
@@ -141,16 +157,14 @@ class MidtransService:
                 "payment_type": payment_request.payment_method,
                 "bank": None,  # Will be updated via webhook
                 "va_number": None,  # Will be updated via webhook
-                "expiry_time": current_time + timedelta(minutes=int(os.getenv("PAYMENT_EXPIRY_MINUTES", "30")))  # Configurable expiry time, default 30 minutes
+                "expiry_time": current_time + timedelta(minutes=PAYMENT_EXPIRY_MINUTES)  # Configurable expiry time, default 30 minutes
             }
             
             await db.payments.insert_one(payment_data)
+            await dashboard_rollup_service.record_payment_created(payment_data["status"], payment_data["created_at"])
             
             # Update fee status
-            await db.fees.update_one(
-                {"id": payment_request.fee_id},
-                {"$set": {"status": "Pending"}}
-            )
+            await dashboard_rollup_service.update_fee_status(payment_request.fee_id, "Pending")
             
             return PaymentCreateResponse(
                 payment_id=payment_data["id"],
@@ -182,6 +196,33 @@ class MidtransService:
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid signature"
             )
+
+        # Retry Midtrans untuk status yang sama cukup dijawab 200 tanpa efek samping
+        ledger_key = (notification.order_id, notification.transaction_status, notification.status_code)
+        claim = await webhook_ledger.claim(*ledger_key)
+        if claim == CLAIM_DUPLICATE:
+            return {"message": "Duplicate notification ignored", "duplicate": True}
+        if claim == CLAIM_IN_PROGRESS:
+            # Pemroses lain sedang menerapkan notifikasi yang sama; 5xx agar dicoba ulang
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Notification is still being processed"
+            )
+
+        try:
+            result = await self._apply_notification(notification)
+        except Exception:
+            await webhook_ledger.release(*ledger_key)
+            raise
+        # Baru dianggap duplikat setelah update payment/fee selesai
+        await webhook_ledger.complete(*ledger_key)
+        return result
+
+    async def _apply_notification(self, notification: MidtransNotificationRequest) -> dict:
+        db = get_database()
+
+        # Status transaksi ini berubah: hasil cek status yang di-cache sudah basi
+        self.status_cache.invalidate(notification.order_id)
         
         # Find payment by transaction_id; fallback to order_id
         payment = await db.payments.find_one({"transaction_id": notification.transaction_id})
@@ -190,7 +231,7 @@ class MidtransService:
             if payment and not payment.get("transaction_id"):
                 # Backfill transaction_id from notification
                 await db.payments.update_one(
-                    {"id": payment["id"]}, {"$set": {"transaction_id": notification.transaction_id}}
+                    {"_id": payment["_id"]}, {"$set": {"transaction_id": notification.transaction_id}}
                 )
                 payment["transaction_id"] = notification.transaction_id
         if not payment:
@@ -220,24 +261,18 @@ class MidtransService:
             })
             
             # Update fee status
-            await db.fees.update_one(
-                {"id": payment["fee_id"]},
-                {"$set": {"status": "Lunas"}}
-            )
+            await dashboard_rollup_service.update_fee_status(payment["fee_id"], "Lunas")
             
         elif new_status == "Failed":
             update_data["status"] = "Failed"
             
             # Update fee status back to unpaid
-            await db.fees.update_one(
-                {"id": payment["fee_id"]},
-                {"$set": {"status": "Belum Bayar"}}
-            )
+            await dashboard_rollup_service.update_fee_status(payment["fee_id"], "Belum Bayar")
         
         # Update payment
-        await db.payments.update_one(
+        await dashboard_rollup_service.update_payment(
             {"transaction_id": notification.transaction_id},
-            {"$set": update_data}
+            update_data
         )
         
         return {"message": "Notification processed successfully"}
@@ -286,7 +321,7 @@ class MidtransService:
                     )
             
             # Midtrans Core API expects order_id for status checks
-            response = self.core_api.transactions.status(identifier)
+            response = await self.status_cache.get_or_fetch(identifier, self.client.status)
             
             if not response:
                 logger.error(f"Empty response from Midtrans for order_id: {identifier}")
@@ -315,15 +350,12 @@ class MidtransService:
                     db = get_database()
                     payment = await db.payments.find_one({"order_id": identifier})
                     if payment and payment.get("status") == "Pending":
-                        await db.payments.update_one(
+                        await dashboard_rollup_service.update_payment(
                             {"order_id": identifier},
-                            {"$set": {"status": "Failed", "midtrans_status": "expire"}}
+                            {"status": "Failed", "midtrans_status": "expire"}
                         )
                         # Update fee status back to unpaid
-                        await db.fees.update_one(
-                            {"id": payment["fee_id"]},
-                            {"$set": {"status": "Belum Bayar"}}
-                        )
+                        await dashboard_rollup_service.update_fee_status(payment["fee_id"], "Belum Bayar")
                 except Exception as update_error:
                     logger.error(f"Failed to update expired payment: {str(update_error)}")
                 
@@ -336,3 +368,50 @@ class MidtransService:
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail="Gagal mengecek status pembayaran"
                 )
+
+
+    async def apply_status_result(self, payment: dict, midtrans_result: dict) -> bool:
+        """Simpan status hasil cek Midtrans ke payment dan fee; True jika status berubah.
+
+        payment harus punya order_id, atau _id untuk payment lama tanpa order_id.
+        """
+        mapped_status = self._map_midtrans_status(midtrans_result.get("status", "pending"))
+        if mapped_status == payment.get("status"):
+            return False
+
+        update_data = {
+            "status": mapped_status,
+            "midtrans_status": midtrans_result.get("status", "pending")
+        }
+        if mapped_status == "Success":
+            # Use UTC for settled_at
+            update_data["settled_at"] = datetime.now(timezone.utc)
+            await dashboard_rollup_service.update_fee_status(payment["fee_id"], "Lunas")
+        elif mapped_status == "Failed":
+            await dashboard_rollup_service.update_fee_status(payment["fee_id"], "Belum Bayar")
+        # payments.id (pay_{timestamp}) belum tentu unik; order_id dijaga unique index
+        if payment.get("order_id"):
+            query = {"order_id": payment["order_id"]}
+        else:
+            query = {"_id": payment["_id"]}
+        await dashboard_rollup_service.update_payment(query, update_data)
+        payment.update(update_data)
+        return True
+
+    async def cancel_transaction(self, order_id: str) -> dict:
+        """Batalkan transaksi yang belum dibayar di Midtrans"""
+        try:
+            return await self.client.cancel(order_id)
+        finally:
+            self.status_cache.invalidate(order_id)
+
+    async def expire_transaction(self, order_id: str) -> dict:
+        """Paksa transaksi pending menjadi expire di Midtrans"""
+        try:
+            return await self.client.expire(order_id)
+        finally:
+            self.status_cache.invalidate(order_id)
+
+
+# Global instance
+midtrans_service = MidtransService()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status akhir transaksi Midtrans; hasilnya tidak akan berubah lagi
+TERMINAL_STATUSES = {"settlement", "capture", "expire", "cancel", "deny", "failure", "refund"}
+
+
+class MidtransStatusCache:
+    """Cache status transaksi Midtrans per order_id.
+
+    Status pending disimpan dengan TTL pendek, status akhir disimpan sampai
+    tergeser LRU. Lookup bersamaan untuk order yang sama hanya memanggil
+    Midtrans sekali (single-flight). Webhook menghapus entry order terkait.
+    """
+
+    def __init__(self, pending_ttl: float = None, max_entries: int = None):
+        if pending_ttl is None:
+            pending_ttl = float(os.getenv("MIDTRANS_STATUS_CACHE_TTL_SECONDS", "5"))
+        if max_entries is None:
+            max_entries = int(os.getenv("MIDTRANS_STATUS_CACHE_MAX_ENTRIES", "10000"))
+        self.pending_ttl = pending_ttl
+        self.max_entries = max_entries
+        # order_id -> (response, expires_at monotonic; None = permanen)
+        self._entries: OrderedDict[str, tuple[dict, Optional[float]]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._metrics = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    def _get(self, order_id: str) -> Optional[dict]:
+        entry = self._entries.get(order_id)
+        if entry is None:
+            return None
+        response, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[order_id]
+            return None
+        self._entries.move_to_end(order_id)
+        return response
+
+    def _put(self, order_id: str, response: dict):
+        transaction_status = (response.get("transaction_status") or "").lower()
+        expires_at = None if transaction_status in TERMINAL_STATUSES else time.monotonic() + self.pending_ttl
+        self._entries[order_id] = (response, expires_at)
+        self._entries.move_to_end(order_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, order_id: str, fetch: Callable[[str], Awaitable[dict]]) -> dict:
+        """Ambil status dari cache, atau panggil fetch(order_id) sekali untuk semua pemanggil bersamaan"""
+        response = self._get(order_id)
+        if response is not None:
+            self._metrics["hits"] += 1
+            return response
+
+        future = self._inflight.get(order_id)
+        if future is not None:
+            self._metrics["coalesced"] += 1
+        else:
+            self._metrics["misses"] += 1
+            future = asyncio.ensure_future(self._fetch(order_id, fetch))
+            self._inflight[order_id] = future
+            future.add_done_callback(lambda done: self._clear_inflight(order_id, done))
+        # shield: timeout salah satu pemanggil tidak membatalkan lookup pemanggil lain
+        return await asyncio.shield(future)
+
+    async def _fetch(self, order_id: str, fetch: Callable[[str], Awaitable[dict]]) -> dict:
+        response = await fetch(order_id)
+        # Response kosong tidak di-cache, begitu juga jika entry di-invalidate selama lookup
+        if response and self._inflight.get(order_id) is asyncio.current_task():
+            self._put(order_id, response)
+        return response
+
+    def _clear_inflight(self, order_id: str, future: asyncio.Future):
+        if self._inflight.get(order_id) is future:
+            del self._inflight[order_id]
+
+    def invalidate(self, order_id: Optional[str]):
+        """Hapus entry order (dipanggil saat webhook datang)"""
+        if not order_id:
+            return
+        self._metrics["invalidations"] += 1
+        self._entries.pop(order_id, None)
+        # Hasil lookup yang sedang berjalan mungkin sudah basi, jangan disimpan
+        self._inflight.pop(order_id, None)
+
+    def get_metrics(self) -> dict:
+        lookups = self._metrics["hits"] + self._metrics["misses"] + self._metrics["coalesced"]
+        return {
+            **self._metrics,
+            "hit_rate": round((self._metrics["hits"] + self._metrics["coalesced"]) / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,124 @@
+import base64
+import json
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException, Response, status
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING
+
+# Default sama dengan batas to_list(1000) sebelumnya supaya client lama tidak berubah
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 1000
+
+# Rentang tanggal dihitung per hari kalender Asia/Jakarta
+JAKARTA_TZ = timezone(timedelta(hours=7))
+
+
+def encode_cursor(document: dict, sort_field: str = "created_at") -> str:
+    """Buat cursor opaque dari (sort_field, id) dokumen terakhir di halaman"""
+    value = document.get(sort_field)
+    if isinstance(value, datetime):
+        payload = {"t": "dt", "v": value.isoformat(), "id": document["id"]}
+    else:
+        payload = {"t": "raw", "v": value, "id": document["id"]}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Kebalikan encode_cursor; cursor rusak menghasilkan 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = payload["v"]
+        if payload["t"] == "dt":
+            value = datetime.fromisoformat(value)
+        return value, payload["id"]
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor tidak valid"
+        )
+
+
+def _after_cursor(sort_field: str, value, last_id) -> dict:
+    """Filter keyset untuk urutan (sort_field desc, id desc).
+
+    MongoDB mengurutkan per tipe BSON: pada urutan desc, datetime berada di
+    depan, lalu string (created_at lama yang tersimpan sebagai ISO string),
+    lalu null/missing. Perbandingan $lt hanya cocok dengan tipe yang sama,
+    jadi bracket tipe berikutnya harus diikutkan agar tidak hilang dari
+    halaman berikutnya.
+    """
+    if value is None:
+        # null/missing berada di urutan paling akhir
+        return {sort_field: None, "id": {"$lt": last_id}}
+    conditions = [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "id": {"$lt": last_id}},
+    ]
+    if isinstance(value, datetime):
+        conditions.append({sort_field: {"$type": "string"}})
+    conditions.append({sort_field: None})
+    return {"$or": conditions}
+
+
+def created_at_range(start: Optional[date], end: Optional[date]) -> dict:
+    """Filter rentang tanggal created_at (inklusif, hari kalender Jakarta) untuk query list.
+
+    Hanya cocok dengan created_at bertipe datetime; dokumen lama dengan
+    created_at berupa string perlu dinormalisasi lewat
+    script/normalize_created_at.py.
+    """
+    if not start and not end:
+        return {}
+    created_at = {}
+    if start:
+        created_at["$gte"] = datetime.combine(start, time.min, tzinfo=JAKARTA_TZ).astimezone(timezone.utc)
+    if end:
+        created_at["$lt"] = datetime.combine(end + timedelta(days=1), time.min, tzinfo=JAKARTA_TZ).astimezone(timezone.utc)
+    return {"created_at": created_at}
+
+
+async def paginate(
+    collection: AsyncIOMotorCollection,
+    query: dict,
+    projection: Optional[dict] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    sort_field: str = "created_at",
+) -> dict:
+    """Ambil satu halaman dokumen terurut (sort_field desc, id desc).
+
+    Mengembalikan {"items", "next_cursor", "total"}; next_cursor None berarti
+    halaman terakhir, total hanya dihitung jika include_total=True.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    page_query = query
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        keyset = _after_cursor(sort_field, value, last_id)
+        page_query = {"$and": [query, keyset]} if query else keyset
+
+    # Ambil satu dokumen ekstra untuk mengetahui apakah masih ada halaman berikutnya
+    documents = await collection.find(page_query, projection).sort(
+        [(sort_field, DESCENDING), ("id", DESCENDING)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+
+    total = await collection.count_documents(query) if include_total else None
+    return {"items": documents, "next_cursor": next_cursor, "total": total}
+
+
+def set_page_headers(response: Response, page: dict):
+    """Tulis X-Next-Cursor / X-Total-Count untuk endpoint yang mengembalikan list"""
+    if page["next_cursor"]:
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    if page["total"] is not None:
+        response.headers["X-Total-Count"] = str(page["total"])
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.config.database import get_database
+from app.services.dashboard_broadcaster import dashboard_broadcaster
+from app.services.dashboard_rollup_service import dashboard_rollup_service
+from app.services.data_version_service import data_version_service
+from app.services.lease import Lease
+from app.services.midtrans_service import midtrans_service
+from app.services.telegram_outbox import telegram_outbox
+from app.services.websocket_manager import websocket_manager
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentExpirySweeper:
+    """Ubah payment Pending yang melewati expiry_time menjadi Failed/expire secara lokal.
+
+    Tidak ada panggilan ke Midtrans: transaksi Snap dibuat dengan durasi
+    expiry yang sama (PAYMENT_EXPIRY_MINUTES). Tagihan terkait dikembalikan
+    ke "Belum Bayar" sehingga warga bisa membuat pembayaran baru.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PAYMENT_EXPIRY_SWEEPER_ENABLED", "true").lower() == "true"
+        self.interval = float(os.getenv("PAYMENT_EXPIRY_SWEEP_INTERVAL_SECONDS", "60"))
+        self.batch_size = int(os.getenv("PAYMENT_EXPIRY_SWEEP_BATCH_SIZE", "500"))
+        # Jeda setelah expiry_time agar webhook settlement yang telat masih sempat masuk duluan
+        self.grace = timedelta(seconds=float(os.getenv("PAYMENT_EXPIRY_GRACE_SECONDS", "60")))
+        self.lease = Lease("payment_expiry_sweeper", ttl_seconds=max(self.interval * 3, 60))
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {
+            "runs": 0,
+            "run_failures": 0,
+            "payments_expired_total": 0,
+            "fees_reset_total": 0,
+            "last_expired": 0,
+            "last_run_ms": None,
+            "last_run_at": None,
+        }
+
+    def start(self):
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.lease.release()
+        except Exception as e:
+            logger.warning(f"Failed to release payment expiry sweeper lease: {e}")
+
+    async def _loop(self):
+        while True:
+            try:
+                if await self.lease.acquire():
+                    await self.sweep_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["run_failures"] += 1
+                logger.error(f"Payment expiry sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def sweep_once(self) -> int:
+        """Expire semua payment yang sudah lewat waktu, per batch"""
+        started = datetime.now(timezone.utc)
+        expired = 0
+        while True:
+            count = await self.expire_due()
+            expired += count
+            if count < self.batch_size:
+                break
+
+        elapsed_ms = round((datetime.now(timezone.utc) - started).total_seconds() * 1000, 2)
+        self._metrics.update({
+            "runs": self._metrics["runs"] + 1,
+            "last_expired": expired,
+            "last_run_ms": elapsed_ms,
+            "last_run_at": started.isoformat(),
+        })
+        if expired:
+            logger.info(f"Expired {expired} pending payments past expiry_time")
+        return expired
+
+    async def expire_due(self, extra_filter: dict = None) -> int:
+        """Expire satu batch payment Pending dengan expiry_time <= sekarang - grace.
+
+        extra_filter dipakai untuk menyapu satu tagihan saja (misalnya {"fee_id": ...})
+        sebelum membuat pembayaran baru. Mengembalikan jumlah payment yang di-expire.
+        """
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        query = {"status": "Pending", "expiry_time": {"$lte": now - self.grace}, **(extra_filter or {})}
+        candidates = await db.payments.find(
+            query, {"_id": 0, "id": 1}
+        ).sort("expiry_time", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return 0
+
+        # Tandai dengan sweep_id agar payment yang benar-benar berubah bisa dibaca ulang
+        # (payment yang keburu di-settle webhook tidak ikut)
+        sweep_id = uuid.uuid4().hex
+        await db.payments.update_many(
+            {"id": {"$in": [payment["id"] for payment in candidates]}, "status": "Pending"},
+            {"$set": {"status": "Failed", "midtrans_status": "expire", "expired_at": now, "expiry_sweep_id": sweep_id}}
+        )
+        expired = await db.payments.find(
+            {"expiry_sweep_id": sweep_id},
+            {"_id": 0, "id": 1, "fee_id": 1, "user_id": 1, "order_id": 1, "amount": 1, "created_at": 1}
+        ).to_list(None)
+        if not expired:
+            return 0
+
+        await dashboard_rollup_service.record_payments_transition({"Pending": len(expired)}, "Failed")
+        await asyncio.gather(*[
+            data_version_service.bump_payments(created_at)
+            for created_at in {payment.get("created_at") for payment in expired}
+        ])
+        for payment in expired:
+            midtrans_service.status_cache.invalidate(payment.get("order_id"))
+
+        fees_reset = await self._reset_fees([payment["fee_id"] for payment in expired], sweep_id)
+        await self._notify_users(expired, now)
+        dashboard_broadcaster.mark_dirty()
+
+        self._metrics["payments_expired_total"] += len(expired)
+        self._metrics["fees_reset_total"] += fees_reset
+        return len(expired)
+
+    async def _reset_fees(self, fee_ids: list[str], sweep_id: str) -> int:
+        """Kembalikan tagihan Pending ke "Belum Bayar"; rollup dihitung dari tagihan yang benar-benar berubah"""
+        db = get_database()
+        # Sama seperti payment: tandai dengan sweep_id lalu baca ulang, sehingga tagihan
+        # yang keburu dilunasi webhook di antara find dan update tidak ikut dihitung
+        await db.fees.update_many(
+            {"id": {"$in": fee_ids}, "status": "Pending"},
+            {"$set": {"status": "Belum Bayar", "expiry_sweep_id": sweep_id}}
+        )
+        fees = await db.fees.find(
+            {"expiry_sweep_id": sweep_id},
+            {"_id": 0, "id": 1, "bulan": 1, "nominal": 1}
+        ).to_list(None)
+        if not fees:
+            return 0
+
+        by_month: dict[str, dict] = {}
+        for fee in fees:
+            stats = by_month.setdefault(fee.get("bulan"), {"count": 0, "nominal": 0})
+            stats["count"] += 1
+            stats["nominal"] += fee.get("nominal", 0) or 0
+        for bulan, stats in by_month.items():
+            await dashboard_rollup_service.record_fees_transition(bulan, {"Pending": stats}, "Belum Bayar")
+        return len(fees)
+
+    async def _notify_users(self, payments: list[dict], now: datetime):
+        db = get_database()
+        notifications = [
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": payment["user_id"],
+                "title": "Pembayaran Kedaluwarsa",
+                "message": (
+                    f"Pembayaran {payment.get('order_id') or payment['id']} sebesar Rp {int(payment.get('amount') or 0):,} "
+                    "sudah melewati batas waktu. Silakan buat pembayaran baru untuk tagihan ini."
+                ),
+                "type": "pembayaran",
+                "is_read": False,
+                "created_at": now,
+            }
+            for payment in payments if payment.get("user_id")
+        ]
+        if not notifications:
+            return
+        # insert_many menambahkan _id ke dict, jadi kirim salinan
+        await db.notifications.insert_many([dict(notification) for notification in notifications])
+        await asyncio.gather(*[
+            websocket_manager.send_notification(notification["user_id"], notification)
+            for notification in notifications
+        ], return_exceptions=True)
+        # Telegram lewat outbox agar sweep tidak menunggu pengiriman
+        await telegram_outbox.enqueue_for_users(
+            {notification["user_id"]: f"⏰ **{notification['title']}**\n\n{notification['message']}" for notification in notifications},
+            kind="payment_expired",
+        )
+
+    def get_metrics(self) -> dict:
+        return {**self._metrics, "enabled": self.enabled, "is_leader": self.lease.held}
+
+
+# Global instance
+payment_expiry_sweeper = PaymentExpirySweeper()
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.config.database import get_database
+from app.services.dashboard_broadcaster import dashboard_broadcaster
+from app.services.lease import Lease
+from app.services.midtrans_service import midtrans_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentReconciler:
+    """Sinkronisasi status payment Pending dengan Midtrans di background.
+
+    Setiap interval, payment Pending yang cukup umur dibaca per batch
+    (urut created_at, id) lalu dicek ke Midtrans dengan laju terbatas.
+    Hanya proses pemegang lease yang menjalankan reconciler.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PAYMENT_RECONCILER_ENABLED", "true").lower() == "true"
+        self.interval = float(os.getenv("PAYMENT_RECONCILE_INTERVAL_SECONDS", "60"))
+        self.batch_size = int(os.getenv("PAYMENT_RECONCILE_BATCH_SIZE", "50"))
+        self.rate_per_second = float(os.getenv("PAYMENT_RECONCILE_RATE_PER_SECOND", "5"))
+        self.min_age = timedelta(seconds=float(os.getenv("PAYMENT_RECONCILE_MIN_AGE_SECONDS", "60")))
+        self.call_timeout = float(os.getenv("PAYMENT_RECONCILE_CALL_TIMEOUT_SECONDS", "5"))
+        self.lease = Lease("payment_reconciler", ttl_seconds=max(self.interval * 3, 60))
+        self._task: Optional[asyncio.Task] = None
+        self._next_call_at = 0.0
+        self._metrics = {
+            "runs": 0,
+            "run_failures": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "checked_total": 0,
+            "transitioned_total": 0,
+            "check_errors_total": 0,
+            "last_checked": 0,
+            "last_transitioned": 0,
+            "last_run_ms": None,
+            "last_run_at": None,
+            "oldest_pending_age_seconds": None,
+        }
+        self._last_completed: Optional[datetime] = None
+
+    def start(self):
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.lease.release()
+        except Exception as e:
+            logger.warning(f"Failed to release payment reconciler lease: {e}")
+
+    async def _loop(self):
+        while True:
+            try:
+                if await self.lease.acquire():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["run_failures"] += 1
+                logger.error(f"Payment reconciler run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> dict:
+        """Satu putaran rekonsiliasi atas semua payment Pending yang cukup umur"""
+        db = get_database()
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        query = {"status": "Pending", "order_id": {"$ne": None}, "created_at": {"$lte": now - self.min_age}}
+
+        checked = transitioned = 0
+        oldest_age = None
+        last_key = None
+        while True:
+            page_query = dict(query)
+            if last_key:
+                created_at, payment_id = last_key
+                page_query["$or"] = [
+                    {"created_at": {"$gt": created_at}},
+                    {"created_at": created_at, "id": {"$gt": payment_id}},
+                ]
+            batch = await db.payments.find(
+                page_query, {"_id": 0, "id": 1, "fee_id": 1, "order_id": 1, "status": 1, "created_at": 1}
+            ).sort([("created_at", 1), ("id", 1)]).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+
+            if oldest_age is None:
+                oldest_created = batch[0]["created_at"]
+                if oldest_created.tzinfo is None:
+                    oldest_created = oldest_created.replace(tzinfo=timezone.utc)
+                oldest_age = round((now - oldest_created).total_seconds(), 1)
+
+            self._metrics["batches"] += 1
+            self._metrics["last_batch_size"] = len(batch)
+            self._metrics["max_batch_size"] = max(self._metrics["max_batch_size"], len(batch))
+
+            results = await asyncio.gather(*[self._reconcile(payment) for payment in batch], return_exceptions=True)
+            for result in results:
+                checked += 1
+                if isinstance(result, BaseException):
+                    self._metrics["check_errors_total"] += 1
+                elif result:
+                    transitioned += 1
+
+            last_key = (batch[-1]["created_at"], batch[-1]["id"])
+            # Perpanjang lease antar batch; berhenti jika sudah diambil alih proses lain
+            if len(batch) < self.batch_size or not await self.lease.acquire():
+                break
+
+        if transitioned:
+            dashboard_broadcaster.mark_dirty()
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._last_completed = datetime.now(timezone.utc)
+        self._metrics.update({
+            "runs": self._metrics["runs"] + 1,
+            "checked_total": self._metrics["checked_total"] + checked,
+            "transitioned_total": self._metrics["transitioned_total"] + transitioned,
+            "last_checked": checked,
+            "last_transitioned": transitioned,
+            "last_run_ms": elapsed_ms,
+            "last_run_at": self._last_completed.isoformat(),
+            "oldest_pending_age_seconds": oldest_age,
+        })
+        if checked:
+            logger.info(f"Payment reconciler checked {checked} pending payments, {transitioned} transitioned ({elapsed_ms} ms)")
+        return {"checked": checked, "transitioned": transitioned}
+
+    async def _reconcile(self, payment: dict) -> bool:
+        await self._wait_for_rate_slot()
+        midtrans_result = await asyncio.wait_for(
+            midtrans_service.check_payment_status(payment["order_id"]),
+            timeout=self.call_timeout
+        )
+        return await midtrans_service.apply_status_result(payment, midtrans_result)
+
+    async def _wait_for_rate_slot(self):
+        """Beri jarak antar panggilan Midtrans sesuai rate_per_second"""
+        now = time.monotonic()
+        slot = max(now, self._next_call_at)
+        self._next_call_at = slot + 1 / self.rate_per_second
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def get_metrics(self) -> dict:
+        lag = None
+        if self._last_completed is not None:
+            lag = round((datetime.now(timezone.utc) - self._last_completed).total_seconds(), 1)
+        return {
+            **self._metrics,
+            "enabled": self.enabled,
+            "is_leader": self.lease.held,
+            "seconds_since_last_run": lag,
+            "interval_seconds": self.interval,
+            "rate_per_second": self.rate_per_second,
+        }
+
+
+# Global instance
+payment_reconciler = PaymentReconciler()
@@ -0,0 +1,56 @@
+import re
+from typing import Optional
+
+# Kode negara default untuk nomor lokal (08xx)
+DEFAULT_COUNTRY_CODE = "62"
+
+_NON_DIGITS = re.compile(r"\D")
+_PHONE_CHARS = re.compile(r"^\+?[\d\s\-.()]+$")
+
+# Filter user yang punya nomor HP (penerima broadcast, status Telegram, /users/with-phone).
+# Sengaja memakai nomor_hp mentah: nomor yang tidak valid atau duplikat tidak punya
+# nomor_hp_normalized, tetapi tetap menerima broadcast. nomor_hp_normalized hanya untuk lookup.
+HAS_PHONE_FILTER = {"nomor_hp": {"$exists": True, "$ne": ""}}
+
+
+def normalize_phone_number(raw: Optional[str]) -> Optional[str]:
+    """Ubah nomor HP ke format E.164 (+628xx); None jika kosong atau tidak valid.
+
+    Format yang diterima: 08xx, 8xx, 628xx, +628xx, dengan spasi/strip/titik/kurung.
+    """
+    if not raw:
+        return None
+    value = str(raw).strip()
+    if not _PHONE_CHARS.match(value):
+        return None
+    has_plus = value.startswith("+")
+    digits = _NON_DIGITS.sub("", value)
+    if not digits:
+        return None
+
+    if digits.startswith("00"):
+        # Prefix internasional 00 sama dengan +
+        digits = digits[2:]
+    elif not has_plus:
+        if digits.startswith("0"):
+            digits = DEFAULT_COUNTRY_CODE + digits[1:]
+        elif digits.startswith("8"):
+            digits = DEFAULT_COUNTRY_CODE + digits
+
+    # E.164: maksimal 15 digit; nomor Indonesia paling pendek 10 digit termasuk kode negara
+    if not 10 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+def phone_number_update(update_dict: dict) -> dict:
+    """Bentuk update MongoDB untuk perubahan nomor_hp beserta nomor_hp_normalized"""
+    update = {"$set": dict(update_dict)}
+    if "nomor_hp" in update_dict:
+        normalized = normalize_phone_number(update_dict["nomor_hp"])
+        if normalized:
+            update["$set"]["nomor_hp_normalized"] = normalized
+        else:
+            update["$unset"] = {"nomor_hp_normalized": ""}
+    return update
+
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Jumlah baris per Table flowable; tabel kecil membuat layout cepat dan
+# header (repeatRows) ikut diulang di setiap halaman
+PDF_TABLE_CHUNK_ROWS = 200
+
+
+# ----------------------------------------------------------------------
+# Fungsi yang dijalankan di process pool (harus top-level agar bisa di-pickle)
+# ----------------------------------------------------------------------
+def _iter_spooled_rows(rows_path: str):
+    with open(rows_path, "r", encoding="utf-8") as file:
+        for line in file:
+            yield json.loads(line)
+
+
+def _data_table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+
+def _render_table_pdf(output_path: str, rows_path: str, spec: dict) -> int:
+    """Render laporan PDF: judul, tabel info, lalu tabel data yang dipecah per halaman"""
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    pagesize = landscape(letter) if spec.get("landscape") else letter
+    doc = SimpleDocTemplate(output_path, pagesize=pagesize)
+    styles = getSampleStyleSheet()
+    story = []
+
+    story.append(Paragraph(spec["title"], styles['Title']))
+    story.append(Spacer(1, 12))
+
+    if spec.get("info"):
+        info_table = Table([[line] for line in spec["info"]])
+        info_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]))
+        story.append(info_table)
+        story.append(Spacer(1, 20))
+
+    columns = spec["columns"]
+    table_style = _data_table_style()
+    row_count = 0
+    chunk = []
+
+    def flush():
+        # repeatRows=1: header kolom muncul lagi ketika tabel terpotong ke halaman berikutnya
+        table = Table([columns] + chunk, repeatRows=1, colWidths=spec.get("col_widths"))
+        table.setStyle(table_style)
+        story.append(table)
+
+    for row in _iter_spooled_rows(rows_path):
+        chunk.append([str(value) if value is not None else "" for value in row])
+        row_count += 1
+        if len(chunk) >= PDF_TABLE_CHUNK_ROWS:
+            flush()
+            chunk = []
+    if chunk:
+        flush()
+
+    if row_count == 0:
+        story.append(Paragraph(spec["empty_message"], styles['Normal']))
+
+    doc.build(story)
+    return row_count
+
+
+class ReportRenderer:
+    """Render laporan PDF (ReportLab) di process pool terbatas.
+
+    Baris diterima sebagai async iterator, ditulis ke file spool lalu
+    dibaca ulang oleh worker, sehingga event loop tidak pernah ikut
+    mengerjakan layout PDF.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        if max_workers is None:
+            max_workers = int(os.getenv("REPORT_RENDER_WORKERS", "2"))
+        if max_pending is None:
+            max_pending = int(os.getenv("REPORT_RENDER_MAX_PENDING", "8"))
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+        self._metrics = {
+            "renders_completed": 0,
+            "renders_failed": 0,
+            "rows_rendered": 0,
+            "total_render_ms": 0.0,
+            "max_render_ms": 0.0,
+            "last_render_ms": None,
+            "last_render_at": None,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: worker tidak mewarisi thread/koneksi Motor dari proses utama
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers + self.max_pending)
+        return self._slots
+
+    async def render_table_pdf(self, output_path: str, rows: AsyncIterator[list], spec: dict) -> int:
+        """Render PDF tabel ke output_path dari async iterator baris (list nilai per kolom).
+
+        spec: title, columns, info (list baris teks), empty_message,
+        opsional landscape dan col_widths. Mengembalikan jumlah baris.
+        """
+        rows_path = await self._spool_rows(rows)
+        try:
+            return await self._submit(_render_table_pdf, output_path, rows_path, spec)
+        finally:
+            try:
+                os.remove(rows_path)
+            except OSError:
+                pass
+
+    async def _spool_rows(self, rows: AsyncIterator[list]) -> str:
+        fd, rows_path = tempfile.mkstemp(prefix="report_rows_", suffix=".jsonl")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                async for row in rows:
+                    file.write(json.dumps(row, default=str))
+                    file.write("\n")
+        except Exception:
+            os.remove(rows_path)
+            raise
+        return rows_path
+
+    async def _submit(self, func, *args) -> int:
+        slots = self._get_slots()
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._running += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            row_count = await loop.run_in_executor(self._get_executor(), func, *args)
+        except Exception:
+            self._metrics["renders_failed"] += 1
+            raise
+        finally:
+            self._running -= 1
+            slots.release()
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._metrics["renders_completed"] += 1
+        self._metrics["rows_rendered"] += row_count
+        self._metrics["total_render_ms"] += elapsed_ms
+        self._metrics["max_render_ms"] = max(self._metrics["max_render_ms"], elapsed_ms)
+        self._metrics["last_render_ms"] = elapsed_ms
+        self._metrics["last_render_at"] = datetime.now().isoformat()
+        return row_count
+
+    def get_metrics(self) -> dict:
+        """Queue depth dan waktu render"""
+        completed = self._metrics["renders_completed"]
+        return {
+            **self._metrics,
+            "total_render_ms": round(self._metrics["total_render_ms"], 2),
+            "avg_render_ms": round(self._metrics["total_render_ms"] / completed, 2) if completed else None,
+            "queue_depth": self._waiting + max(0, self._running - self.max_workers),
+            "waiting_for_slot": self._waiting,
+            "in_flight": self._running,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+        }
+
+    def shutdown(self):
+        """Hentikan process pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global instance
+report_renderer = ReportRenderer()
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+import aiohttp
+import logging
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_BASE_URL = "https://api.telegram.org"
+
+# Status HTTP yang layak dicoba ulang (selain 429 yang punya retry_after sendiri)
+RETRYABLE_STATUSES = {500, 502, 503, 504}
+
+
+class TelegramAPIError(Exception):
+    """Error dari Bot API; error_code 403 berarti bot diblokir user"""
+
+    def __init__(self, message: str, error_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.message = message
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket async: `rate` token per detik, maksimal `capacity` token tersimpan"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class TelegramClient:
+    """Client async Bot API dengan satu aiohttp session bersama.
+
+    Pengiriman dibatasi token bucket global (default 30 pesan/detik) dan per
+    chat (default 1 pesan/detik), sesuai batas Telegram. Response 429 membuat
+    semua pengiriman berhenti selama `retry_after` lalu dicoba ulang.
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        api_base_url: str = None,
+        timeout: float = None,
+        retries: int = None,
+        pool_size: int = None,
+        global_rate: float = None,
+        per_chat_rate: float = None,
+    ):
+        self.bot_token = bot_token
+        self.api_base_url = (api_base_url or os.getenv("TELEGRAM_API_BASE_URL") or TELEGRAM_API_BASE_URL).rstrip("/")
+        if timeout is None:
+            timeout = float(os.getenv("TELEGRAM_HTTP_TIMEOUT_SECONDS", "10"))
+        if retries is None:
+            retries = int(os.getenv("TELEGRAM_HTTP_RETRIES", "3"))
+        if pool_size is None:
+            pool_size = int(os.getenv("TELEGRAM_HTTP_POOL_SIZE", "50"))
+        if global_rate is None:
+            global_rate = float(os.getenv("TELEGRAM_GLOBAL_RATE_PER_SECOND", "30"))
+        if per_chat_rate is None:
+            per_chat_rate = float(os.getenv("TELEGRAM_PER_CHAT_RATE_PER_SECOND", "1"))
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.pool_size = pool_size
+        self.per_chat_rate = per_chat_rate
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        # Bucket per chat dibatasi jumlahnya; chat yang lama tidak dipakai dibuang (LRU)
+        self._chat_buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._max_chat_buckets = 10000
+        self._paused_until = 0.0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._sent_at: deque[float] = deque()
+        self._metrics = {"sent": 0, "failed": 0, "rate_limited": 0, "retries": 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Dibuat saat pertama dipakai agar terikat ke event loop aplikasi
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30, ttl_dns_cache=300),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, capacity=1)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self._max_chat_buckets:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _wait_for_slot(self, chat_id: Optional[str]):
+        if chat_id is not None:
+            await self._chat_bucket(chat_id).acquire()
+        # Hormati jeda 429 yang berlaku untuk semua pengiriman bot
+        while (delay := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        await self.global_bucket.acquire()
+
+    async def _call(self, method: str, payload: dict = None, chat_id: str = None) -> dict:
+        """Panggil method Bot API dengan rate limit, retry 429 dan retry error server"""
+        url = f"{self.api_base_url}/bot{self.bot_token}/{method}"
+        attempt = 0
+        while True:
+            await self._wait_for_slot(chat_id)
+            retry_delay = None
+            try:
+                async with self._get_session().post(url, json=payload or {}) as response:
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        body = None
+                if isinstance(body, dict) and body.get("ok"):
+                    return body.get("result")
+
+                description = body.get("description") if isinstance(body, dict) else None
+                error_code = (body.get("error_code") if isinstance(body, dict) else None) or response.status
+                retry_after = ((body or {}).get("parameters") or {}).get("retry_after") if isinstance(body, dict) else None
+                if error_code == 429:
+                    self._metrics["rate_limited"] += 1
+                    retry_delay = float(retry_after or 1)
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_delay)
+                    logger.warning(f"Telegram rate limited on {method}, retry after {retry_delay:.0f}s")
+                elif response.status in RETRYABLE_STATUSES:
+                    retry_delay = 0.5 * (2 ** attempt)
+                if retry_delay is None or attempt >= self.retries:
+                    raise TelegramAPIError(
+                        f"Telegram {method} failed: {error_code} {description or body}",
+                        error_code=error_code,
+                        retry_after=retry_after,
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise TelegramAPIError(f"Request ke Telegram gagal: {e!r}") from e
+                retry_delay = 0.5 * (2 ** attempt)
+
+            attempt += 1
+            self._metrics["retries"] += 1
+            # Jeda 429 sudah ditunggu lewat _paused_until di _wait_for_slot
+            if self._paused_until <= time.monotonic():
+                await asyncio.sleep(retry_delay)
+
+    # ------------------------------------------------------------------
+    # Operasi Bot API
+    # ------------------------------------------------------------------
+    async def send_message(self, chat_id, text: str, parse_mode: str = "Markdown") -> dict:
+        chat_key = str(chat_id)
+        try:
+            result = await self._call(
+                "sendMessage", {"chat_id": chat_id, "text": text, "parse_mode": parse_mode}, chat_id=chat_key
+            )
+        except TelegramAPIError:
+            self._metrics["failed"] += 1
+            raise
+        self._metrics["sent"] += 1
+        self._sent_at.append(time.monotonic())
+        return result
+
+    async def get_me(self) -> dict:
+        return await self._call("getMe")
+
+    def get_metrics(self) -> dict:
+        # Laju kirim dihitung dari pesan yang terkirim dalam 10 detik terakhir
+        window = 10.0
+        cutoff = time.monotonic() - window
+        while self._sent_at and self._sent_at[0] < cutoff:
+            self._sent_at.popleft()
+        return {
+            **self._metrics,
+            "sends_per_second": round(len(self._sent_at) / window, 2),
+            "global_rate_per_second": self.global_bucket.rate,
+            "per_chat_rate_per_second": self.per_chat_rate,
+            "paused_for_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,259 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from pymongo import UpdateOne
+from app.config.database import get_database
+from app.services.lease import Lease
+from app.services.phone_number import HAS_PHONE_FILTER
+from app.services.telegram_client import TelegramAPIError
+from app.services.telegram_service import telegram_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_OUTBOX_COLLECTION = "telegram_outbox"
+
+# Status pesan outbox
+OUTBOX_PENDING = "pending"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+OUTBOX_BLOCKED = "blocked"
+OUTBOX_STATUSES = (OUTBOX_PENDING, OUTBOX_SENT, OUTBOX_FAILED, OUTBOX_BLOCKED)
+
+
+class TelegramOutbox:
+    """Outbox persisten untuk pesan Telegram.
+
+    Broadcast dan notifikasi lain hanya menulis pesan ke telegram_outbox
+    (satu insert_many per job) lalu langsung kembali dengan job_id. Worker
+    pemegang lease mengirim pesan lewat TelegramClient bersama, mencoba ulang
+    kegagalan sementara dengan backoff, dan mencatat status per pesan
+    (sent, failed, blocked) sehingga kegagalan bisa dikirim ulang tanpa
+    mengirim ulang ke semua warga.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("TELEGRAM_OUTBOX_ENABLED", "true").lower() == "true"
+        self.poll_interval = float(os.getenv("TELEGRAM_OUTBOX_POLL_INTERVAL_SECONDS", "2"))
+        self.batch_size = int(os.getenv("TELEGRAM_OUTBOX_BATCH_SIZE", "200"))
+        self.max_attempts = int(os.getenv("TELEGRAM_OUTBOX_MAX_ATTEMPTS", "5"))
+        self.retry_base = float(os.getenv("TELEGRAM_OUTBOX_RETRY_BASE_SECONDS", "30"))
+        self.lease = Lease("telegram_outbox_worker", ttl_seconds=max(self.poll_interval * 10, 60))
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._metrics = {"enqueued": 0, "sent": 0, "failed": 0, "blocked": 0, "retries": 0, "run_failures": 0}
+
+    def start(self):
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.lease.release()
+        except Exception as e:
+            logger.warning(f"Failed to release Telegram outbox lease: {e}")
+
+    # ------------------------------------------------------------------
+    # Enqueue
+    # ------------------------------------------------------------------
+    async def enqueue(self, messages: list[dict], kind: str, job_id: str = None) -> dict:
+        """Simpan pesan ({"chat_id", "text", "user_id"?}) ke outbox; mengembalikan job_id dan jumlahnya"""
+        job_id = job_id or str(uuid.uuid4())
+        messages = [message for message in messages if message.get("chat_id")]
+        if messages:
+            now = datetime.now(timezone.utc)
+            db = get_database()
+            await db[TELEGRAM_OUTBOX_COLLECTION].insert_many([
+                {
+                    "id": str(uuid.uuid4()),
+                    "job_id": job_id,
+                    "kind": kind,
+                    "user_id": message.get("user_id"),
+                    "chat_id": str(message["chat_id"]),
+                    "text": message["text"],
+                    "status": OUTBOX_PENDING,
+                    "attempts": 0,
+                    "created_at": now,
+                    "next_attempt_at": now,
+                }
+                for message in messages
+            ], ordered=False)
+            self._metrics["enqueued"] += len(messages)
+            self._wakeup.set()
+        return {"job_id": job_id, "queued": len(messages)}
+
+    async def enqueue_broadcast(self, title: str, message: str, notification_type: str = "pengumuman") -> dict:
+        """Antrekan broadcast ke semua warga yang sudah menghubungkan Telegram"""
+        if not telegram_service.is_configured:
+            return {"success": False, "message": "Telegram tidak dikonfigurasi"}
+
+        db = get_database()
+        users = await db.users.find(
+            {
+                **HAS_PHONE_FILTER,
+                "is_admin": False,
+                "telegram_chat_id": {"$exists": True, "$ne": ""}
+            },
+            {"_id": 0, "id": 1, "telegram_chat_id": 1}
+        ).to_list(None)
+        if not users:
+            return {
+                "success": False,
+                "message": "Tidak ada user yang sudah mengirim /start ke bot. User perlu mengirim /start ke bot terlebih dahulu.",
+                "queued": 0,
+            }
+
+        formatted_message = telegram_service.format_message(title, message, notification_type)
+        messages = [
+            {"user_id": user["id"], "chat_id": user["telegram_chat_id"], "text": formatted_message}
+            for user in users
+        ]
+        # Salinan untuk grup/channel admin jika dikonfigurasi
+        if telegram_service.chat_id:
+            messages.append({
+                "chat_id": telegram_service.chat_id,
+                "text": f"📢 **BROADCAST NOTIFICATION QUEUED**\n\n{formatted_message}\n\n👥 **Penerima:** {len(users)} user",
+            })
+
+        job = await self.enqueue(messages, kind="broadcast")
+        logger.info(f"Telegram broadcast job {job['job_id']} queued for {len(users)} users")
+        return {
+            "success": True,
+            "message": f"Pesan broadcast diantrekan untuk {len(users)} user",
+            **job,
+        }
+
+    async def enqueue_for_users(self, messages_by_user: dict[str, str], kind: str) -> dict:
+        """Antrekan pesan per user_id; user tanpa telegram_chat_id dilewati"""
+        if not telegram_service.is_configured or not messages_by_user:
+            return {"job_id": None, "queued": 0}
+        db = get_database()
+        users = await db.users.find(
+            {"id": {"$in": list(messages_by_user)}, "telegram_chat_id": {"$exists": True, "$ne": ""}},
+            {"_id": 0, "id": 1, "telegram_chat_id": 1}
+        ).to_list(None)
+        return await self.enqueue(
+            [{"user_id": user["id"], "chat_id": user["telegram_chat_id"], "text": messages_by_user[user["id"]]} for user in users],
+            kind=kind,
+        )
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+    async def _loop(self):
+        while True:
+            try:
+                if telegram_service.client is not None and await self.lease.acquire():
+                    while await self.drain_once() >= self.batch_size:
+                        # Masih ada antrean: perpanjang lease sebelum batch berikutnya
+                        if not await self.lease.acquire():
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["run_failures"] += 1
+                logger.error(f"Telegram outbox processing failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        """Kirim satu batch pesan pending yang sudah jatuh tempo; mengembalikan ukuran batch"""
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        batch = await db[TELEGRAM_OUTBOX_COLLECTION].find(
+            {"status": OUTBOX_PENDING, "next_attempt_at": {"$lte": now}},
+            {"_id": 0, "id": 1, "chat_id": 1, "text": 1, "attempts": 1}
+        ).sort("next_attempt_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not batch:
+            return 0
+
+        # Laju kirim diatur token bucket TelegramClient; gather hanya mengisi antreannya
+        results = await asyncio.gather(*[self._send(message) for message in batch])
+        await db[TELEGRAM_OUTBOX_COLLECTION].bulk_write(
+            [UpdateOne({"id": message["id"]}, update) for message, update in zip(batch, results)],
+            ordered=False
+        )
+        return len(batch)
+
+    async def _send(self, message: dict) -> dict:
+        """Kirim satu pesan; mengembalikan update MongoDB untuk pesan tersebut"""
+        attempts = message.get("attempts", 0) + 1
+        now = datetime.now(timezone.utc)
+        try:
+            result = await telegram_service.client.send_message(message["chat_id"], message["text"])
+        except Exception as e:
+            error_code = e.error_code if isinstance(e, TelegramAPIError) else None
+            if error_code == 403:
+                # Bot diblokir / user menghapus chat: tidak ada gunanya dicoba ulang
+                self._metrics["blocked"] += 1
+                return {"$set": {"status": OUTBOX_BLOCKED, "attempts": attempts, "last_error": str(e), "failed_at": now}}
+            if error_code == 400 or attempts >= self.max_attempts:
+                self._metrics["failed"] += 1
+                return {"$set": {"status": OUTBOX_FAILED, "attempts": attempts, "last_error": str(e), "failed_at": now}}
+            self._metrics["retries"] += 1
+            delay = self.retry_base * (2 ** (attempts - 1))
+            return {"$set": {"attempts": attempts, "last_error": str(e), "next_attempt_at": now + timedelta(seconds=delay)}}
+
+        self._metrics["sent"] += 1
+        return {
+            "$set": {
+                "status": OUTBOX_SENT,
+                "attempts": attempts,
+                "sent_at": now,
+                "telegram_message_id": (result or {}).get("message_id"),
+            },
+            "$unset": {"last_error": ""},
+        }
+
+    # ------------------------------------------------------------------
+    # Status & re-drive
+    # ------------------------------------------------------------------
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """Ringkasan status pengiriman satu job"""
+        db = get_database()
+        counts = {outbox_status: 0 for outbox_status in OUTBOX_STATUSES}
+        async for row in db[TELEGRAM_OUTBOX_COLLECTION].aggregate([
+            {"$match": {"job_id": job_id}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]):
+            counts[row["_id"]] = row["count"]
+        total = sum(counts.values())
+        if not total:
+            return None
+        return {"job_id": job_id, "total": total, "done": counts[OUTBOX_PENDING] == 0, "counts": counts}
+
+    async def redrive(self, job_id: str = None, statuses: tuple[str, ...] = (OUTBOX_FAILED,)) -> int:
+        """Kembalikan pesan yang gagal ke antrean tanpa menyentuh pesan yang sudah terkirim"""
+        db = get_database()
+        query = {"status": {"$in": list(statuses)}}
+        if job_id:
+            query["job_id"] = job_id
+        result = await db[TELEGRAM_OUTBOX_COLLECTION].update_many(
+            query,
+            {"$set": {"status": OUTBOX_PENDING, "attempts": 0, "next_attempt_at": datetime.now(timezone.utc)},
+             "$unset": {"failed_at": ""}}
+        )
+        self._wakeup.set()
+        return result.modified_count
+
+    async def get_metrics(self) -> dict:
+        db = get_database()
+        counts = {
+            outbox_status: await db[TELEGRAM_OUTBOX_COLLECTION].count_documents({"status": outbox_status})
+            for outbox_status in OUTBOX_STATUSES
+        }
+        return {**self._metrics, "counts": counts, "enabled": self.enabled, "is_leader": self.lease.held}
+
+
+# Global instance
+telegram_outbox = TelegramOutbox()
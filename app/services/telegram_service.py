@@ -1,9 +1,12 @@
 import asyncio
 import logging
+import os
 from typing import List, Optional
 from datetime import datetime
 from app.config.telegram import TelegramConfig
 from app.config.database import get_database
+from app.services.telegram_client import TelegramClient, TelegramAPIError
+from app.services.phone_number import HAS_PHONE_FILTER
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +17,18 @@ class TelegramService:
         self.bot_token = None
         self.chat_id = None
         self.is_configured = False
+        self.client: Optional[TelegramClient] = None
+        # Jumlah pengiriman broadcast yang boleh menunggu giliran bersamaan; laju sebenarnya
+        # diatur token bucket di TelegramClient
+        self.broadcast_concurrency = int(os.getenv("TELEGRAM_BROADCAST_CONCURRENCY", "50"))
         
         # Inisialisasi konfigurasi
         if TelegramConfig.is_configured():
             try:
                 self.bot_token = TelegramConfig.get_bot_token()
                 self.chat_id = TelegramConfig.get_chat_id()
+                # Satu client (dan satu connection pool) untuk seluruh umur aplikasi
+                self.client = TelegramClient(self.bot_token)
                 self.is_configured = True
                 logger.info("Telegram service berhasil dikonfigurasi")
             except Exception as e:
@@ -41,12 +50,12 @@ class TelegramService:
         
         try:
             # Format pesan
-            formatted_message = self._format_message(title, message, notification_type)
+            formatted_message = self.format_message(title, message, notification_type)
             
             # Untuk sekarang, kita akan mengirim ke chat_id yang dikonfigurasi
             # atau ke semua user yang memiliki nomor HP yang sama
             if self.chat_id:
-                return await self._send_to_chat_id(self.chat_id, formatted_message)
+                return await self.send_to_chat_id(self.chat_id, formatted_message)
             else:
                 # Jika tidak ada chat_id, coba kirim ke user yang memiliki nomor HP tersebut
                 return await self._send_to_user_by_phone(phone_number, formatted_message)
@@ -65,7 +74,7 @@ class TelegramService:
         
         try:
             # Format pesan
-            formatted_message = self._format_message(title, message, notification_type)
+            formatted_message = self.format_message(title, message, notification_type)
             
             # Kirim ke semua user yang memiliki nomor HP
             return await self._send_to_all_users_individual(formatted_message, title, message, notification_type)
@@ -74,27 +83,28 @@ class TelegramService:
             logger.error(f"Gagal mengirim broadcast message: {e}")
             return {"success": False, "message": f"Error: {str(e)}"}
     
-    async def _send_to_chat_id(self, chat_id: str, message: str) -> bool:
+    async def close(self):
+        """Tutup session HTTP ke Telegram"""
+        if self.client is not None:
+            await self.client.close()
+
+    def get_metrics(self) -> dict:
+        if self.client is None:
+            return {"configured": False}
+        return {"configured": True, **self.client.get_metrics()}
+
+    async def send_to_chat_id(self, chat_id: str, message: str) -> bool:
         """Kirim pesan ke chat ID tertentu"""
+        if self.client is None:
+            logger.warning("Telegram service tidak dikonfigurasi")
+            return False
         try:
-            import aiohttp
-            
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
-            data = {
-                "chat_id": chat_id,
-                "text": message,
-                "parse_mode": "Markdown"
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=data) as response:
-                    if response.status == 200:
-                        logger.info(f"Pesan berhasil dikirim ke chat ID {chat_id}")
-                        return True
-                    else:
-                        logger.error(f"Gagal mengirim pesan ke chat ID {chat_id}: {response.status}")
-                        return False
-                        
+            await self.client.send_message(chat_id, message)
+            logger.debug(f"Pesan berhasil dikirim ke chat ID {chat_id}")
+            return True
+        except TelegramAPIError as e:
+            logger.error(f"Gagal mengirim pesan ke chat ID {chat_id}: {e}")
+            return False
         except Exception as e:
             logger.error(f"Error mengirim ke chat ID {chat_id}: {e}")
             return False
@@ -105,14 +115,14 @@ class TelegramService:
         # dengan informasi nomor HP
         if self.chat_id:
             message_with_phone = f"📱 **Nomor HP:** {phone_number}\n\n{message}"
-            return await self._send_to_chat_id(self.chat_id, message_with_phone)
+            return await self.send_to_chat_id(self.chat_id, message_with_phone)
         return False
     
     async def _send_to_all_users(self, message: str) -> dict:
         """Kirim pesan ke semua user (implementasi sederhana)"""
         # Untuk implementasi sederhana, kita akan mengirim ke chat_id yang dikonfigurasi
         if self.chat_id:
-            success = await self._send_to_chat_id(self.chat_id, message)
+            success = await self.send_to_chat_id(self.chat_id, message)
             return {
                 "success": success,
                 "message": f"Pesan broadcast dikirim ke chat ID {self.chat_id}" if success else "Gagal mengirim pesan"
@@ -121,7 +131,7 @@ class TelegramService:
         # Jika tidak ada chat_id, coba ambil semua user dan kirim ke masing-masing
         try:
             db = get_database()
-            users = await db.users.find({"nomor_hp": {"$exists": True, "$ne": ""}}, {"_id": 0}).to_list(1000)
+            users = await db.users.find(HAS_PHONE_FILTER, {"_id": 0}).to_list(1000)
             
             success_count = 0
             total_users = len(users)
@@ -130,7 +140,7 @@ class TelegramService:
             if self.chat_id:
                 user_list = "\n".join([f"• {user.get('nama', 'Unknown')} - {user.get('nomor_hp', 'N/A')}" for user in users])
                 message_with_users = f"{message}\n\n👥 **Daftar Penerima ({total_users} user):**\n{user_list}"
-                success = await self._send_to_chat_id(self.chat_id, message_with_users)
+                success = await self.send_to_chat_id(self.chat_id, message_with_users)
                 success_count = 1 if success else 0
             
             return {
@@ -149,12 +159,12 @@ class TelegramService:
             # Ambil user yang memiliki telegram_chat_id (sudah pernah chat dengan bot)
             users = await db.users.find(
                 {
-                    "nomor_hp": {"$exists": True, "$ne": ""}, 
+                    **HAS_PHONE_FILTER,
                     "is_admin": False,
                     "telegram_chat_id": {"$exists": True, "$ne": ""}
                 }, 
                 {"_id": 0, "id": 1, "nama": 1, "nomor_hp": 1, "telegram_chat_id": 1}
-            ).to_list(1000)
+            ).to_list(None)
             
             if not users:
                 return {
@@ -165,41 +175,33 @@ class TelegramService:
                     "failed_users": []
                 }
             
-            success_count = 0
-            failed_users = []
             total_users = len(users)
             
-            # Kirim ke setiap user individual
+            # Kirim ke semua user secara bersamaan; TelegramClient menjaga batas global dan per chat
             logger.info(f"Starting to send messages to {total_users} users")
+            started = asyncio.get_running_loop().time()
+            semaphore = asyncio.Semaphore(self.broadcast_concurrency)
             
-            for user in users:
-                try:
-                    chat_id = user.get('telegram_chat_id')
-                    user_name = user.get('nama', 'Unknown')
-                    user_phone = user.get('nomor_hp', 'N/A')
-                    
-                    logger.info(f"Processing user: {user_name} ({user_phone}) - chat_id: {chat_id}")
-                    
-                    if chat_id:
-                        # Kirim pesan ke chat_id individual user
-                        logger.info(f"Sending message to {user_name} via chat_id: {chat_id}")
-                        success = await self._send_to_chat_id(chat_id, formatted_message)
-                        
-                        if success:
-                            success_count += 1
-                            logger.info(f"✅ Message sent successfully to {user_name} (chat_id: {chat_id})")
-                        else:
-                            failed_users.append(user_name)
-                            logger.warning(f"❌ Failed to send to {user_name} (chat_id: {chat_id})")
-                    else:
-                        failed_users.append(user_name)
-                        logger.warning(f"❌ No telegram_chat_id for {user_name} ({user_phone})")
-                        
-                except Exception as e:
-                    failed_users.append(user.get('nama', 'Unknown'))
-                    logger.error(f"❌ Error sending to {user.get('nama', 'Unknown')}: {e}")
+            async def send_to_user(user: dict) -> bool:
+                chat_id = user.get('telegram_chat_id')
+                if not chat_id:
+                    logger.warning(f"❌ No telegram_chat_id for {user.get('nama', 'Unknown')} ({user.get('nomor_hp', 'N/A')})")
+                    return False
+                async with semaphore:
+                    return await self.send_to_chat_id(chat_id, formatted_message)
             
-            logger.info(f"Broadcast completed: {success_count}/{total_users} successful")
+            results = await asyncio.gather(*[send_to_user(user) for user in users], return_exceptions=True)
+            failed_users = [
+                user.get('nama', 'Unknown')
+                for user, result in zip(users, results)
+                if result is not True
+            ]
+            success_count = total_users - len(failed_users)
+            elapsed = asyncio.get_running_loop().time() - started
+            logger.info(
+                f"Broadcast completed: {success_count}/{total_users} successful in {elapsed:.1f}s "
+                f"({success_count / elapsed if elapsed else 0:.1f} msg/s)"
+            )
             
             # Juga kirim ke grup/channel jika dikonfigurasi (untuk backup/notifikasi admin)
             if self.chat_id:
@@ -221,7 +223,7 @@ class TelegramService:
 ❌ Gagal: {len(failed_users)}
 """
                     
-                    await self._send_to_chat_id(self.chat_id, admin_message)
+                    await self.send_to_chat_id(self.chat_id, admin_message)
                     logger.info("Admin notification sent to group/channel")
                     
                 except Exception as e:
@@ -243,7 +245,7 @@ class TelegramService:
             logger.error(f"Error mengirim ke semua user individual: {e}")
             return {"success": False, "message": f"Error: {str(e)}"}
     
-    def _format_message(self, title: str, message: str, notification_type: str) -> str:
+    def format_message(self, title: str, message: str, notification_type: str) -> str:
         """Format pesan sesuai template"""
         timestamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
         
@@ -260,25 +262,16 @@ class TelegramService:
             return {"success": False, "message": "Telegram tidak dikonfigurasi"}
         
         try:
-            import aiohttp
-            
-            url = f"https://api.telegram.org/bot{self.bot_token}/getMe"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        bot_info = data.get("result", {})
-                        return {
-                            "success": True,
-                            "message": f"Bot berhasil dikonfigurasi: @{bot_info.get('username', 'Unknown')}"
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "message": f"Gagal mengakses Bot API: {response.status}"
-                        }
-                        
+            bot_info = await self.client.get_me() or {}
+            return {
+                "success": True,
+                "message": f"Bot berhasil dikonfigurasi: @{bot_info.get('username', 'Unknown')}"
+            }
+        except TelegramAPIError as e:
+            return {
+                "success": False,
+                "message": f"Gagal mengakses Bot API: {e.error_code or e.message}"
+            }
         except Exception as e:
             return {"success": False, "message": f"Error: {str(e)}"}
 
@@ -0,0 +1,110 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.config.database import get_database
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Field user yang dibutuhkan handler command bot
+TELEGRAM_USER_PROJECTION = {"_id": 0, "id": 1, "nama": 1, "nomor_hp": 1, "nomor_rumah": 1, "alamat": 1}
+
+
+class TelegramUserCache:
+    """Cache LRU + TTL dari telegram_chat_id ke proyeksi ringkas user.
+
+    Chat yang belum terhubung juga di-cache dengan TTL lebih pendek, karena
+    setelah broadcast banyak warga mengetik /status berulang kali. Entry
+    dihapus saat mapping berubah (linking bot, activate/deactivate-telegram,
+    update/hapus user); TTL membatasi data basi dari proses lain.
+    """
+
+    def __init__(self, ttl: float = None, negative_ttl: float = None, max_entries: int = None):
+        if ttl is None:
+            ttl = float(os.getenv("TELEGRAM_USER_CACHE_TTL_SECONDS", "300"))
+        if negative_ttl is None:
+            negative_ttl = float(os.getenv("TELEGRAM_USER_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+        if max_entries is None:
+            max_entries = int(os.getenv("TELEGRAM_USER_CACHE_MAX_ENTRIES", "5000"))
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # chat_id -> (user atau None jika belum terhubung, expires_at monotonic)
+        self._entries: OrderedDict[str, tuple[Optional[dict], float]] = OrderedDict()
+        # user_id -> chat_id, untuk invalidasi berdasarkan user
+        self._chat_by_user: dict[str, str] = {}
+        # Naik setiap invalidasi; hasil query yang dimulai sebelum invalidasi tidak disimpan
+        self._generation = 0
+        self._metrics = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    async def get_user(self, chat_id) -> Optional[dict]:
+        """User yang terhubung ke chat_id, atau None jika belum terhubung"""
+        chat_key = str(chat_id)
+        entry = self._entries.get(chat_key)
+        if entry is not None:
+            user, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(chat_key)
+                self._metrics["hits"] += 1
+                return user
+            self._drop(chat_key)
+
+        self._metrics["misses"] += 1
+        generation = self._generation
+        db = get_database()
+        user = await db.users.find_one({"telegram_chat_id": chat_key}, TELEGRAM_USER_PROJECTION)
+        if generation == self._generation:
+            self._put(chat_key, user)
+        return user
+
+    def _put(self, chat_key: str, user: Optional[dict]):
+        ttl = self.ttl if user is not None else self.negative_ttl
+        self._drop(chat_key)
+        self._entries[chat_key] = (user, time.monotonic() + ttl)
+        if user is not None:
+            # Satu user hanya terhubung ke satu chat; entry chat sebelumnya sudah basi
+            previous_chat = self._chat_by_user.get(user["id"])
+            if previous_chat is not None and previous_chat != chat_key:
+                self._drop(previous_chat)
+            self._chat_by_user[user["id"]] = chat_key
+        while len(self._entries) > self.max_entries:
+            oldest, _ = next(iter(self._entries.items()))
+            self._drop(oldest)
+
+    def _drop(self, chat_key: str):
+        entry = self._entries.pop(chat_key, None)
+        if entry is not None and entry[0] is not None:
+            user_id = entry[0]["id"]
+            if self._chat_by_user.get(user_id) == chat_key:
+                del self._chat_by_user[user_id]
+
+    def invalidate_chat(self, chat_id):
+        """Hapus entry chat_id (misalnya setelah chat ini dihubungkan ke user)"""
+        if chat_id is None or chat_id == "":
+            return
+        self._generation += 1
+        self._metrics["invalidations"] += 1
+        self._drop(str(chat_id))
+
+    def invalidate_user(self, user_id: Optional[str]):
+        """Hapus entry milik user (profil berubah, Telegram diaktifkan/dinonaktifkan, user dihapus)"""
+        if not user_id:
+            return
+        self._generation += 1
+        self._metrics["invalidations"] += 1
+        chat_key = self._chat_by_user.get(user_id)
+        if chat_key is not None:
+            self._drop(chat_key)
+
+    def get_metrics(self) -> dict:
+        lookups = self._metrics["hits"] + self._metrics["misses"]
+        return {
+            **self._metrics,
+            "hit_rate": round(self._metrics["hits"] / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+        }
+
+
+# Global instance
+telegram_user_cache = TelegramUserCache()
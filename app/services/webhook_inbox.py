@@ -0,0 +1,249 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from pydantic import ValidationError
+from app.config.database import get_database
+from app.models import MidtransNotificationRequest
+from app.services.dashboard_broadcaster import dashboard_broadcaster
+from app.services.lease import Lease
+from app.services.midtrans_service import midtrans_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_INBOX_COLLECTION = "webhook_inbox"
+
+# Status entri inbox
+INBOX_PENDING = "pending"
+INBOX_DONE = "done"
+INBOX_DEAD = "dead"
+
+
+def normalize_notification_payload(payload: dict) -> dict:
+    """Salin info VA dari va_numbers ke field bank/va_number"""
+    if isinstance(payload, dict) and payload.get("va_numbers"):
+        try:
+            va = payload["va_numbers"][0]
+            payload = {**payload, "bank": va.get("bank"), "va_number": va.get("va_number")}
+        except Exception:
+            pass
+    return payload
+
+
+class WebhookInboxProcessor:
+    """Inbox durable untuk notifikasi Midtrans.
+
+    Route webhook hanya menyimpan payload mentah lalu langsung menjawab 200.
+    Processor (pemegang lease) memproses inbox berurutan per order_id;
+    kegagalan dicoba ulang dengan backoff dan setelah WEBHOOK_INBOX_MAX_ATTEMPTS
+    entri dipindah ke status dead untuk di-replay manual.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("WEBHOOK_INBOX_PROCESSOR_ENABLED", "true").lower() == "true"
+        self.poll_interval = float(os.getenv("WEBHOOK_INBOX_POLL_INTERVAL_SECONDS", "2"))
+        self.batch_size = int(os.getenv("WEBHOOK_INBOX_BATCH_SIZE", "100"))
+        self.max_attempts = int(os.getenv("WEBHOOK_INBOX_MAX_ATTEMPTS", "8"))
+        self.retry_base = float(os.getenv("WEBHOOK_INBOX_RETRY_BASE_SECONDS", "5"))
+        self.concurrency = int(os.getenv("WEBHOOK_INBOX_CONCURRENCY", "8"))
+        self.lease = Lease("webhook_inbox_processor", ttl_seconds=max(self.poll_interval * 10, 30))
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._metrics = {
+            "received": 0,
+            "processed": 0,
+            "duplicates": 0,
+            "retries": 0,
+            "dead_lettered": 0,
+            "run_failures": 0,
+            "last_lag_ms": None,
+        }
+
+    def start(self):
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.lease.release()
+        except Exception as e:
+            logger.warning(f"Failed to release webhook inbox lease: {e}")
+
+    async def enqueue(self, payload: dict) -> str:
+        """Simpan payload mentah ke inbox; satu insert, tanpa baca payment/fee"""
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        entry_id = str(uuid.uuid4())
+        await db[WEBHOOK_INBOX_COLLECTION].insert_one({
+            "id": entry_id,
+            "order_id": payload.get("order_id"),
+            "transaction_status": payload.get("transaction_status"),
+            "payload": payload,
+            "status": INBOX_PENDING,
+            "attempts": 0,
+            "received_at": now,
+            "next_attempt_at": now,
+        })
+        self._metrics["received"] += 1
+        self._wakeup.set()
+        return entry_id
+
+    async def _loop(self):
+        while True:
+            try:
+                if await self.lease.acquire():
+                    await self.drain_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metrics["run_failures"] += 1
+                logger.error(f"Webhook inbox processing failed: {e}")
+            # Dibangunkan oleh enqueue di proses yang sama, atau polling untuk proses lain
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def drain_once(self) -> int:
+        """Proses satu batch entri pending yang sudah jatuh tempo; mengembalikan jumlah entri yang selesai"""
+        db = get_database()
+        now = datetime.now(timezone.utc)
+        query = {
+            "status": INBOX_PENDING,
+            "$or": [{"next_attempt_at": {"$lte": now}}, {"next_attempt_at": None}],
+        }
+        # Entri yang masih menunggu retry menahan entri berikutnya dari order yang sama.
+        # Order tersebut dikeluarkan langsung di query, bukan dilewati di dalam batch,
+        # agar entri yang tertahan tidak memenuhi batch dan membuat webhook baru menunggu.
+        blocked = await self._blocked_orders(now)
+        if blocked:
+            query["$nor"] = [
+                {"order_id": order_id, "received_at": {"$gte": first_received_at}}
+                for order_id, first_received_at in blocked.items()
+            ]
+        entries = await db[WEBHOOK_INBOX_COLLECTION].find(query).sort(
+            [("received_at", 1), ("_id", 1)]
+        ).limit(self.batch_size).to_list(self.batch_size)
+        if not entries:
+            return 0
+
+        by_order: dict[str, list[dict]] = {}
+        for entry in entries:
+            by_order.setdefault(entry.get("order_id") or entry["id"], []).append(entry)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_order(order_entries: list[dict]) -> tuple[int, bool]:
+            async with semaphore:
+                return await self._process_order(order_entries)
+
+        results = await asyncio.gather(*[run_order(group) for group in by_order.values()])
+        finished = sum(count for count, _ in results)
+        if any(changed for _, changed in results):
+            dashboard_broadcaster.mark_dirty()
+        return finished
+
+    async def _blocked_orders(self, now: datetime) -> dict:
+        """order_id -> received_at entri pending paling awal yang belum jatuh tempo"""
+        db = get_database()
+        rows = await db[WEBHOOK_INBOX_COLLECTION].aggregate([
+            {"$match": {"status": INBOX_PENDING, "next_attempt_at": {"$gt": now}}},
+            {"$group": {"_id": "$order_id", "received_at": {"$min": "$received_at"}}},
+        ]).to_list(None)
+        # Entri tanpa order_id tidak punya urutan yang perlu dijaga
+        return {row["_id"]: row["received_at"] for row in rows if row["_id"] is not None}
+
+    async def _process_order(self, entries: list[dict]) -> tuple[int, bool]:
+        """Proses entri satu order_id secara berurutan; berhenti di entri yang dijadwalkan retry"""
+        finished = 0
+        changed = False
+        for entry in entries:
+            outcome, applied = await self._process_entry(entry)
+            if outcome == INBOX_PENDING:
+                # Entri berikutnya untuk order yang sama harus menunggu entri ini
+                break
+            finished += 1
+            changed = changed or applied
+        return finished, changed
+
+    async def _process_entry(self, entry: dict) -> tuple[str, bool]:
+        """Proses satu entri; mengembalikan (status baru, apakah payment berubah)"""
+        db = get_database()
+        attempts = entry.get("attempts", 0) + 1
+        try:
+            notification = MidtransNotificationRequest(**normalize_notification_payload(entry["payload"]))
+            result = await midtrans_service.handle_notification(notification)
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            # Error 4xx selain 404 (signature/payload tidak valid) tidak akan sembuh dengan retry;
+            # 404 bisa terjadi jika webhook tiba sebelum payment selesai disimpan
+            permanent = isinstance(e, ValidationError) or (
+                isinstance(e, HTTPException) and 400 <= e.status_code < 500 and e.status_code != 404
+            )
+            if permanent or attempts >= self.max_attempts:
+                await db[WEBHOOK_INBOX_COLLECTION].update_one(
+                    {"id": entry["id"]},
+                    {"$set": {"status": INBOX_DEAD, "attempts": attempts, "last_error": error,
+                              "dead_at": datetime.now(timezone.utc)}}
+                )
+                self._metrics["dead_lettered"] += 1
+                logger.error(f"Webhook inbox entry {entry['id']} ({entry.get('order_id')}) dead-lettered: {error}")
+                return INBOX_DEAD, False
+
+            delay = self.retry_base * (2 ** (attempts - 1))
+            await db[WEBHOOK_INBOX_COLLECTION].update_one(
+                {"id": entry["id"]},
+                {"$set": {"attempts": attempts, "last_error": error,
+                          "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay)}}
+            )
+            self._metrics["retries"] += 1
+            logger.warning(f"Webhook inbox entry {entry['id']} failed (attempt {attempts}), retry in {delay:.0f}s: {error}")
+            return INBOX_PENDING, False
+
+        processed_at = datetime.now(timezone.utc)
+        await db[WEBHOOK_INBOX_COLLECTION].update_one(
+            {"id": entry["id"]},
+            {"$set": {"status": INBOX_DONE, "attempts": attempts, "processed_at": processed_at,
+                      "duplicate": bool(result.get("duplicate"))}, "$unset": {"last_error": ""}}
+        )
+        received_at = entry["received_at"]
+        if received_at.tzinfo is None:
+            received_at = received_at.replace(tzinfo=timezone.utc)
+        self._metrics["last_lag_ms"] = round((processed_at - received_at).total_seconds() * 1000, 2)
+        if result.get("duplicate"):
+            self._metrics["duplicates"] += 1
+            return INBOX_DONE, False
+        self._metrics["processed"] += 1
+        return INBOX_DONE, True
+
+    async def replay(self, query: dict) -> int:
+        """Kembalikan entri yang cocok ke antrean pending untuk diproses ulang"""
+        db = get_database()
+        result = await db[WEBHOOK_INBOX_COLLECTION].update_many(
+            query,
+            {"$set": {"status": INBOX_PENDING, "attempts": 0, "next_attempt_at": datetime.now(timezone.utc)},
+             "$unset": {"dead_at": "", "processed_at": ""}}
+        )
+        self._wakeup.set()
+        return result.modified_count
+
+    async def get_metrics(self) -> dict:
+        db = get_database()
+        counts = {
+            inbox_status: await db[WEBHOOK_INBOX_COLLECTION].count_documents({"status": inbox_status})
+            for inbox_status in (INBOX_PENDING, INBOX_DONE, INBOX_DEAD)
+        }
+        return {**self._metrics, "counts": counts, "enabled": self.enabled, "is_leader": self.lease.held}
+
+
+# Global instance
+webhook_inbox_processor = WebhookInboxProcessor()
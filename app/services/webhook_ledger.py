@@ -0,0 +1,105 @@
+import os
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.config.database import get_database
+import logging
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_LEDGER_COLLECTION = "webhook_ledger"
+
+# Status entri ledger
+LEDGER_PROCESSING = "processing"
+LEDGER_DONE = "done"
+
+# Hasil claim
+CLAIM_ACQUIRED = "acquired"
+CLAIM_DUPLICATE = "duplicate"
+CLAIM_IN_PROGRESS = "in_progress"
+
+
+class WebhookLedger:
+    """Ledger notifikasi Midtrans.
+
+    Kuncinya (order_id, transaction_status, status_code) dengan unique index.
+    Klaim ditulis dengan status processing dan batas waktu (claimed_until);
+    hanya entri done yang dianggap duplikat. Jika proses mati setelah klaim,
+    retry berikutnya mengambil alih klaim yang sudah lewat batas waktunya
+    sehingga update payment/fee tidak hilang.
+    """
+
+    def __init__(self):
+        self.claim_seconds = float(os.getenv("WEBHOOK_LEDGER_CLAIM_SECONDS", "60"))
+        self._metrics = {"claimed": 0, "duplicates": 0, "in_progress": 0, "taken_over": 0, "completed": 0, "released": 0}
+
+    @staticmethod
+    def _key(order_id: str, transaction_status: str, status_code: str) -> dict:
+        return {"order_id": order_id, "transaction_status": transaction_status, "status_code": status_code}
+
+    async def claim(self, order_id: str, transaction_status: str, status_code: str) -> str:
+        """Klaim notifikasi untuk diproses.
+
+        Mengembalikan CLAIM_ACQUIRED, CLAIM_DUPLICATE (sudah selesai diproses)
+        atau CLAIM_IN_PROGRESS (klaim lain masih berlaku; coba lagi nanti).
+        """
+        db = get_database()
+        key = self._key(order_id, transaction_status, status_code)
+        now = datetime.now(timezone.utc)
+        claimed_until = now + timedelta(seconds=self.claim_seconds)
+        try:
+            await db[WEBHOOK_LEDGER_COLLECTION].insert_one({
+                **key,
+                "status": LEDGER_PROCESSING,
+                "received_at": now,
+                "claimed_until": claimed_until,
+            })
+            self._metrics["claimed"] += 1
+            return CLAIM_ACQUIRED
+        except DuplicateKeyError:
+            pass
+
+        # Klaim yang kedaluwarsa berarti pemroses sebelumnya mati sebelum selesai
+        taken = await db[WEBHOOK_LEDGER_COLLECTION].find_one_and_update(
+            {**key, "status": LEDGER_PROCESSING, "claimed_until": {"$lte": now}},
+            {"$set": {"claimed_until": claimed_until}, "$inc": {"takeovers": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if taken is not None:
+            self._metrics["taken_over"] += 1
+            logger.warning(f"Took over expired webhook ledger claim: {order_id} {transaction_status} {status_code}")
+            return CLAIM_ACQUIRED
+
+        existing = await db[WEBHOOK_LEDGER_COLLECTION].find_one(key, {"_id": 0, "status": 1})
+        # Entri lama tanpa status ditulis setelah notifikasi selesai diproses
+        if existing is not None and existing.get("status", LEDGER_DONE) == LEDGER_DONE:
+            self._metrics["duplicates"] += 1
+            logger.info(f"Duplicate Midtrans notification ignored: {order_id} {transaction_status} {status_code}")
+            return CLAIM_DUPLICATE
+        self._metrics["in_progress"] += 1
+        return CLAIM_IN_PROGRESS
+
+    async def complete(self, order_id: str, transaction_status: str, status_code: str):
+        """Tandai notifikasi selesai diproses; setelah ini retry dianggap duplikat"""
+        db = get_database()
+        await db[WEBHOOK_LEDGER_COLLECTION].update_one(
+            self._key(order_id, transaction_status, status_code),
+            {"$set": {"status": LEDGER_DONE, "processed_at": datetime.now(timezone.utc)},
+             "$unset": {"claimed_until": ""}}
+        )
+        self._metrics["completed"] += 1
+
+    async def release(self, order_id: str, transaction_status: str, status_code: str):
+        """Hapus klaim jika pemrosesan gagal, agar retry Midtrans berikutnya diproses ulang"""
+        db = get_database()
+        await db[WEBHOOK_LEDGER_COLLECTION].delete_one(
+            {**self._key(order_id, transaction_status, status_code), "status": {"$ne": LEDGER_DONE}}
+        )
+        self._metrics["released"] += 1
+
+    def get_metrics(self) -> dict:
+        return {**self._metrics, "claim_seconds": self.claim_seconds}
+
+
+# Global instance
+webhook_ledger = WebhookLedger()
@@ -1,6 +1,15 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
-from app.config.database import init_database, close_database
+from app.config.database import init_database, close_database, database_manager
+from app.services.dashboard_broadcaster import dashboard_broadcaster
+from app.services.report_renderer import report_renderer
+from app.services.export_job_service import export_job_service
+from app.services.midtrans_service import midtrans_service
+from app.services.payment_reconciler import payment_reconciler
+from app.services.payment_expiry_sweeper import payment_expiry_sweeper
+from app.services.webhook_inbox import webhook_inbox_processor
+from app.services.telegram_service import telegram_service
+from app.services.telegram_outbox import telegram_outbox
 from app.routes import user_routes, fee_routes, payment_routes, notification_routes, admin_routes, websocket_routes, telegram_routes
 from app.middleware import setup_cors_middleware, setup_security_middleware, setup_rate_limiting_middleware
 from app.middleware.security_middleware import add_security_headers, add_hsts_header
@@ -24,10 +33,34 @@ async def lifespan(app: FastAPI):
         logger.error(f"Failed to initialize database: {e}")
         # Don't raise exception, let app start without database for testing
     
+    if database_manager.database is not None:
+        try:
+            await export_job_service.purge_expired()
+        except Exception as e:
+            logger.error(f"Failed to purge export jobs: {e}")
+        # Worker export job; job yang terputus di proses lain diambil alih setelah lease-nya habis
+        export_job_service.start()
+        # Sinkronisasi payment Pending dengan Midtrans di background
+        payment_reconciler.start()
+        payment_expiry_sweeper.start()
+        # Proses notifikasi Midtrans yang sudah disimpan route webhook
+        webhook_inbox_processor.start()
+        # Kirim pesan Telegram yang diantrekan broadcast/notifikasi
+        telegram_outbox.start()
+    
     logger.info("Application started successfully")
     yield
     
     # Shutdown
+    await dashboard_broadcaster.shutdown()
+    await payment_reconciler.shutdown()
+    await payment_expiry_sweeper.shutdown()
+    await webhook_inbox_processor.shutdown()
+    await telegram_outbox.shutdown()
+    await export_job_service.shutdown()
+    report_renderer.shutdown()
+    await midtrans_service.close()
+    await telegram_service.close()
     try:
         await close_database()
         logger.info("Database connection closed successfully")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Script untuk membuat/menyesuaikan index MongoDB sesuai app/config/indexes.py
+dan memeriksa bahwa query penting tidak melakukan COLLSCAN.
+
+Usage:
+    python script/ensure_indexes.py            # rekonsiliasi index
+    python script/ensure_indexes.py --check    # rekonsiliasi + cek explain()
+    python script/ensure_indexes.py --check-only
+"""
+
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.database import get_database, init_database, close_database
+from app.config.indexes import ensure_indexes, check_hot_queries
+
+async def run(reconcile: bool, check: bool) -> int:
+    """Jalankan rekonsiliasi index dan/atau pengecekan query plan"""
+    exit_code = 0
+
+    try:
+        await init_database(reconcile_indexes=False)
+        db = get_database()
+
+        if reconcile:
+            print("🚀 Reconciling indexes...")
+            summary = await ensure_indexes(db)
+            for key in ("created", "recreated", "unchanged", "failed"):
+                print(f"   - {key}: {len(summary[key])}")
+                for name in summary[key] if key != "unchanged" else []:
+                    print(f"       • {name}")
+            if summary["failed"]:
+                print("❌ Some indexes could not be created (check for duplicate data)")
+                exit_code = 1
+            else:
+                print("✅ Indexes are up to date")
+
+        if check:
+            print("\n🔍 Checking hot query plans...")
+            violations = await check_hot_queries(db)
+            if violations:
+                for violation in violations:
+                    print(f"❌ {violation['collection']}: {violation['name']} -> {' > '.join(violation['stages'])}")
+                print(f"❌ {len(violations)} hot queries fall back to COLLSCAN")
+                exit_code = 1
+            else:
+                print("✅ All hot queries use an index")
+
+    except Exception as e:
+        print(f"❌ Failed: {str(e)}")
+        exit_code = 1
+    finally:
+        await close_database()
+
+    return exit_code
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ensure MongoDB indexes from the index registry")
+    parser.add_argument("--check", action="store_true", help="Also fail when a hot query uses COLLSCAN")
+    parser.add_argument("--check-only", action="store_true", help="Only run the COLLSCAN check")
+
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(reconcile=not args.check_only, check=args.check or args.check_only)))
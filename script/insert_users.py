@@ -19,6 +19,7 @@ sys.path.insert(0, str(backend_dir))
 
 from app.config.database import init_database, close_database, get_database
 from app.models.user import User, UserCreate
+from app.services.phone_number import normalize_phone_number
 
 class UserInserter:
     def __init__(self):
@@ -94,7 +95,11 @@ class UserInserter:
                     continue
                 
                 # Insert user
-                result = await self.db.users.insert_one(user.dict())
+                user_dict = user.dict()
+                nomor_hp_normalized = normalize_phone_number(user.nomor_hp)
+                if nomor_hp_normalized:
+                    user_dict["nomor_hp_normalized"] = nomor_hp_normalized
+                result = await self.db.users.insert_one(user_dict)
                 print(f"✅ User '{user.username}' inserted successfully with ID: {result.inserted_id}")
                 results["success"] += 1
                 
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Stub server Midtrans (Snap + Core API) untuk testing lokal.
+
+Jalankan:
+    python script/midtrans_stub_server.py --port 8089
+
+lalu arahkan backend ke stub:
+    MIDTRANS_SNAP_BASE_URL=http://localhost:8089/snap/v1
+    MIDTRANS_API_BASE_URL=http://localhost:8089/v2
+
+Endpoint kontrol untuk test:
+    POST /_stub/transactions/{order_id}  {"transaction_status": "settlement"}  -> ubah status
+    POST /_stub/fail                     {"count": 2, "status": 503}           -> gagalkan N request berikutnya
+    GET  /_stub/requests                                                       -> jumlah request per endpoint
+"""
+
+import argparse
+import uuid
+from datetime import datetime
+
+from aiohttp import web
+
+def _not_found(order_id: str) -> web.Response:
+    # Core API menjawab HTTP 200 dengan status_code 404 di body
+    return web.json_response({
+        "status_code": "404",
+        "status_message": "Transaction doesn't exist.",
+        "id": str(uuid.uuid4()),
+    })
+
+def create_app() -> web.Application:
+    """Aplikasi aiohttp yang meniru endpoint Midtrans yang dipakai backend"""
+    app = web.Application()
+    app["transactions"] = {}
+    app["fail"] = {"count": 0, "status": 503}
+    app["requests"] = {}
+
+    @web.middleware
+    async def stub_middleware(request: web.Request, handler):
+        if not request.path.startswith("/_stub"):
+            resource = request.match_info.route.resource
+            key = f"{request.method} {resource.canonical if resource else request.path}"
+            app["requests"][key] = app["requests"].get(key, 0) + 1
+            if app["fail"]["count"] > 0:
+                app["fail"]["count"] -= 1
+                return web.json_response({"status_message": "Stub failure"}, status=app["fail"]["status"])
+            if request.headers.get("Authorization", "").split(" ")[0] != "Basic":
+                return web.json_response({"status_code": "401", "status_message": "Unauthorized"}, status=401)
+        return await handler(request)
+
+    app.middlewares.append(stub_middleware)
+
+    async def snap_create(request: web.Request):
+        payload = await request.json()
+        details = payload.get("transaction_details") or {}
+        order_id = details.get("order_id")
+        if not order_id:
+            return web.json_response({"error_messages": ["transaction_details.order_id is required"]}, status=400)
+        if order_id in app["transactions"]:
+            return web.json_response({"error_messages": ["transaction_details.order_id sudah digunakan"]}, status=400)
+
+        token = uuid.uuid4().hex
+        app["transactions"][order_id] = {
+            "order_id": order_id,
+            "transaction_id": str(uuid.uuid4()),
+            "transaction_status": "pending",
+            "gross_amount": f"{details.get('gross_amount', 0)}.00",
+            "payment_type": "bank_transfer",
+            "fraud_status": "accept",
+            "transaction_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        return web.json_response({
+            "token": token,
+            "redirect_url": f"http://{request.host}/snap/v2/vtweb/{token}",
+        }, status=201)
+
+    async def status(request: web.Request):
+        order_id = request.match_info["order_id"]
+        transaction = app["transactions"].get(order_id)
+        if not transaction:
+            return _not_found(order_id)
+        return web.json_response({
+            "status_code": "201" if transaction["transaction_status"] == "pending" else "200",
+            "status_message": "Success, transaction is found",
+            **transaction,
+        })
+
+    async def change_status(request: web.Request, new_status: str):
+        order_id = request.match_info["order_id"]
+        transaction = app["transactions"].get(order_id)
+        if not transaction:
+            return _not_found(order_id)
+        if transaction["transaction_status"] != "pending":
+            return web.json_response({
+                "status_code": "412",
+                "status_message": "Merchant cannot modify the status of the transaction",
+            })
+        transaction["transaction_status"] = new_status
+        return web.json_response({"status_code": "200", "status_message": f"Success, transaction is {new_status}", **transaction})
+
+    async def cancel(request: web.Request):
+        return await change_status(request, "cancel")
+
+    async def expire(request: web.Request):
+        return await change_status(request, "expire")
+
+    async def stub_set_status(request: web.Request):
+        order_id = request.match_info["order_id"]
+        payload = await request.json()
+        transaction = app["transactions"].setdefault(order_id, {
+            "order_id": order_id,
+            "transaction_id": str(uuid.uuid4()),
+            "gross_amount": "0.00",
+            "payment_type": "bank_transfer",
+            "fraud_status": "accept",
+        })
+        transaction["transaction_status"] = payload.get("transaction_status", "pending")
+        return web.json_response(transaction)
+
+    async def stub_fail(request: web.Request):
+        payload = await request.json()
+        app["fail"] = {"count": int(payload.get("count", 1)), "status": int(payload.get("status", 503))}
+        return web.json_response(app["fail"])
+
+    async def stub_requests(request: web.Request):
+        return web.json_response(app["requests"])
+
+    app.router.add_post("/snap/v1/transactions", snap_create)
+    app.router.add_get("/v2/{order_id}/status", status)
+    app.router.add_post("/v2/{order_id}/cancel", cancel)
+    app.router.add_post("/v2/{order_id}/expire", expire)
+    app.router.add_post("/_stub/transactions/{order_id}", stub_set_status)
+    app.router.add_post("/_stub/fail", stub_fail)
+    app.router.add_get("/_stub/requests", stub_requests)
+    return app
+
+async def start_stub_server(host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    """Jalankan stub di event loop yang sedang berjalan; kembalikan (runner, base_url)"""
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub server Midtrans untuk testing lokal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    print(f"🚀 Midtrans stub berjalan di http://{args.host}:{args.port}")
+    print(f"   MIDTRANS_SNAP_BASE_URL=http://{args.host}:{args.port}/snap/v1")
+    print(f"   MIDTRANS_API_BASE_URL=http://{args.host}:{args.port}/v2")
+    web.run_app(create_app(), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
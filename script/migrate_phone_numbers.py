@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Migration script untuk mengisi users.nomor_hp_normalized (format E.164, +628xx)
+dari nomor_hp, lalu membuat unique index-nya.
+
+Nomor yang sama milik lebih dari satu user tidak diisi dan dilaporkan,
+karena unique index akan gagal dibuat; perbaiki datanya lalu jalankan ulang.
+
+Usage:
+    python script/migrate_phone_numbers.py
+    python script/migrate_phone_numbers.py --dry-run
+    python script/migrate_phone_numbers.py --batch-size 1000
+"""
+
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import UpdateOne
+from app.config.database import get_database, init_database, close_database
+from app.config.indexes import ensure_indexes
+from app.services.phone_number import normalize_phone_number
+
+async def migrate_phone_numbers(batch_size: int, dry_run: bool) -> int:
+    """Backfill nomor_hp_normalized per batch (keyset pada _id)"""
+    print("🚀 Starting phone number migration...")
+    exit_code = 0
+
+    try:
+        await init_database(reconcile_indexes=False)
+        db = get_database()
+
+        # Nomor yang sudah dimiliki user lain (termasuk dari run sebelumnya)
+        owners: dict[str, str] = {}
+        async for user in db.users.find(
+            {"nomor_hp_normalized": {"$exists": True}}, {"_id": 0, "id": 1, "nomor_hp_normalized": 1}
+        ):
+            owners[user["nomor_hp_normalized"]] = user["id"]
+
+        stats = {"checked": 0, "updated": 0, "cleared": 0, "invalid": 0, "duplicates": 0}
+        duplicates = []
+        last_id = None
+        while True:
+            query = {} if last_id is None else {"_id": {"$gt": last_id}}
+            batch = await db.users.find(
+                query, {"_id": 1, "id": 1, "nama": 1, "nomor_hp": 1, "nomor_hp_normalized": 1}
+            ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+
+            operations = []
+            for user in batch:
+                stats["checked"] += 1
+                normalized = normalize_phone_number(user.get("nomor_hp"))
+                if not normalized:
+                    if user.get("nomor_hp"):
+                        stats["invalid"] += 1
+                    if "nomor_hp_normalized" in user:
+                        operations.append(UpdateOne({"_id": user["_id"]}, {"$unset": {"nomor_hp_normalized": ""}}))
+                        stats["cleared"] += 1
+                    continue
+
+                owner = owners.setdefault(normalized, user["id"])
+                if owner != user["id"]:
+                    stats["duplicates"] += 1
+                    duplicates.append((normalized, owner, user["id"], user.get("nama", "Unknown")))
+                    continue
+                if user.get("nomor_hp_normalized") != normalized:
+                    operations.append(UpdateOne({"_id": user["_id"]}, {"$set": {"nomor_hp_normalized": normalized}}))
+                    stats["updated"] += 1
+
+            if operations and not dry_run:
+                await db.users.bulk_write(operations, ordered=False)
+            print(f"   - processed {stats['checked']} users")
+
+        print(f"📊 Checked: {stats['checked']}, updated: {stats['updated']}, cleared: {stats['cleared']}, "
+              f"invalid: {stats['invalid']}, duplicates: {stats['duplicates']}")
+        for normalized, owner, user_id, nama in duplicates:
+            print(f"   ⚠️  {normalized} already belongs to user {owner}; skipped {nama} ({user_id})")
+
+        if dry_run:
+            print("🔍 Dry run - no changes written")
+        elif duplicates:
+            print("❌ Resolve duplicate phone numbers, then run again to create the unique index")
+            exit_code = 1
+        else:
+            summary = await ensure_indexes(db)
+            if "users_nomor_hp_normalized_unique" in summary["failed"]:
+                print("❌ Failed to create users_nomor_hp_normalized_unique")
+                exit_code = 1
+            else:
+                print("✅ Unique index users_nomor_hp_normalized_unique is in place")
+            print("🎉 Migration completed successfully!")
+
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        exit_code = 1
+    finally:
+        await close_database()
+
+    return exit_code
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backfill users.nomor_hp_normalized and its unique index")
+    parser.add_argument("--batch-size", type=int, default=500, help="Users per batch (default: 500)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(migrate_phone_numbers(args.batch_size, args.dry_run)))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Migration script untuk mengubah created_at lama yang tersimpan sebagai ISO
+string menjadi datetime, agar ikut terfilter rentang tanggal dan terurut
+bersama dokumen lain pada keyset pagination.
+
+String tanpa offset zona waktu dianggap waktu Asia/Jakarta (+07:00).
+String yang tidak bisa di-parse dilaporkan dan dibiarkan.
+
+Usage:
+    python script/normalize_created_at.py
+    python script/normalize_created_at.py --dry-run
+    python script/normalize_created_at.py --collection payments
+"""
+
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import UpdateOne
+from app.config.database import get_database, init_database, close_database
+
+# Koleksi yang dipakai endpoint list berpaginasi
+COLLECTIONS = ["users", "fees", "payments", "notifications"]
+JAKARTA_TZ = timezone(timedelta(hours=7))
+
+def parse_created_at(value: str):
+    """Parse ISO string; None jika formatnya tidak dikenali"""
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=JAKARTA_TZ)
+    return parsed
+
+async def normalize_collection(db, name: str, batch_size: int, dry_run: bool) -> dict:
+    """Konversi created_at string di satu koleksi per batch"""
+    stats = {"converted": 0, "unparseable": 0}
+    operations = []
+    async for doc in db[name].find({"created_at": {"$type": "string"}}, {"_id": 1, "created_at": 1}):
+        parsed = parse_created_at(doc["created_at"])
+        if parsed is None:
+            stats["unparseable"] += 1
+            print(f"   ⚠️  {name} {doc['_id']}: cannot parse created_at {doc['created_at']!r}")
+            continue
+        operations.append(UpdateOne({"_id": doc["_id"], "created_at": doc["created_at"]}, {"$set": {"created_at": parsed}}))
+        stats["converted"] += 1
+        if len(operations) >= batch_size:
+            if not dry_run:
+                await db[name].bulk_write(operations, ordered=False)
+            operations = []
+    if operations and not dry_run:
+        await db[name].bulk_write(operations, ordered=False)
+    return stats
+
+async def normalize_created_at(collections: list[str], batch_size: int, dry_run: bool) -> int:
+    print("🚀 Starting created_at normalization...")
+    exit_code = 0
+
+    try:
+        await init_database(reconcile_indexes=False)
+        db = get_database()
+
+        for name in collections:
+            stats = await normalize_collection(db, name, batch_size, dry_run)
+            print(f"📊 {name}: converted {stats['converted']}, unparseable {stats['unparseable']}")
+
+        if dry_run:
+            print("🔍 Dry run - no changes written")
+        else:
+            print("🎉 Normalization completed successfully!")
+
+    except Exception as e:
+        print(f"❌ Normalization failed: {str(e)}")
+        exit_code = 1
+    finally:
+        await close_database()
+
+    return exit_code
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert string created_at values to datetime")
+    parser.add_argument("--collection", choices=COLLECTIONS, help="Only normalize one collection")
+    parser.add_argument("--batch-size", type=int, default=500, help="Updates per bulk_write (default: 500)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+
+    args = parser.parse_args()
+
+    collections = [args.collection] if args.collection else COLLECTIONS
+    sys.exit(asyncio.run(normalize_created_at(collections, args.batch_size, args.dry_run)))
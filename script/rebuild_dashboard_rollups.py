@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Script untuk menghitung ulang koleksi dashboard_rollups dari data fees dan payments.
+Jalankan jika angka dashboard tidak sesuai (misalnya setelah perubahan data manual).
+"""
+
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.database import init_database, close_database
+from app.services.dashboard_rollup_service import dashboard_rollup_service
+
+async def rebuild_dashboard_rollups():
+    """Rebuild all dashboard rollup documents"""
+    print("🚀 Rebuilding dashboard rollups...")
+    
+    try:
+        await init_database()
+        
+        result = await dashboard_rollup_service.rebuild()
+        print(f"📅 Months: {result['months']}")
+        print(f"📊 Fees: {result['fees_total']}")
+        print(f"💳 Payments: {result['payments_total']}")
+        
+        stats = await dashboard_rollup_service.get_dashboard_stats()
+        print(f"🔍 Dashboard now reports {stats['totalFees']} fees, {stats['unpaidFees']} unpaid")
+        
+        print("🎉 Rebuild completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Rebuild failed: {str(e)}")
+        raise
+    finally:
+        await close_database()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_dashboard_rollups())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Script untuk memproses ulang notifikasi Midtrans yang tersimpan di webhook_inbox.
+
+Entri yang dipilih dikembalikan ke status pending sehingga diambil lagi oleh
+webhook_inbox_processor di server, atau langsung diproses dengan --process.
+
+Usage:
+    python script/replay_webhook_inbox.py                      # replay semua entri dead
+    python script/replay_webhook_inbox.py --order-id ORDER123  # replay satu order (status apa pun)
+    python script/replay_webhook_inbox.py --id ENTRY_ID --reset-ledger --process
+    python script/replay_webhook_inbox.py --dry-run
+"""
+
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.database import get_database, init_database, close_database
+from app.services.webhook_inbox import WEBHOOK_INBOX_COLLECTION, INBOX_DEAD, webhook_inbox_processor
+from app.services.webhook_ledger import WEBHOOK_LEDGER_COLLECTION
+
+async def run(args) -> int:
+    """Pilih entri inbox, reset ke pending, dan opsional proses langsung"""
+    exit_code = 0
+
+    try:
+        await init_database(reconcile_indexes=False)
+        db = get_database()
+
+        query = {}
+        if args.id:
+            query["id"] = {"$in": args.id}
+        if args.order_id:
+            query["order_id"] = {"$in": args.order_id}
+        if args.status != "any":
+            query["status"] = args.status
+        elif not query:
+            print("❌ --status any membutuhkan --id atau --order-id")
+            return 1
+
+        entries = await db[WEBHOOK_INBOX_COLLECTION].find(
+            query, {"_id": 0, "id": 1, "order_id": 1, "transaction_status": 1, "status": 1, "attempts": 1,
+                    "last_error": 1, "payload.status_code": 1}
+        ).sort("received_at", 1).to_list(None)
+
+        print(f"🔍 {len(entries)} inbox entries match {query}")
+        for entry in entries:
+            error = f" - {entry['last_error']}" if entry.get("last_error") else ""
+            print(f"   • {entry['id']} {entry.get('order_id')} {entry.get('transaction_status')} "
+                  f"[{entry['status']}, {entry.get('attempts', 0)} attempts]{error}")
+
+        if not entries or args.dry_run:
+            return 0
+
+        if args.reset_ledger:
+            # Tanpa ini, entri yang dulu sudah sukses akan dianggap duplikat oleh webhook_ledger
+            removed = 0
+            for entry in entries:
+                result = await db[WEBHOOK_LEDGER_COLLECTION].delete_one({
+                    "order_id": entry.get("order_id"),
+                    "transaction_status": entry.get("transaction_status"),
+                    "status_code": (entry.get("payload") or {}).get("status_code"),
+                })
+                removed += result.deleted_count
+            print(f"🧹 Removed {removed} webhook ledger entries")
+
+        replayed = await webhook_inbox_processor.replay({"id": {"$in": [entry["id"] for entry in entries]}})
+        print(f"🔁 {replayed} entries queued for replay")
+
+        if args.process:
+            print("🚀 Processing inbox...")
+            while True:
+                finished = await webhook_inbox_processor.drain_once()
+                if not finished:
+                    break
+            dead = await db[WEBHOOK_INBOX_COLLECTION].count_documents(
+                {"id": {"$in": [entry["id"] for entry in entries]}, "status": INBOX_DEAD}
+            )
+            metrics = await webhook_inbox_processor.get_metrics()
+            print(f"   - processed: {metrics['processed']}, duplicates: {metrics['duplicates']}, "
+                  f"retrying: {metrics['retries']}, dead: {dead}")
+            if dead:
+                exit_code = 1
+            print("✅ Replay finished" if not dead else "❌ Some entries are still dead")
+
+    except Exception as e:
+        print(f"❌ Failed: {str(e)}")
+        exit_code = 1
+    finally:
+        await close_database()
+
+    return exit_code
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay stored Midtrans notifications from webhook_inbox")
+    parser.add_argument("--id", action="append", help="Inbox entry id (can be repeated)")
+    parser.add_argument("--order-id", action="append", help="Midtrans order_id (can be repeated)")
+    parser.add_argument("--status", default=INBOX_DEAD, choices=["pending", "done", "dead", "any"],
+                        help="Only replay entries with this status (default: dead)")
+    parser.add_argument("--reset-ledger", action="store_true", help="Forget dedup ledger entries so processed notifications are applied again")
+    parser.add_argument("--process", action="store_true", help="Process the replayed entries now instead of waiting for the server")
+    parser.add_argument("--dry-run", action="store_true", help="Only list matching entries")
+
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Regression test: admin paid/unpaid lists must use a constant number of
+MongoDB queries regardless of how many fees a month has (no N+1 lookups).
+
+Runs against a throwaway database "<DB_NAME>_query_count_test" which is
+dropped afterwards.
+"""
+
+import asyncio
+import sys
+import os
+import uuid
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config.database import database_manager
+from app.controllers.admin_controller import AdminController
+
+TEST_MONTH = "2099-01"
+# Command yang dihitung sebagai query ke database
+COUNTED_COMMANDS = {"find", "aggregate", "getMore", "count", "distinct"}
+
+class QueryCounter(monitoring.CommandListener):
+    """Hitung command baca yang dikirim ke MongoDB"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name in COUNTED_COMMANDS:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+async def seed_month(db, house_count: int):
+    """Buat user, fee (separuh lunas) dan payment untuk TEST_MONTH"""
+    await db.users.delete_many({})
+    await db.fees.delete_many({})
+    await db.payments.delete_many({})
+
+    now = datetime.now(timezone.utc)
+    users, fees, payments = [], [], []
+    for i in range(house_count):
+        user_id = str(uuid.uuid4())
+        fee_id = str(uuid.uuid4())
+        paid = i % 2 == 0
+        users.append({
+            "id": user_id,
+            "username": f"warga{i}",
+            "nama": f"Warga {i}",
+            "nomor_rumah": str(i),
+            "nomor_hp": f"0812{i:08d}",
+            "tipe_rumah": "60M2",
+        })
+        fees.append({
+            "id": fee_id,
+            "user_id": user_id,
+            "kategori": "60M2",
+            "nominal": 150000,
+            "bulan": TEST_MONTH,
+            "status": "Lunas" if paid else "Belum Bayar",
+            "due_date": now,
+            "created_at": now,
+        })
+        if paid:
+            payments.append({
+                "id": f"pay_{uuid.uuid4().hex}",
+                "fee_id": fee_id,
+                "user_id": user_id,
+                "amount": 150000,
+                "payment_method": "bank_transfer",
+                "status": "Settlement",
+                "created_at": now,
+                "settled_at": now,
+            })
+
+    await db.users.insert_many(users)
+    await db.fees.insert_many(fees)
+    await db.payments.insert_many(payments)
+
+async def count_queries(counter: QueryCounter, call) -> tuple[int, int]:
+    """Jalankan call dan kembalikan (jumlah query, jumlah baris hasil)"""
+    counter.commands.clear()
+    rows = await call()
+    return len(counter.commands), len(rows)
+
+async def test_admin_query_count():
+    print("🧪 Testing admin paid/unpaid user lists for constant query count...")
+
+    counter = QueryCounter()
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    database_name = f"{os.environ.get('DB_NAME', 'rt_rw_management')}_query_count_test"
+
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=5000, event_listeners=[counter])
+    database_manager.client = client
+    database_manager.database = client[database_name]
+    db = database_manager.database
+    admin_controller = AdminController()
+
+    failed = False
+    try:
+        await db.command("ping")
+
+        results = {}
+        for house_count in (4, 40):
+            await seed_month(db, house_count)
+            results[house_count] = {
+                "paid": await count_queries(counter, lambda: admin_controller.get_paid_users(TEST_MONTH)),
+                "unpaid": await count_queries(counter, lambda: admin_controller.get_unpaid_users(TEST_MONTH)),
+            }
+
+        for name in ("paid", "unpaid"):
+            small_queries, small_rows = results[4][name]
+            large_queries, large_rows = results[40][name]
+            print(f"\n📊 get_{name}_users")
+            print(f"   - 4 houses : {small_queries} queries, {small_rows} rows")
+            print(f"   - 40 houses: {large_queries} queries, {large_rows} rows")
+
+            if large_rows != 20:
+                print(f"❌ Expected 20 {name} rows, got {large_rows}")
+                failed = True
+            elif small_queries != large_queries:
+                print("❌ Query count grows with the number of fees")
+                failed = True
+            else:
+                print("✅ Constant query count")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        failed = True
+    finally:
+        try:
+            await client.drop_database(database_name)
+        except Exception as e:
+            print(f"⚠️ Could not drop {database_name}: {str(e)}")
+        client.close()
+
+    if failed:
+        sys.exit(1)
+    print("\n🎉 Admin query count test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_admin_query_count())
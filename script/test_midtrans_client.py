@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test MidtransClient (aiohttp) terhadap stub server Midtrans lokal:
+create, status, cancel, expire, transaksi tidak ditemukan, retry saat 5xx
+dan pemakaian ulang koneksi keep-alive. Tidak membutuhkan database.
+"""
+
+import asyncio
+import sys
+import os
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.midtrans_client import MidtransClient, MidtransAPIError
+from midtrans_stub_server import start_stub_server
+
+async def test_midtrans_client():
+    print("🧪 Testing async Midtrans client against local stub...")
+
+    runner, base_url = await start_stub_server()
+    client = MidtransClient(
+        server_key="SB-Mid-server-test",
+        snap_base_url=f"{base_url}/snap/v1",
+        api_base_url=f"{base_url}/v2",
+        retries=2,
+    )
+    failed = False
+
+    def check(condition: bool, message: str):
+        nonlocal failed
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            failed = True
+
+    try:
+        created = await client.create_transaction({
+            "transaction_details": {"order_id": "RT-TEST-1", "gross_amount": 150000},
+        })
+        check(bool(created.get("token") and created.get("redirect_url")), "Snap create returns token and redirect_url")
+
+        status = await client.status("RT-TEST-1")
+        check(status.get("transaction_status") == "pending", "Status of new transaction is pending")
+
+        try:
+            await client.create_transaction({"transaction_details": {"order_id": "RT-TEST-1", "gross_amount": 1}})
+            check(False, "Duplicate order_id is rejected")
+        except MidtransAPIError as e:
+            check(e.status_code == 400, "Duplicate order_id is rejected")
+
+        try:
+            await client.status("RT-UNKNOWN")
+            check(False, "Unknown order raises 404")
+        except MidtransAPIError as e:
+            check(e.status_code == 404, "Unknown order raises 404")
+
+        cancelled = await client.cancel("RT-TEST-1")
+        check(cancelled.get("transaction_status") == "cancel", "Cancel moves transaction to cancel")
+
+        await client.create_transaction({"transaction_details": {"order_id": "RT-TEST-2", "gross_amount": 150000}})
+        expired = await client.expire("RT-TEST-2")
+        check(expired.get("transaction_status") == "expire", "Expire moves transaction to expire")
+
+        # Dua request berikutnya gagal 503: status (GET) harus berhasil setelah retry
+        session = client._get_session()
+        async with session.post(f"{base_url}/_stub/fail", json={"count": 2, "status": 503}):
+            pass
+        status = await client.status("RT-TEST-2")
+        check(status.get("transaction_status") == "expire", "Status retries through transient 503 errors")
+
+        # Snap create tidak di-retry pada 5xx agar transaksi tidak dibuat dua kali
+        async with session.post(f"{base_url}/_stub/fail", json={"count": 1, "status": 503}):
+            pass
+        try:
+            await client.create_transaction({"transaction_details": {"order_id": "RT-TEST-3", "gross_amount": 1}})
+            check(False, "Snap create is not retried on 503")
+        except MidtransAPIError as e:
+            check(e.status_code == 503, "Snap create is not retried on 503")
+
+        results = await asyncio.gather(*[client.status("RT-TEST-2") for _ in range(20)])
+        check(all(r.get("transaction_status") == "expire" for r in results), "20 concurrent status calls succeed")
+        check(session.connector is not None and len(session.connector._conns) >= 1, "Keep-alive connections are pooled")
+
+    except Exception as e:
+        print(f"❌ Test failed: {str(e)}")
+        failed = True
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    if failed:
+        sys.exit(1)
+    print("\n🎉 Midtrans client test passed!")
+
+if __name__ == "__main__":
+    asyncio.run(test_midtrans_client())
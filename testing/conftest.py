@@ -0,0 +1,42 @@
+"""
+Fixture bersama untuk test behavior (database in-memory mongomock-motor)
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Konfigurasi minimal agar modul app bisa di-import tanpa file .env
+os.environ.setdefault("MIDTRANS_IS_PRODUCTION", "false")
+os.environ.setdefault("MIDTRANS_SERVER_KEY", "test-server-key")
+os.environ.setdefault("MIDTRANS_CLIENT_KEY", "test-client-key")
+os.environ.setdefault("JWT_SECRET", "test-jwt-secret-with-at-least-32-chars")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Database in-memory yang dipakai get_database() selama satu test"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from app.config.database import database_manager
+
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(database_manager, "client", client)
+    monkeypatch.setattr(database_manager, "database", client["test"])
+    return database_manager.database
+
+
+@pytest.fixture
+def create_indexes(db):
+    """Buat index dari INDEX_REGISTRY untuk collection tertentu (unique index dipakai untuk dedup)"""
+    from app.config.indexes import INDEX_REGISTRY
+
+    async def create(*collections):
+        for collection in collections:
+            for spec in INDEX_REGISTRY[collection]:
+                await db[collection].create_index(spec["keys"], name=spec["name"], **spec["options"])
+
+    return create
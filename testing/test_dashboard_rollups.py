@@ -0,0 +1,99 @@
+"""
+Test counter incremental dashboard (app/services/dashboard_rollup_service.py)
+
+    python -m pytest testing/test_dashboard_rollups.py
+"""
+
+import asyncio
+
+from app.services.dashboard_rollup_service import (
+    dashboard_rollup_service, ROLLUP_COLLECTION, GLOBAL_ROLLUP_ID,
+)
+
+COUNTERS = ("fees_total", "fees_status", "nominal_total", "nominal_lunas", "payments_total", "payments_status")
+
+
+def _counters(document: dict) -> dict:
+    # Status yang sudah habis tetap tersimpan sebagai 0 pada counter incremental
+    counters = {key: document.get(key, 0) for key in COUNTERS if key in document}
+    for key in ("fees_status", "payments_status"):
+        if key in counters:
+            counters[key] = {status: count for status, count in counters[key].items() if count}
+    return counters
+
+
+async def _rollups(db) -> dict:
+    return {doc["_id"]: _counters(doc) async for doc in db[ROLLUP_COLLECTION].find({})}
+
+
+async def _seed_fees(db, fees: list[dict]):
+    await db.fees.insert_many(fees)
+    for bulan in {fee["bulan"] for fee in fees}:
+        month_fees = [fee for fee in fees if fee["bulan"] == bulan]
+        await dashboard_rollup_service.record_fees_created(bulan, len(month_fees), sum(fee["nominal"] for fee in month_fees))
+
+
+def test_fee_lifecycle_counters(db):
+    async def run():
+        await _seed_fees(db, [
+            {"id": "f1", "bulan": "2026-10", "status": "Belum Bayar", "nominal": 100000},
+            {"id": "f2", "bulan": "2026-10", "status": "Belum Bayar", "nominal": 150000},
+            {"id": "f3", "bulan": "2026-10", "status": "Belum Bayar", "nominal": 200000},
+        ])
+        await dashboard_rollup_service.update_fee_status("f1", "Pending")
+        await dashboard_rollup_service.update_fee_status("f1", "Lunas")
+        # Status sama tidak mengubah counter
+        await dashboard_rollup_service.update_fee_status("f1", "Lunas")
+        await dashboard_rollup_service.record_fees_transition(
+            "2026-10", {"Belum Bayar": {"count": 2, "nominal": 350000}}, "Regenerated"
+        )
+        await dashboard_rollup_service.record_fees_deleted(
+            "2026-10", {"Lunas": {"count": 1, "nominal": 100000}}
+        )
+        return await _rollups(db)
+
+    rollups = asyncio.run(run())
+
+    assert rollups["month:2026-10"] == {
+        "fees_total": 2,
+        "fees_status": {"Regenerated": 2},
+        "nominal_total": 350000,
+        "nominal_lunas": 0,
+    }
+    assert rollups[GLOBAL_ROLLUP_ID] == {"fees_total": 2, "fees_status": {"Regenerated": 2}}
+
+
+def test_nominal_lunas_follows_paid_transitions(db):
+    async def run():
+        await _seed_fees(db, [
+            {"id": "f1", "bulan": "2026-10", "status": "Belum Bayar", "nominal": 100000},
+            {"id": "f2", "bulan": "2026-11", "status": "Belum Bayar", "nominal": 150000},
+        ])
+        await dashboard_rollup_service.update_fee_status("f1", "Lunas")
+        await dashboard_rollup_service.update_fee_status("f2", "Lunas")
+        # Pembayaran dibatalkan: tagihan kembali belum bayar
+        await dashboard_rollup_service.update_fee_status("f2", "Belum Bayar")
+        return await _rollups(db)
+
+    rollups = asyncio.run(run())
+
+    assert rollups["month:2026-10"]["nominal_lunas"] == 100000
+    assert rollups["month:2026-11"]["nominal_lunas"] == 0
+    assert rollups[GLOBAL_ROLLUP_ID]["fees_status"] == {"Lunas": 1, "Belum Bayar": 1}
+
+
+def test_payment_transitions_only_count_status_changes(db):
+    async def run():
+        await db.payments.insert_one({"id": "p1", "order_id": "order-1", "status": "Pending", "created_at": None})
+        await dashboard_rollup_service.record_payment_created("Pending")
+        await dashboard_rollup_service.update_payment({"order_id": "order-1"}, {"midtrans_status": "pending"})
+        await dashboard_rollup_service.update_payment({"order_id": "order-1"}, {"status": "Success"})
+        await dashboard_rollup_service.update_payment({"order_id": "order-1"}, {"status": "Success"})
+        # Payment tidak ditemukan: tidak ada yang dicatat
+        await dashboard_rollup_service.update_payment({"order_id": "missing"}, {"status": "Failed"})
+        return await _rollups(db)
+
+    rollups = asyncio.run(run())
+
+    assert rollups[GLOBAL_ROLLUP_ID] == {"payments_total": 1, "payments_status": {"Success": 1}}
+
@@ -0,0 +1,123 @@
+"""
+Test klaim export job antar instance (ExportJobService)
+
+    python -m pytest testing/test_export_jobs.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.services.export_job_service import ExportJobService
+
+
+def _job(job_id: str, **fields) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": job_id,
+        "report": "fees",
+        "format": "excel",
+        "params": {"bulan": "2026-10"},
+        "status": "queued",
+        "rows_done": 0,
+        "created_by": "admin",
+        "created_at": now,
+        "expires_at": now + timedelta(hours=1),
+        **fields,
+    }
+
+
+def test_only_one_instance_claims_a_job(db):
+    first, second = ExportJobService(), ExportJobService()
+
+    async def run():
+        await db.export_jobs.insert_one(_job("job-1"))
+        return await first._claim_next(), await second._claim_next()
+
+    claimed, other = asyncio.run(run())
+
+    assert claimed["id"] == "job-1"
+    assert claimed["owner"] == first.owner
+    assert claimed["attempts"] == 1
+    assert other is None
+
+
+def test_expired_lease_is_taken_over_and_stale_owner_cannot_finish(db):
+    """Instance yang mati kehilangan job; hasil akhirnya tidak menimpa pemilik baru"""
+    dead, alive = ExportJobService(), ExportJobService()
+
+    async def run():
+        await db.export_jobs.insert_one(_job("job-1"))
+        job = await dead._claim_next()
+        live_claim = await alive._claim_next()
+        await db.export_jobs.update_one(
+            {"id": "job-1"}, {"$set": {"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        taken = await alive._claim_next()
+        stale_finish = await dead._finish(job, {"status": "failed", "error": "late"})
+        renewed = await dead._renew(job)
+        finished = await alive._finish(taken, {"status": "completed"})
+        return live_claim, taken, stale_finish, renewed, finished, await db.export_jobs.find_one({"id": "job-1"})
+
+    live_claim, taken, stale_finish, renewed, finished, saved = asyncio.run(run())
+
+    assert live_claim is None
+    assert taken["owner"] == alive.owner
+    assert taken["attempts"] == 2
+    assert stale_finish is False
+    assert renewed is False
+    assert finished is True
+    assert saved["status"] == "completed"
+    assert "owner" not in saved and "lease_expires_at" not in saved
+
+
+def test_claim_available_respects_concurrency_and_max_attempts(db, monkeypatch):
+    service = ExportJobService()
+    service.concurrency = 1
+    service.max_attempts = 3
+    started = []
+
+    async def run_job(job):
+        started.append(job["id"])
+
+    monkeypatch.setattr(service, "_run", run_job)
+    expired = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    async def run():
+        older = datetime.now(timezone.utc) - timedelta(minutes=5)
+        await db.export_jobs.insert_many([
+            # Sudah dicoba max_attempts kali dan pemiliknya mati lagi
+            _job("crashing", status="running", attempts=3, lease_expires_at=expired, created_at=older),
+            _job("job-1"),
+            _job("job-2"),
+        ])
+        count = await service.claim_available()
+        await asyncio.sleep(0)
+        return count, await db.export_jobs.find_one({"id": "crashing"})
+
+    count, crashing = asyncio.run(run())
+
+    assert count == 1
+    assert started == ["job-1"]
+    assert crashing["status"] == "failed"
+
+
+def test_shutdown_requeues_own_running_jobs(db, monkeypatch):
+    service = ExportJobService()
+
+    async def run():
+        await db.export_jobs.insert_one(_job("job-1"))
+        blocked = asyncio.Event()
+
+        async def run_job(job):
+            await blocked.wait()
+
+        monkeypatch.setattr(service, "_run", run_job)
+        await service.claim_available()
+        await service.shutdown()
+        return await db.export_jobs.find_one({"id": "job-1"})
+
+    job = asyncio.run(run())
+
+    assert job["status"] == "queued"
+    assert job["attempts"] == 0
+    assert "owner" not in job
@@ -0,0 +1,141 @@
+"""
+Test engine export (app/services/export_service.py) dan versi data export
+
+    python -m pytest testing/test_export_service.py
+"""
+
+import asyncio
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.services.data_version_service import data_version_service, DATA_VERSION_COLLECTION
+from app.services.export_service import ExportService, _coerce
+from app.services.pagination import created_at_range
+
+
+def _payment(payment_id: str, created_at, **fields) -> dict:
+    return {
+        "id": payment_id,
+        "fee_id": "fee-1",
+        "user_id": "user-1",
+        "amount": 100000,
+        "payment_method": "bank_transfer",
+        "status": "Success",
+        "created_at": created_at,
+        **fields,
+    }
+
+
+@pytest.mark.parametrize("value, kind, expected", [
+    (None, int, None),
+    ("150000", int, 150000),
+    ("abc", int, None),
+    (1, bool, True),
+    (12, str, "12"),
+    ("2026-10-01T07:00:00+07:00", datetime, datetime(2026, 10, 1, tzinfo=timezone.utc)),
+    (datetime(2026, 10, 1, 7), datetime, datetime(2026, 10, 1, 7, tzinfo=timezone.utc)),
+    ("bukan tanggal", datetime, None),
+    (12345, datetime, None),
+])
+def test_coerce_to_column_type(value, kind, expected):
+    assert _coerce(value, kind) == expected
+
+
+def test_raw_rows_coerce_legacy_payment_documents(db):
+    """Dokumen lama: field method, amount string, created_at string, field ekstra tidak ikut"""
+    service = ExportService(batch_size=2)
+
+    async def run():
+        await db.payments.insert_many([
+            {"id": "legacy", "fee_id": "fee-1", "user_id": "user-1", "amount": "50000", "method": "gopay",
+             "status": "Success", "created_at": "2026-10-01T10:00:00", "password": "secret"},
+            _payment("new", datetime(2026, 10, 2, 3, tzinfo=timezone.utc), amount="bukan angka"),
+        ])
+        chunks = [chunk async for chunk in service.stream_raw("payments", "ndjson", {})]
+        return [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+
+    rows = {row["id"]: row for row in asyncio.run(run())}
+
+    assert rows["legacy"]["payment_method"] == "gopay"
+    assert rows["legacy"]["amount"] == 50000
+    assert rows["legacy"]["created_at"] == "2026-10-01T10:00:00+00:00"
+    assert "password" not in rows["legacy"]
+    assert rows["new"]["amount"] is None
+    assert rows["new"]["created_at"] == "2026-10-02T03:00:00+00:00"
+
+
+def test_csv_export_writes_header_without_rows(db):
+    service = ExportService()
+
+    async def run():
+        return b"".join([chunk async for chunk in service.stream_raw("users", "csv", {})]).decode()
+
+    header = asyncio.run(run()).strip().split(",")
+    assert header[0] == "id"
+    assert "password" not in header
+
+
+def test_payment_report_uses_jakarta_day_bounds(db):
+    """Laporan excel/pdf memakai rentang yang sama dengan csv/ndjson/parquet"""
+    service = ExportService()
+
+    async def run():
+        await db.payments.insert_many([
+            # 1 Oktober 00:30 WIB (masih 30 September di UTC)
+            _payment("start-of-day", datetime(2026, 9, 30, 17, 30, tzinfo=timezone.utc)),
+            # 30 September 23:30 WIB
+            _payment("day-before", datetime(2026, 9, 30, 16, 30, tzinfo=timezone.utc)),
+            # 31 Oktober 23:30 WIB
+            _payment("end-of-day", datetime(2026, 10, 31, 16, 30, tzinfo=timezone.utc)),
+            # 1 November 00:30 WIB
+            _payment("day-after", datetime(2026, 10, 31, 17, 30, tzinfo=timezone.utc)),
+        ])
+        report = [row["ID"] async for batch in service.iter_payment_batches(date(2026, 10, 1), date(2026, 10, 31)) for row in batch]
+        raw = [row["id"] async for batch in service.iter_raw_batches("payments", created_at_range(date(2026, 10, 1), date(2026, 10, 31))) for row in batch]
+        return report, raw, await service.count_payments(date(2026, 10, 1), date(2026, 10, 31))
+
+    report, raw, total = asyncio.run(run())
+
+    assert sorted(report) == ["end-of-day", "start-of-day"]
+    assert sorted(raw) == sorted(report)
+    assert total == 2
+
+
+def test_payments_version_includes_previous_utc_month(db):
+    """Pembayaran 1 Oktober 00:30 WIB tercatat di counter payments:2026-09"""
+
+    async def run():
+        before = await data_version_service.payments_version(date(2026, 10, 1), date(2026, 10, 31))
+        await data_version_service.bump_payments(datetime(2026, 9, 30, 17, 30, tzinfo=timezone.utc))
+        after = await data_version_service.payments_version(date(2026, 10, 1), date(2026, 10, 31))
+        await db[DATA_VERSION_COLLECTION].update_one({"_id": "payments:2026-11"}, {"$inc": {"version": 1}}, upsert=True)
+        unrelated = await data_version_service.payments_version(date(2026, 10, 1), date(2026, 10, 31))
+        return before, after, unrelated
+
+    before, after, unrelated = asyncio.run(run())
+
+    assert before != after
+    # 31 Oktober WIB berakhir 31 Oktober 17:00 UTC, jadi November UTC tidak ikut
+    assert unrelated == after
+
+
+def test_parquet_export_keeps_column_types(db, tmp_path):
+    import pyarrow.parquet as pq
+
+    service = ExportService()
+    path = str(tmp_path / "payments.parquet")
+
+    async def run():
+        await db.payments.insert_many([
+            _payment("p1", datetime(2026, 10, 2, 3, tzinfo=timezone.utc)),
+            _payment("p2", "2026-10-03T04:00:00", amount="75000"),
+        ])
+        return await service.build_parquet("payments", {}, path)
+
+    assert asyncio.run(run()) == 2
+    table = pq.read_table(path)
+    assert str(table.schema.field("amount").type) == "int64"
+    assert str(table.schema.field("created_at").type) == "timestamp[us, tz=UTC]"
+    assert sorted(table.column("amount").to_pylist()) == [75000, 100000]
@@ -0,0 +1,121 @@
+"""
+Test generate tagihan bulanan (FeeController._bulk_upsert_fees)
+
+    python -m pytest testing/test_fee_generation.py
+"""
+
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.controllers.fee_controller import FeeController
+from app.services.dashboard_rollup_service import ROLLUP_COLLECTION
+
+fee_controller = FeeController()
+
+TARIF = {"60M2": 100000, "72M2": 150000, "HOOK": 200000}
+
+
+@pytest.fixture
+def users(db, create_indexes):
+    async def seed():
+        await create_indexes("fees")
+        await db.users.insert_many([
+            {"id": "u1", "tipe_rumah": "60M2", "is_admin": False},
+            {"id": "u2", "tipe_rumah": "72M2", "is_admin": False},
+            {"id": "u3", "tipe_rumah": "HOOK", "is_admin": False},
+            {"id": "admin", "tipe_rumah": "60M2", "is_admin": True},
+        ])
+
+    asyncio.run(seed())
+    return db
+
+
+def _month_rollup(db):
+    return db[ROLLUP_COLLECTION].find_one({"_id": "month:2026-10"})
+
+
+def test_generate_twice_does_not_duplicate_fees(users):
+    async def run():
+        first = await fee_controller.generate_monthly_fees("2026-10", TARIF)
+        second = await fee_controller.generate_monthly_fees("2026-10", TARIF)
+        return first, second, await users.fees.count_documents({}), await _month_rollup(users)
+
+    first, second, fees, rollup = asyncio.run(run())
+
+    assert first["batches"][0]["created"] == 3
+    assert second["batches"][0]["created"] == 0
+    assert fees == 3
+    assert rollup["fees_total"] == 3
+    assert rollup["nominal_total"] == 450000
+
+
+def test_duplicate_key_errors_count_as_skipped(users, monkeypatch):
+    """Generate lain sempat membuat tagihan yang sama: 11000 dihitung skipped, bukan error"""
+    bulk_write = users.fees.bulk_write
+
+    async def racing_bulk_write(operations, ordered=True):
+        # Operasi pertama berhasil, sisanya kalah balapan dengan generate lain
+        result = await bulk_write(operations[:1], ordered=ordered)
+        raise BulkWriteError({
+            "writeErrors": [
+                {"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"}
+                for index in range(1, len(operations))
+            ],
+            "upserted": [{"index": 0, "_id": result.upserted_ids[0]}],
+        })
+
+    monkeypatch.setattr(type(users.fees), "bulk_write", lambda self, *args, **kwargs: racing_bulk_write(*args, **kwargs))
+
+    async def run():
+        return await fee_controller.generate_monthly_fees("2026-10", TARIF), await _month_rollup(users)
+
+    result, rollup = asyncio.run(run())
+
+    assert result["batches"][0]["created"] == 1
+    assert result["batches"][0]["skipped"] == 2
+    assert rollup["fees_total"] == 1
+    assert rollup["nominal_total"] == 100000
+
+
+def test_other_write_errors_fail_after_recording_created_fees(users, monkeypatch):
+    bulk_write = users.fees.bulk_write
+
+    async def failing_bulk_write(operations, ordered=True):
+        result = await bulk_write(operations[:1], ordered=ordered)
+        raise BulkWriteError({
+            "writeErrors": [{"index": 1, "code": 121, "errmsg": "Document failed validation"}],
+            "upserted": [{"index": 0, "_id": result.upserted_ids[0]}],
+        })
+
+    monkeypatch.setattr(type(users.fees), "bulk_write", lambda self, *args, **kwargs: failing_bulk_write(*args, **kwargs))
+
+    async def run():
+        with pytest.raises(BulkWriteError):
+            await fee_controller.generate_monthly_fees("2026-10", TARIF)
+        return await _month_rollup(users)
+
+    assert asyncio.run(run())["fees_total"] == 1
+
+
+def test_rollback_regeneration_restores_fees_under_unique_index(users):
+    """Tagihan hasil regenerate dihapus dulu sebelum tagihan lama dipulihkan"""
+
+    async def run():
+        await fee_controller.generate_monthly_fees("2026-10", TARIF)
+        await fee_controller.regenerate_fees_for_month("2026-10", {**TARIF, "60M2": 120000})
+        regenerated = await users.fees.count_documents({"status": "Regenerated"})
+        result = await fee_controller.rollback_regeneration("2026-10")
+        fees = [fee async for fee in users.fees.find({}, {"_id": 0, "user_id": 1, "status": 1, "nominal": 1})]
+        return regenerated, result, fees
+
+    regenerated, result, fees = asyncio.run(run())
+
+    assert regenerated == 3
+    assert result["fees_restored"] == 3
+    assert sorted((fee["user_id"], fee["status"], fee["nominal"]) for fee in fees) == [
+        ("u1", "Belum Bayar", 100000),
+        ("u2", "Belum Bayar", 150000),
+        ("u3", "Belum Bayar", 200000),
+    ]
@@ -0,0 +1,78 @@
+"""
+Test keyset pagination (app/services/pagination.py)
+
+    python -m pytest testing/test_pagination.py
+"""
+
+import asyncio
+from datetime import date, datetime, timezone
+
+from app.services.pagination import paginate, created_at_range
+
+
+def _page_through(collection, query: dict, limit: int) -> list:
+    async def run():
+        ids, cursor = [], None
+        while True:
+            page = await paginate(collection, query, {"_id": 0}, limit, cursor)
+            ids.extend(document["id"] for document in page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+
+    return asyncio.run(run())
+
+
+def test_cursor_walks_datetime_string_and_null_created_at(db):
+    """Urutan desc: datetime, lalu string ISO lama, lalu null/missing; tidak ada yang hilang atau dobel"""
+    documents = [
+        {"id": "dt-1", "created_at": datetime(2026, 10, 1, tzinfo=timezone.utc)},
+        {"id": "dt-2", "created_at": datetime(2026, 10, 2, tzinfo=timezone.utc)},
+        {"id": "dt-3", "created_at": datetime(2026, 10, 2, tzinfo=timezone.utc)},
+        {"id": "str-1", "created_at": "2024-01-01T00:00:00"},
+        {"id": "str-2", "created_at": "2024-02-01T00:00:00"},
+        {"id": "null-1", "created_at": None},
+        {"id": "missing-1"},
+    ]
+    asyncio.run(db.users.insert_many(documents))
+
+    for limit in (1, 2, 3):
+        assert _page_through(db.users, {}, limit) == [
+            "dt-3", "dt-2", "dt-1", "str-2", "str-1", "null-1", "missing-1",
+        ]
+
+
+def test_cursor_keeps_query_filter(db):
+    asyncio.run(db.users.insert_many([
+        {"id": f"u{i}", "created_at": datetime(2026, 10, i + 1, tzinfo=timezone.utc), "is_admin": i % 2 == 0}
+        for i in range(6)
+    ]))
+
+    assert _page_through(db.users, {"is_admin": False}, 2) == ["u5", "u3", "u1"]
+
+
+def test_created_at_range_uses_jakarta_day_bounds():
+    query = created_at_range(date(2026, 10, 1), date(2026, 10, 31))
+
+    # 1 Oktober 00:00 WIB = 30 September 17:00 UTC; batas akhir eksklusif 1 November WIB
+    assert query == {"created_at": {
+        "$gte": datetime(2026, 9, 30, 17, tzinfo=timezone.utc),
+        "$lt": datetime(2026, 10, 31, 17, tzinfo=timezone.utc),
+    }}
+    assert created_at_range(None, None) == {}
+
+
+def test_users_with_phone_total_counts_all_pages(db):
+    from app.routes.admin_routes import get_users_with_phone
+
+    asyncio.run(db.users.insert_many([
+        {"id": f"u{i}", "nomor_hp": f"08123456789{i}", "is_admin": False,
+         "created_at": datetime(2026, 10, i + 1, tzinfo=timezone.utc)}
+        for i in range(3)
+    ] + [{"id": "no-phone", "nomor_hp": "", "is_admin": False}]))
+
+    page = asyncio.run(get_users_with_phone(tipe_rumah=None, nomor_hp=None, limit=2, cursor=None, current_user={}))
+
+    assert [user["id"] for user in page["users"]] == ["u2", "u1"]
+    assert page["total"] == 3
+    assert page["next_cursor"] is not None
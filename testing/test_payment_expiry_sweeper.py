@@ -0,0 +1,114 @@
+"""
+Test sweeper pembayaran kedaluwarsa saat balapan dengan webhook settlement
+
+    python -m pytest testing/test_payment_expiry_sweeper.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.dashboard_rollup_service import ROLLUP_COLLECTION, GLOBAL_ROLLUP_ID
+from app.services.payment_expiry_sweeper import PaymentExpirySweeper
+
+
+@pytest.fixture
+def pending(db):
+    expired_at = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    async def seed():
+        await db.fees.insert_many([
+            {"id": f"fee-{i}", "bulan": "2026-10", "status": "Pending", "nominal": 100000} for i in (1, 2)
+        ])
+        await db.payments.insert_many([
+            {"id": f"pay-{i}", "fee_id": f"fee-{i}", "user_id": f"user-{i}", "order_id": f"order-{i}",
+             "amount": 100000, "status": "Pending", "expiry_time": expired_at, "created_at": expired_at}
+            for i in (1, 2)
+        ])
+
+    asyncio.run(seed())
+    return db
+
+
+def _race(monkeypatch, db, collection_name: str, settle):
+    """Jalankan settle (meniru webhook) tepat sebelum update_many pertama pada collection tersebut"""
+    collection_type = type(db[collection_name])
+    update_many = collection_type.update_many
+    fired = []
+
+    def racing_update_many(self, *args, **kwargs):
+        async def run():
+            if self.name == collection_name and not fired:
+                fired.append(True)
+                await settle()
+            return await update_many(self, *args, **kwargs)
+        return run()
+
+    monkeypatch.setattr(collection_type, "update_many", racing_update_many)
+
+
+async def _month_and_global(db):
+    return (
+        await db[ROLLUP_COLLECTION].find_one({"_id": "month:2026-10"}),
+        await db[ROLLUP_COLLECTION].find_one({"_id": GLOBAL_ROLLUP_ID}),
+    )
+
+
+def test_payment_settled_during_sweep_is_left_alone(pending, monkeypatch):
+    async def settle():
+        await pending.payments.update_one({"id": "pay-1"}, {"$set": {"status": "Success"}})
+        await pending.fees.update_one({"id": "fee-1"}, {"$set": {"status": "Lunas"}})
+
+    _race(monkeypatch, pending, "payments", settle)
+    sweeper = PaymentExpirySweeper()
+    sweeper.grace = timedelta(0)
+
+    async def run():
+        expired = await sweeper.expire_due()
+        payments = {p["id"]: p["status"] async for p in pending.payments.find({}, {"_id": 0})}
+        fees = {f["id"]: f["status"] async for f in pending.fees.find({}, {"_id": 0})}
+        notified = await pending.notifications.distinct("user_id")
+        return expired, payments, fees, notified, await _month_and_global(pending)
+
+    expired, payments, fees, notified, (month, global_rollup) = asyncio.run(run())
+
+    assert expired == 1
+    assert payments == {"pay-1": "Success", "pay-2": "Failed"}
+    assert fees == {"fee-1": "Lunas", "fee-2": "Belum Bayar"}
+    assert notified == ["user-2"]
+    assert global_rollup["payments_status"] == {"Pending": -1, "Failed": 1}
+    assert month["fees_status"] == {"Pending": -1, "Belum Bayar": 1}
+
+
+def test_fee_paid_during_sweep_is_not_counted_as_reset(pending, monkeypatch):
+    """Tagihan dilunasi payment lain di antara update payment dan update tagihan"""
+
+    async def settle():
+        await pending.fees.update_one({"id": "fee-1"}, {"$set": {"status": "Lunas"}})
+
+    _race(monkeypatch, pending, "fees", settle)
+    sweeper = PaymentExpirySweeper()
+    sweeper.grace = timedelta(0)
+
+    async def run():
+        expired = await sweeper.expire_due()
+        fees = {f["id"]: f["status"] async for f in pending.fees.find({}, {"_id": 0})}
+        return expired, fees, await _month_and_global(pending)
+
+    expired, fees, (month, _) = asyncio.run(run())
+
+    assert expired == 2
+    assert fees == {"fee-1": "Lunas", "fee-2": "Belum Bayar"}
+    assert sweeper.get_metrics()["fees_reset_total"] == 1
+    assert month["fees_status"] == {"Pending": -1, "Belum Bayar": 1}
+
+
+def test_payments_inside_grace_period_are_not_expired(pending):
+    sweeper = PaymentExpirySweeper()
+    sweeper.grace = timedelta(hours=2)
+
+    async def run():
+        return await sweeper.expire_due(), await pending.payments.count_documents({"status": "Pending"})
+
+    assert asyncio.run(run()) == (0, 2)
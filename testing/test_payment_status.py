@@ -0,0 +1,59 @@
+"""
+Test penerapan hasil cek status Midtrans (MidtransService.apply_status_result)
+
+    python -m pytest testing/test_payment_status.py
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+from app.services.midtrans_service import midtrans_service
+
+
+def _payment(order_id: str, fee_id: str, **fields) -> dict:
+    # id dibentuk dari timestamp detik sehingga dua payment bisa punya id yang sama
+    return {
+        "id": "pay_1760000000", "fee_id": fee_id, "user_id": "user-1", "order_id": order_id,
+        "amount": 100000, "status": "Pending", "created_at": datetime.now(timezone.utc), **fields,
+    }
+
+
+def test_status_update_targets_order_id_not_colliding_id(db):
+    async def run():
+        await db.fees.insert_many([
+            {"id": "fee-1", "bulan": "2026-10", "status": "Pending", "nominal": 100000},
+            {"id": "fee-2", "bulan": "2026-10", "status": "Pending", "nominal": 100000},
+        ])
+        await db.payments.insert_many([_payment("order-1", "fee-1"), _payment("order-2", "fee-2")])
+        payment = await db.payments.find_one({"order_id": "order-2"})
+        changed = await midtrans_service.apply_status_result(payment, {"status": "settlement"})
+        payments = {p["order_id"]: p["status"] async for p in db.payments.find({}, {"_id": 0})}
+        return changed, payments
+
+    changed, payments = asyncio.run(run())
+
+    assert changed is True
+    assert payments == {"order-1": "Pending", "order-2": "Success"}
+
+
+def test_legacy_payment_without_order_id_is_updated_by_document_id(db):
+    async def run():
+        await db.fees.insert_one({"id": "fee-1", "bulan": "2026-10", "status": "Pending", "nominal": 100000})
+        await db.payments.insert_many([
+            _payment(None, "fee-1", transaction_id="tx-1"),
+            _payment(None, "fee-2", transaction_id="tx-2"),
+        ])
+        payment = await db.payments.find_one({"transaction_id": "tx-1"})
+        await midtrans_service.apply_status_result(payment, {"status": "expire"})
+        return {p["transaction_id"]: p["status"] async for p in db.payments.find({}, {"_id": 0})}
+
+    assert asyncio.run(run()) == {"tx-1": "Failed", "tx-2": "Pending"}
+
+
+def test_unchanged_status_is_not_written(db):
+    async def run():
+        await db.payments.insert_one(_payment("order-1", "fee-1"))
+        payment = await db.payments.find_one({"order_id": "order-1"})
+        return await midtrans_service.apply_status_result(payment, {"status": "pending"})
+
+    assert asyncio.run(run()) is False
@@ -0,0 +1,92 @@
+"""
+Test normalisasi nomor HP dan penerima broadcast Telegram
+
+    python -m pytest testing/test_phone_number.py
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.phone_number import normalize_phone_number, phone_number_update
+from app.services.telegram_outbox import TelegramOutbox, TELEGRAM_OUTBOX_COLLECTION
+from app.services import telegram_outbox as telegram_outbox_module
+
+
+@pytest.mark.parametrize("raw", ["081234567890", "0812-3456-7890", "6281234567890", "+62 812 3456 7890", "81234567890", "(0812) 3456.7890"])
+def test_normalize_local_and_international_formats(raw):
+    assert normalize_phone_number(raw) == "+6281234567890"
+
+
+@pytest.mark.parametrize("raw", [None, "", "abc", "0812abc", "123", "+0812345678901"])
+def test_normalize_rejects_invalid_numbers(raw):
+    assert normalize_phone_number(raw) is None
+
+
+def test_phone_number_update_unsets_invalid_number():
+    assert phone_number_update({"nomor_hp": "abc"}) == {
+        "$set": {"nomor_hp": "abc"},
+        "$unset": {"nomor_hp_normalized": ""},
+    }
+    assert phone_number_update({"nama": "A"}) == {"$set": {"nama": "A"}}
+
+
+def test_broadcast_includes_users_without_normalized_number(db, monkeypatch):
+    """Nomor tidak valid/duplikat tidak punya nomor_hp_normalized tetapi tetap menerima broadcast"""
+    service = telegram_outbox_module.telegram_service
+    monkeypatch.setattr(service, "is_configured", True)
+    monkeypatch.setattr(service, "chat_id", None)
+    outbox = TelegramOutbox()
+
+    async def run():
+        await db.users.insert_many([
+            {"id": "valid", "nomor_hp": "081234567890", "nomor_hp_normalized": "+6281234567890",
+             "is_admin": False, "telegram_chat_id": "1"},
+            {"id": "duplicate", "nomor_hp": "6281234567890", "is_admin": False, "telegram_chat_id": "2"},
+            {"id": "invalid", "nomor_hp": "0812-ABC", "is_admin": False, "telegram_chat_id": "3"},
+            {"id": "no-phone", "nomor_hp": "", "is_admin": False, "telegram_chat_id": "4"},
+            {"id": "admin", "nomor_hp": "081111111111", "is_admin": True, "telegram_chat_id": "5"},
+        ])
+        result = await outbox.enqueue_broadcast("Judul", "Isi pesan")
+        queued = await db[TELEGRAM_OUTBOX_COLLECTION].distinct("user_id")
+        return result, queued
+
+    result, queued = asyncio.run(run())
+
+    assert result["queued"] == 3
+    assert sorted(queued) == ["duplicate", "invalid", "valid"]
+
+
+def test_migration_backfills_and_reports_duplicates(db, monkeypatch):
+    """script/migrate_phone_numbers.py mengisi nomor_hp_normalized; duplikat dilaporkan dan dilewati"""
+    import importlib.util
+    import os
+
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "script", "migrate_phone_numbers.py")
+    spec = importlib.util.spec_from_file_location("migrate_phone_numbers", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    async def noop(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(migration, "init_database", noop)
+    monkeypatch.setattr(migration, "close_database", noop)
+
+    async def run():
+        await db.users.insert_many([
+            {"id": "a", "username": "a", "nama": "A", "nomor_hp": "0812-3456-7890"},
+            {"id": "b", "username": "b", "nama": "B", "nomor_hp": "6281234567890"},
+            {"id": "c", "username": "c", "nama": "C", "nomor_hp": "abc"},
+        ])
+        first = await migration.migrate_phone_numbers(batch_size=2, dry_run=False)
+        await db.users.delete_one({"id": "b"})
+        second = await migration.migrate_phone_numbers(batch_size=2, dry_run=False)
+        users = {user["id"]: user.get("nomor_hp_normalized") async for user in db.users.find({}, {"_id": 0})}
+        return first, second, users
+
+    first, second, users = asyncio.run(run())
+
+    assert first == 1
+    assert second == 0
+    assert users == {"a": "+6281234567890", "c": None}
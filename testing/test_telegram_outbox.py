@@ -0,0 +1,158 @@
+"""
+Test pengiriman outbox Telegram: retry, blocked, failed dan redrive
+
+    python -m pytest testing/test_telegram_outbox.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import telegram_outbox as telegram_outbox_module
+from app.services.telegram_client import TelegramAPIError
+from app.services.telegram_outbox import (
+    TelegramOutbox, TELEGRAM_OUTBOX_COLLECTION,
+    OUTBOX_PENDING, OUTBOX_SENT, OUTBOX_FAILED, OUTBOX_BLOCKED,
+)
+
+
+class FakeClient:
+    """Balasan Bot API per chat_id: None berarti terkirim, exception dilempar"""
+
+    def __init__(self, errors: dict):
+        self.errors = errors
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        error = self.errors.get(chat_id)
+        if error is not None:
+            raise error
+        self.sent.append(chat_id)
+        return {"message_id": len(self.sent)}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient({
+        "blocked": TelegramAPIError("Forbidden: bot was blocked by the user", error_code=403),
+        "bad": TelegramAPIError("Bad Request: chat not found", error_code=400),
+        "flaky": TelegramAPIError("Too Many Requests", error_code=429, retry_after=1),
+        "down": ConnectionError("connection reset"),
+    })
+    monkeypatch.setattr(telegram_outbox_module.telegram_service, "client", client)
+    return client
+
+
+def _utc(value: datetime) -> datetime:
+    # Motor mengembalikan datetime naive dalam UTC
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _messages(db) -> dict:
+    async def load():
+        return {
+            message["chat_id"]: message
+            async for message in db[TELEGRAM_OUTBOX_COLLECTION].find({}, {"_id": 0})
+        }
+
+    return asyncio.run(load())
+
+
+def _make_due(db):
+    asyncio.run(db[TELEGRAM_OUTBOX_COLLECTION].update_many(
+        {"status": OUTBOX_PENDING}, {"$set": {"next_attempt_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    ))
+
+
+def test_send_results_map_to_outbox_status(db, client):
+    outbox = TelegramOutbox()
+    outbox.retry_base = 30
+
+    async def run():
+        job = await outbox.enqueue(
+            [{"chat_id": chat_id, "text": "Halo"} for chat_id in ("ok", "blocked", "bad", "flaky", "down")],
+            kind="broadcast",
+        )
+        await outbox.drain_once()
+        return job, await outbox.get_job(job["job_id"])
+
+    job, summary = asyncio.run(run())
+    messages = _messages(db)
+
+    assert client.sent == ["ok"]
+    assert messages["ok"]["status"] == OUTBOX_SENT
+    assert messages["ok"]["telegram_message_id"] == 1
+    assert messages["blocked"]["status"] == OUTBOX_BLOCKED
+    assert messages["bad"]["status"] == OUTBOX_FAILED
+    # Kegagalan sementara tetap pending dengan backoff
+    for chat_id in ("flaky", "down"):
+        assert messages[chat_id]["status"] == OUTBOX_PENDING
+        assert messages[chat_id]["attempts"] == 1
+        assert _utc(messages[chat_id]["next_attempt_at"]) > datetime.now(timezone.utc) + timedelta(seconds=25)
+    assert summary["counts"] == {OUTBOX_PENDING: 2, OUTBOX_SENT: 1, OUTBOX_FAILED: 1, OUTBOX_BLOCKED: 1}
+    assert summary["done"] is False
+
+
+def test_backoff_doubles_until_max_attempts(db, client):
+    outbox = TelegramOutbox()
+    outbox.retry_base = 10
+    outbox.max_attempts = 3
+
+    async def enqueue():
+        await outbox.enqueue([{"chat_id": "down", "text": "Halo"}], kind="notification")
+
+    asyncio.run(enqueue())
+    delays = []
+    for _ in range(outbox.max_attempts):
+        before = datetime.now(timezone.utc)
+        asyncio.run(outbox.drain_once())
+        message = _messages(db)["down"]
+        if message["status"] == OUTBOX_PENDING:
+            delays.append(round((_utc(message["next_attempt_at"]) - before).total_seconds()))
+        _make_due(db)
+
+    message = _messages(db)["down"]
+    assert delays == [10, 20]
+    assert message["status"] == OUTBOX_FAILED
+    assert message["attempts"] == 3
+    assert message["last_error"] == "connection reset"
+
+
+def test_pending_message_not_sent_before_next_attempt(db, client):
+    outbox = TelegramOutbox()
+
+    async def run():
+        await outbox.enqueue([{"chat_id": "down", "text": "Halo"}], kind="notification")
+        first = await outbox.drain_once()
+        second = await outbox.drain_once()
+        return first, second
+
+    assert asyncio.run(run()) == (1, 0)
+
+
+def test_redrive_requeues_only_requested_statuses(db, client):
+    outbox = TelegramOutbox()
+
+    async def run():
+        job = await outbox.enqueue(
+            [{"chat_id": chat_id, "text": "Halo"} for chat_id in ("ok", "blocked", "bad")], kind="broadcast"
+        )
+        await outbox.drain_once()
+        failed_only = await outbox.redrive(job["job_id"])
+        client.errors.pop("bad")
+        await outbox.drain_once()
+        blocked = await outbox.redrive(job["job_id"], (OUTBOX_BLOCKED,))
+        return failed_only, blocked
+
+    failed_only, blocked = asyncio.run(run())
+    messages = _messages(db)
+
+    assert failed_only == 1
+    assert blocked == 1
+    # Pesan yang sudah terkirim tidak dikirim ulang
+    assert client.sent == ["ok", "bad"]
+    assert messages["bad"]["status"] == OUTBOX_SENT
+    assert "last_error" not in messages["bad"]
+    assert messages["blocked"]["status"] == OUTBOX_PENDING
+    assert messages["blocked"]["attempts"] == 0
@@ -0,0 +1,77 @@
+"""
+Test cache chat_id -> user Telegram saat akun dihubungkan ulang ke chat lain
+
+Memakai database in-memory mongomock-motor (lihat conftest.py); jalankan dengan:
+    python -m pytest testing/test_telegram_user_cache.py
+"""
+
+import asyncio
+
+import pytest
+
+from app.routes import telegram_routes
+from app.services.telegram_user_cache import TelegramUserCache
+
+OLD_CHAT_ID = 1111
+NEW_CHAT_ID = 2222
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = TelegramUserCache(ttl=300, negative_ttl=30, max_entries=100)
+    monkeypatch.setattr(telegram_routes, "telegram_user_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Catat pesan bot alih-alih mengirim ke Telegram"""
+    messages = []
+
+    async def send_telegram_message(chat_id, message):
+        messages.append((chat_id, message))
+        return {"success": True}
+
+    monkeypatch.setattr(telegram_routes, "send_telegram_message", send_telegram_message)
+    return messages
+
+
+def test_relink_invalidates_previous_chat(db, cache, sent):
+    """Setelah /start dari chat baru, chat lama tidak lagi mengarah ke user"""
+
+    async def run():
+        await db.users.insert_one({
+            "id": "user-1",
+            "username": "warga1",
+            "nama": "Warga Satu",
+            "nomor_hp": "081234567890",
+            "nomor_hp_normalized": "+6281234567890",
+            "telegram_chat_id": str(OLD_CHAT_ID),
+        })
+        # Chat lama sudah ada di cache
+        before = await cache.get_user(OLD_CHAT_ID)
+
+        await telegram_routes.handle_start_command(NEW_CHAT_ID, NEW_CHAT_ID, "warga1", "Warga", "Satu")
+
+        return before, await cache.get_user(OLD_CHAT_ID), await cache.get_user(NEW_CHAT_ID)
+
+    before, old_chat_user, new_chat_user = asyncio.run(run())
+
+    assert before["id"] == "user-1"
+    assert old_chat_user is None
+    assert new_chat_user["id"] == "user-1"
+    assert sent[-1][0] == NEW_CHAT_ID
+
+
+def test_cache_keeps_one_chat_per_user(db, cache):
+    """Mengisi cache untuk chat baru membuang entry chat lama milik user yang sama"""
+
+    async def run():
+        await db.users.insert_one({"id": "user-1", "nama": "Warga Satu", "telegram_chat_id": str(OLD_CHAT_ID)})
+        await cache.get_user(OLD_CHAT_ID)
+        # Chat diganti langsung di database oleh proses lain, tanpa invalidasi
+        await db.users.update_one({"id": "user-1"}, {"$set": {"telegram_chat_id": str(NEW_CHAT_ID)}})
+        await cache.get_user(NEW_CHAT_ID)
+        return await cache.get_user(OLD_CHAT_ID)
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,172 @@
+"""
+Test urutan antrean webhook inbox (WebhookInboxProcessor.drain_once)
+
+Memakai database in-memory mongomock-motor (lihat conftest.py); jalankan dengan:
+    python -m pytest testing/test_webhook_inbox.py
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config.midtrans import midtrans_config
+from app.services import webhook_inbox
+from app.services.webhook_inbox import WebhookInboxProcessor, WEBHOOK_INBOX_COLLECTION, INBOX_PENDING, INBOX_DONE
+from app.services.webhook_ledger import WEBHOOK_LEDGER_COLLECTION, LEDGER_DONE
+
+
+class ProcessKilled(BaseException):
+    """Meniru proses yang mati di tengah pemrosesan"""
+
+
+def _payload(order_id: str, transaction_status: str = "settlement") -> dict:
+    return {
+        "transaction_id": f"tx-{order_id}",
+        "transaction_status": transaction_status,
+        "payment_type": "bank_transfer",
+        "order_id": order_id,
+        "status_code": "200",
+        "gross_amount": "100000.00",
+        "signature_key": "test",
+    }
+
+
+def _entry(entry_id: str, order_id: str, received_at: datetime, next_attempt_at: datetime, attempts: int = 0) -> dict:
+    return {
+        "id": entry_id,
+        "order_id": order_id,
+        "transaction_status": "settlement",
+        "payload": _payload(order_id),
+        "status": INBOX_PENDING,
+        "attempts": attempts,
+        "received_at": received_at,
+        "next_attempt_at": next_attempt_at,
+    }
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    """Catat order_id yang diteruskan ke midtrans_service.handle_notification"""
+    calls = []
+
+    async def handle_notification(notification):
+        calls.append(notification.order_id)
+        return {"message": "ok"}
+
+    monkeypatch.setattr(webhook_inbox.midtrans_service, "handle_notification", handle_notification)
+    return calls
+
+
+def test_fresh_entry_not_starved_by_backed_off_entries(db, applied):
+    """Entri baru tetap diproses walau lebih dari batch_size entri di depannya menunggu retry"""
+    processor = WebhookInboxProcessor()
+    processor.batch_size = 10
+    now = datetime.now(timezone.utc)
+    backed_off = processor.batch_size + 5
+
+    entries = []
+    for i in range(backed_off):
+        received_at = now - timedelta(minutes=30) + timedelta(seconds=i)
+        # Entri yang gagal dan dijadwalkan retry nanti
+        entries.append(_entry(f"retry-{i}", f"order-{i}", received_at, now + timedelta(minutes=10), attempts=3))
+        # Notifikasi berikutnya untuk order yang sama: sudah jatuh tempo tetapi harus menunggu
+        entries.append(_entry(f"next-{i}", f"order-{i}", received_at + timedelta(minutes=1), received_at + timedelta(minutes=1)))
+    entries.append(_entry("fresh", "order-fresh", now - timedelta(seconds=1), now - timedelta(seconds=1)))
+
+    async def run():
+        await db[WEBHOOK_INBOX_COLLECTION].insert_many(entries)
+        finished = await processor.drain_once()
+        fresh = await db[WEBHOOK_INBOX_COLLECTION].find_one({"id": "fresh"})
+        waiting = await db[WEBHOOK_INBOX_COLLECTION].count_documents({"status": INBOX_PENDING})
+        return finished, fresh, waiting
+
+    finished, fresh, waiting = asyncio.run(run())
+
+    assert applied == ["order-fresh"]
+    assert finished == 1
+    assert fresh["status"] == INBOX_DONE
+    # Entri retry dan entri yang tertahan di belakangnya tetap pending
+    assert waiting == backed_off * 2
+
+
+def test_order_entries_wait_for_earlier_retry(db, applied):
+    """Entri order yang sama diproses berurutan setelah retry-nya jatuh tempo"""
+    processor = WebhookInboxProcessor()
+    now = datetime.now(timezone.utc)
+
+    async def run():
+        await db[WEBHOOK_INBOX_COLLECTION].insert_many([
+            _entry("first", "order-1", now - timedelta(minutes=5), now + timedelta(minutes=1), attempts=1),
+            _entry("second", "order-1", now - timedelta(minutes=4), now - timedelta(minutes=4)),
+        ])
+        before = await processor.drain_once()
+        await db[WEBHOOK_INBOX_COLLECTION].update_one({"id": "first"}, {"$set": {"next_attempt_at": now}})
+        after = await processor.drain_once()
+        return before, after
+
+    before, after = asyncio.run(run())
+
+    assert before == 0
+    assert after == 2
+    assert applied == ["order-1", "order-1"]
+
+
+def test_crash_between_claim_and_apply_is_redriven(db, create_indexes, monkeypatch):
+    """Proses mati setelah ledger diklaim: entri tetap pending dan diterapkan saat di-drain ulang"""
+    processor = WebhookInboxProcessor()
+    apply_notification = webhook_inbox.midtrans_service._apply_notification
+    payload = _payload("order-1")
+    payload["signature_key"] = hashlib.sha512(
+        f"order-1{payload['status_code']}{payload['gross_amount']}{midtrans_config.server_key}".encode()
+    ).hexdigest()
+
+    async def killed(notification):
+        raise ProcessKilled()
+
+    async def run():
+        await create_indexes(WEBHOOK_LEDGER_COLLECTION)
+        await db.fees.insert_one({"id": "fee-1", "bulan": "2026-10", "status": "Pending", "nominal": 100000})
+        await db.payments.insert_one({
+            "id": "pay-1", "fee_id": "fee-1", "user_id": "user-1", "order_id": "order-1",
+            "transaction_id": "tx-order-1", "status": "Pending", "amount": 100000,
+            "created_at": datetime.now(timezone.utc),
+        })
+        entry_id = await processor.enqueue(payload)
+
+        monkeypatch.setattr(webhook_inbox.midtrans_service, "_apply_notification", killed)
+        with pytest.raises(ProcessKilled):
+            await processor.drain_once()
+        monkeypatch.setattr(webhook_inbox.midtrans_service, "_apply_notification", apply_notification)
+        after_crash = await db[WEBHOOK_INBOX_COLLECTION].find_one({"id": entry_id})
+
+        # Klaim proses yang mati masih berlaku: entri dijadwalkan retry, bukan ditandai selesai
+        await processor.drain_once()
+        while_claimed = await db[WEBHOOK_INBOX_COLLECTION].find_one({"id": entry_id})
+
+        # Klaim kedaluwarsa dan retry jatuh tempo
+        past = datetime.now(timezone.utc) - timedelta(seconds=1)
+        await db[WEBHOOK_LEDGER_COLLECTION].update_one({"order_id": "order-1"}, {"$set": {"claimed_until": past}})
+        await db[WEBHOOK_INBOX_COLLECTION].update_one({"id": entry_id}, {"$set": {"next_attempt_at": past}})
+        finished = await processor.drain_once()
+
+        return (
+            after_crash, while_claimed, finished,
+            await db[WEBHOOK_INBOX_COLLECTION].find_one({"id": entry_id}),
+            await db[WEBHOOK_LEDGER_COLLECTION].find_one({"order_id": "order-1"}),
+            await db.payments.find_one({"id": "pay-1"}),
+            await db.fees.find_one({"id": "fee-1"}),
+        )
+
+    after_crash, while_claimed, finished, entry, ledger, payment, fee = asyncio.run(run())
+
+    assert after_crash["status"] == INBOX_PENDING
+    assert while_claimed["status"] == INBOX_PENDING
+    assert while_claimed["attempts"] == 1
+    assert finished == 1
+    assert entry["status"] == INBOX_DONE
+    assert entry["duplicate"] is False
+    assert ledger["status"] == LEDGER_DONE
+    assert payment["status"] == "Success"
+    assert fee["status"] == "Lunas"
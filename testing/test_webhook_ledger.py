@@ -0,0 +1,142 @@
+"""
+Test dedup notifikasi Midtrans lewat webhook_ledger (MidtransService.handle_notification)
+
+    python -m pytest testing/test_webhook_ledger.py
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.config.midtrans import midtrans_config
+from app.models import MidtransNotificationRequest
+from app.services.midtrans_service import midtrans_service
+from app.services.webhook_ledger import (
+    webhook_ledger, WEBHOOK_LEDGER_COLLECTION, LEDGER_DONE, LEDGER_PROCESSING,
+)
+
+
+class ProcessKilled(BaseException):
+    """Meniru proses yang mati (bukan Exception biasa, jadi klaim tidak dilepas)"""
+
+
+def notification(order_id: str = "order-1", transaction_status: str = "settlement", status_code: str = "200"):
+    gross_amount = "100000.00"
+    signature = hashlib.sha512(
+        f"{order_id}{status_code}{gross_amount}{midtrans_config.server_key}".encode()
+    ).hexdigest()
+    return MidtransNotificationRequest(
+        transaction_id=f"tx-{order_id}",
+        transaction_status=transaction_status,
+        payment_type="bank_transfer",
+        order_id=order_id,
+        status_code=status_code,
+        gross_amount=gross_amount,
+        signature_key=signature,
+    )
+
+
+@pytest.fixture
+def payment(db, create_indexes):
+    async def seed():
+        await create_indexes(WEBHOOK_LEDGER_COLLECTION)
+        await db.fees.insert_one({"id": "fee-1", "bulan": "2026-10", "status": "Pending", "nominal": 100000})
+        await db.payments.insert_one({
+            "id": "pay-1", "fee_id": "fee-1", "user_id": "user-1", "order_id": "order-1",
+            "transaction_id": "tx-order-1", "status": "Pending", "amount": 100000,
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    asyncio.run(seed())
+    return db
+
+
+def test_duplicate_notification_is_ignored(payment):
+    async def run():
+        first = await midtrans_service.handle_notification(notification())
+        # Status diubah manual: duplikat tidak boleh menerapkan ulang notifikasi
+        await payment.fees.update_one({"id": "fee-1"}, {"$set": {"status": "Belum Bayar"}})
+        second = await midtrans_service.handle_notification(notification())
+        entry = await payment[WEBHOOK_LEDGER_COLLECTION].find_one({"order_id": "order-1"})
+        fee = await payment.fees.find_one({"id": "fee-1"})
+        return first, second, entry, fee
+
+    first, second, entry, fee = asyncio.run(run())
+
+    assert not first.get("duplicate")
+    assert second == {"message": "Duplicate notification ignored", "duplicate": True}
+    assert entry["status"] == LEDGER_DONE
+    assert fee["status"] == "Belum Bayar"
+
+
+def test_failed_apply_releases_claim(db, create_indexes):
+    """Payment belum ada (404): klaim dilepas sehingga retry berikutnya diproses"""
+
+    async def run():
+        await create_indexes(WEBHOOK_LEDGER_COLLECTION)
+        with pytest.raises(HTTPException) as error:
+            await midtrans_service.handle_notification(notification())
+        remaining = await db[WEBHOOK_LEDGER_COLLECTION].count_documents({})
+        return error.value.status_code, remaining
+
+    status_code, remaining = asyncio.run(run())
+
+    assert status_code == 404
+    assert remaining == 0
+
+
+def test_crash_after_claim_does_not_lose_update(payment, monkeypatch):
+    """Proses mati setelah klaim: retry setelah klaim kedaluwarsa tetap menerapkan notifikasi"""
+    apply_notification = midtrans_service._apply_notification
+
+    async def killed(notification):
+        raise ProcessKilled()
+
+    async def run():
+        monkeypatch.setattr(midtrans_service, "_apply_notification", killed)
+        with pytest.raises(ProcessKilled):
+            await midtrans_service.handle_notification(notification())
+        monkeypatch.setattr(midtrans_service, "_apply_notification", apply_notification)
+
+        # Klaim masih berlaku: retry diminta mencoba lagi, bukan dianggap duplikat
+        with pytest.raises(HTTPException) as in_progress:
+            await midtrans_service.handle_notification(notification())
+        processing = await payment[WEBHOOK_LEDGER_COLLECTION].find_one({"order_id": "order-1"})
+
+        await payment[WEBHOOK_LEDGER_COLLECTION].update_one(
+            {"order_id": "order-1"},
+            {"$set": {"claimed_until": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        result = await midtrans_service.handle_notification(notification())
+        entry = await payment[WEBHOOK_LEDGER_COLLECTION].find_one({"order_id": "order-1"})
+        return in_progress.value.status_code, processing, result, entry
+
+    status_code, processing, result, entry = asyncio.run(run())
+
+    assert status_code == 503
+    assert processing["status"] == LEDGER_PROCESSING
+    assert not result.get("duplicate")
+    assert entry["status"] == LEDGER_DONE
+    assert entry["takeovers"] == 1
+
+    async def load():
+        return await payment.payments.find_one({"id": "pay-1"}), await payment.fees.find_one({"id": "fee-1"})
+
+    saved_payment, fee = asyncio.run(load())
+    assert saved_payment["status"] == "Success"
+    assert fee["status"] == "Lunas"
+
+
+def test_legacy_entry_without_status_counts_as_done(db, create_indexes):
+    async def run():
+        await create_indexes(WEBHOOK_LEDGER_COLLECTION)
+        await db[WEBHOOK_LEDGER_COLLECTION].insert_one({
+            "order_id": "order-1", "transaction_status": "settlement", "status_code": "200",
+            "received_at": datetime.now(timezone.utc),
+        })
+        return await webhook_ledger.claim("order-1", "settlement", "200")
+
+    assert asyncio.run(run()) == "duplicate"